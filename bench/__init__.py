@@ -0,0 +1,5 @@
+"""
+Бенчмарки финансового трекера.
+
+Запуск отдельных сценариев: python -m bench.<модуль> --help
+"""
@@ -0,0 +1,45 @@
+"""
+Материализованные суммы: баланс и баланс на дату против полного пересчета по записям,
+стоимость поддержки сумм при добавлении и правке.
+
+    python -m bench.aggregates --size 1000000
+"""
+import argparse
+import random
+from datetime import date, timedelta
+
+from bench.backends import timed
+from bench.synth import iter_rows
+from main import LedgerTotals, PersonalTracker, Record
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="бенчмарк материализованных сумм")
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    rnd = random.Random(5)
+    records = [Record(*row) for row in iter_rows(args.size)]
+    tracker = PersonalTracker(records)
+    probes = [date(2015, 1, 1) + timedelta(days=rnd.randrange(3650)) for _ in range(args.queries)]
+    print(f"{args.size} записей")
+
+    build = timed(lambda: LedgerTotals.from_rows(tracker._aggregate_columns(None)))
+    recompute = timed(lambda: sum(r.amount for r in records if r.category == "Доход"), 3)
+    recompute_as_of = timed(lambda: sum(r.amount for r in records if r.date <= probes[0]), 3)
+    tracker.balance()
+    balance = timed(tracker.balance, args.queries)
+    as_of = timed(lambda: tracker.balance_as_of(probes[rnd.randrange(len(probes))]), args.queries)
+    print(f"построение сумм {build:.3f} с")
+    print(f"баланс:      пересчет {recompute * 1000:9.2f} мс  по суммам {balance * 1e6:8.2f} мкс")
+    print(f"баланс на дату: пересчет {recompute_as_of * 1000:6.2f} мс  по суммам {as_of * 1e6:8.2f} мкс")
+
+    totals = tracker._get_totals()
+    record = records[rnd.randrange(args.size)]
+    update = timed(lambda: (totals.remove(record), totals.add(record)), args.queries)
+    print(f"поддержка при правке {update * 1e6:.2f} мкс")
+
+
+if __name__ == "__main__":
+    main()
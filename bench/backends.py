@@ -0,0 +1,56 @@
+"""
+Текстовый data.txt против SQLite: массовая загрузка, точечная правка, поиск и баланс.
+
+    python -m bench.backends --size 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date
+
+from bench.synth import iter_rows
+from main import PersonalTracker, Record, SqliteStorage, TextStorage
+
+
+def timed(func, repeat: int = 1) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def run(name: str, storage, records: list, edits: int) -> None:
+    rnd = random.Random(3)
+    size = len(records)
+    bulk = timed(lambda: PersonalTracker(records, storage).save_records_to_file())
+    tracker = PersonalTracker(storage=storage)
+    load = timed(lambda: tracker.load_records_from_file(trusted=True)) if not storage.queryable else 0.0
+    edit = timed(lambda: tracker.edit_record_in_file(rnd.randint(1, size), None, None, rnd.randint(1, 999), None),
+                 edits)
+    search = timed(lambda: tracker.find_records(date=date(2020, 3, 3), category="Доход"), 20)
+    month = timed(lambda: list(tracker.iter_find_records(date_from=date(2020, 3, 1), date_to=date(2020, 3, 31),
+                                                         amount_min=90000)), 20)
+    balance = timed(tracker.balance, 5)
+    print(f"{name:>7}: запись {bulk:7.2f} с  загрузка {load:7.2f} с  правка {edit * 1000:8.3f} мс  "
+          f"поиск {search * 1000:8.3f} мс  диапазон {month * 1000:8.3f} мс  баланс {balance * 1000:8.1f} мс")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="бенчмарк хранилищ")
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--edits", type=int, default=200)
+    args = parser.parse_args()
+
+    records = [Record(*row) for row in iter_rows(args.size)]
+    print(f"{args.size} записей")
+    with tempfile.TemporaryDirectory() as tmp:
+        run("text", TextStorage(os.path.join(tmp, "data.txt")), records, args.edits)
+        sqlite = SqliteStorage(os.path.join(tmp, "data.db"))
+        run("sqlite", sqlite, records, args.edits)
+        sqlite.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Пропускная способность импорта выписок: один процесс против пула процессов.
+
+    python -m bench.bulk_import --size 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from bench.synth import iter_rows
+from main import PersonalTracker, TextStorage
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="бенчмарк импорта CSV")
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bank.csv")
+        with open(path, 'w', encoding='utf8') as f:
+            f.write("date,category,amount,description\n")
+            for _, day, category, amount, description in iter_rows(args.size):
+                f.write(f"{day},{category},{amount},{description}\n")
+        print(f"{args.size} строк, {os.path.getsize(path) / 2**20:.0f} МБ")
+        for workers in args.workers:
+            ledger = os.path.join(tmp, f"data_{workers}.txt")
+            tracker = PersonalTracker([], TextStorage(ledger))
+            # При одном процессе файл разбирается одним куском
+            chunk_size = os.path.getsize(path) + 1 if workers == 1 else max(2**20, os.path.getsize(path) // (workers * 4))
+            start = time.perf_counter()
+            count, errors = tracker.import_records(path, workers=workers, chunk_size=chunk_size)
+            elapsed = time.perf_counter() - start
+            print(f"  процессов {workers:2}: {count / elapsed:12,.0f} строк/с  {elapsed:7.2f} с  ошибок {len(errors)}")
+
+
+if __name__ == "__main__":
+    main()
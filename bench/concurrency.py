@@ -0,0 +1,80 @@
+"""
+Несколько процессов пишут в один data.txt: каждый добавляет записи и правит свои, трекер загружен
+один раз в начале (или работает без загрузки, --indexed). Пропускная способность всех процессов вместе,
+задержки операций (ожидание блокировки, дочитывание чужих изменений, fsync) и проверка, что ни одна
+запись и правка не потеряны.
+
+    python -m bench.concurrency --size 100000 --processes 1 2 4 8 --ops 200
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import date
+
+from bench.suite import percentile
+from bench.synth import write_ledger
+from main import PersonalTracker, TextStorage
+
+
+def worker(path: str, number: int, ops: int, indexed: bool) -> tuple:
+    """
+    Возвращает (начало, конец) операций по часам time.time (общим для процессов) и задержки операций.
+    """
+    tracker = PersonalTracker(storage=TextStorage(path, indexed=indexed))
+    if not indexed:
+        tracker.load_records_from_file(trusted=True)
+    latencies = []
+    begin = time.time()
+    for i in range(ops):
+        description = f"процесс {number} запись {i}"
+        start = time.perf_counter()
+        tracker.add_record_and_save_file(date(2024, 6, 1), "Расход", 1, description)
+        latencies.append(time.perf_counter() - start)
+        # Своя запись - среди последних: после нее могли успеть дописать другие процессы
+        id = tracker.storage.max_id() if indexed else tracker.records[-1].id
+        while tracker.get_record(id).description != description:
+            id -= 1
+        start = time.perf_counter()
+        tracker.edit_record_in_file(id, None, None, i + 2, None)
+        latencies.append(time.perf_counter() - start)
+    return begin, time.time(), latencies
+
+
+def verify(path: str, size: int, processes: int, ops: int) -> bool:
+    tracker = PersonalTracker(storage=TextStorage(path))
+    tracker.load_records_from_file(trusted=True)
+    ids = sorted(r.id for r in tracker.records)
+    amounts = {r.description: r.amount for r in tracker.records[size:]}
+    return ids == list(range(1, size + processes * ops + 1)) and all(
+        amounts.get(f"процесс {number} запись {i}") == i + 2 for number in range(processes) for i in range(ops))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="бенчмарк одновременной записи несколькими процессами")
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--ops", type=int, default=200, help="добавлений (и столько же правок) на процесс")
+    parser.add_argument("--indexed", action="store_true", help="трекеры без загрузки записей (индекс смещений)")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+    print(f"{args.size} записей, {args.ops} добавлений и {args.ops} правок на процесс"
+          f"{', без загрузки' if args.indexed else ''}")
+    for processes in args.processes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = write_ledger(os.path.join(tmp, "data.txt"), args.size)
+            with context.Pool(processes) as pool:
+                results = pool.starmap(worker, [(path, number, args.ops, args.indexed) for number in range(processes)])
+            # Время от первой операции до последней, без запуска процессов и загрузки
+            elapsed = max(end for _, end, _ in results) - min(begin for begin, _, _ in results)
+            latencies = sorted(latency for _, _, result in results for latency in result)
+            ok = verify(path, args.size, processes, args.ops)
+        print(f"{processes:>3} процессов: {len(latencies) / elapsed:9,.0f} оп/с  "
+              f"p50 {percentile(latencies, 50) * 1000:8.3f}  p99 {percentile(latencies, 99) * 1000:8.3f}  "
+              f"макс {latencies[-1] * 1000:8.3f} мс  {'без потерь' if ok else 'ПОТЕРИ!'}")
+
+
+if __name__ == "__main__":
+    main()
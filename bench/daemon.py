@@ -0,0 +1,63 @@
+"""
+Задержка запросов: холодный запуск CLI (загрузка data.txt на каждый вызов)
+против запросов к прогретому серверу (python main.py serve).
+
+    python -m bench.daemon --size 1000000
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+from bench.synth import write_ledger
+from main import RemoteTracker
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+def measure(func, repeat: int) -> str:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return f"медиана {statistics.median(samples):10.2f} мс  макс {max(samples):10.2f} мс"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="бенчмарк сервера")
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_ledger(os.path.join(tmp, "data.txt"), args.size)
+        sock = os.path.join(tmp, "data.sock")
+        cli = lambda *argv: subprocess.run([sys.executable, MAIN, *argv], cwd=tmp, check=True, capture_output=True)
+        print(f"{args.size} записей")
+        print(f"  холодный CLI balance:        {measure(lambda: cli('balance'), args.repeat)}")
+
+        server = subprocess.Popen([sys.executable, MAIN, "serve", "--socket", sock], cwd=tmp, stdout=subprocess.PIPE)
+        try:
+            server.stdout.readline()
+            while not os.path.exists(sock):
+                time.sleep(0.05)
+            print(f"  CLI --server balance:        {measure(lambda: cli('--server', sock, 'balance'), args.repeat)}")
+            client = RemoteTracker(sock)
+            print(f"  клиент balance:              {measure(client.balance, args.repeat * 20)}")
+            print(f"  клиент search (день+категория): "
+                  f"{measure(lambda: client.find_records(date=date(2020, 3, 3), category='Доход'), args.repeat * 20)}")
+            print(f"  клиент edit:                 "
+                  f"{measure(lambda: client.edit_record_in_file(5, None, None, 77, None), args.repeat * 20)}")
+            client.close()
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
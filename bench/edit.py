@@ -0,0 +1,56 @@
+"""
+Правки в секунду: полная перезапись data.txt (как раньше) против журнала изменений.
+
+    python -m bench.edit --size 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from bench.synth import write_ledger
+from main import DATA_FILE, PersonalTracker
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="бенчмарк редактирования записей")
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--edits", type=int, default=1000)
+    parser.add_argument("--rewrites", type=int, default=3, help="число правок с полной перезаписью")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            write_ledger(DATA_FILE, args.size)
+            tracker = PersonalTracker()
+            tracker.load_records_from_file(trusted=True)
+            rnd = random.Random(2)
+
+            start = time.perf_counter()
+            for _ in range(args.rewrites):
+                tracker.get_record(rnd.randint(1, args.size)).amount = rnd.randint(1, 1000)
+                tracker.save_records_to_file()
+            rewrite = args.rewrites / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for _ in range(args.edits):
+                tracker.edit_record_in_file(rnd.randint(1, args.size), None, None, rnd.randint(1, 1000), None)
+            journal = args.edits / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            tracker.compact()
+            compact = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+
+    print(f"{args.size} записей")
+    print(f"  полная перезапись: {rewrite:10.2f} правок/с")
+    print(f"  журнал:            {journal:10.0f} правок/с")
+    print(f"  compact:           {compact:10.2f} с")
+
+
+if __name__ == "__main__":
+    main()
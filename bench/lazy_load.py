@@ -0,0 +1,62 @@
+"""
+Одиночные команды без загрузки data.txt: время и пик памяти (tracemalloc) от запуска до ответа
+для полной загрузки против индекса смещений - первый запуск (индекс строится) и повторный.
+
+    python -m bench.lazy_load --size 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from bench.synth import write_ledger
+from main import PersonalTracker, TextStorage
+
+
+def measure(func) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="бенчмарк ленивой загрузки data.txt")
+    parser.add_argument("--size", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    id = random.Random(1).randint(1, args.size)
+    commands = {
+        'get': lambda tracker: tracker.get_record(id),
+        'balance': lambda tracker: tracker.balance(),
+        'search': lambda tracker: sum(1 for _ in tracker.iter_find_records(category="Доход")),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_ledger(os.path.join(tmp, "data.txt"), args.size)
+        print(f"{args.size} записей, {os.path.getsize(path) / 2**20:.0f} МиБ")
+        for name, command in commands.items():
+            def eager():
+                tracker = PersonalTracker(storage=TextStorage(path))
+                tracker.load_records_from_file(trusted=True)
+                command(tracker)
+
+            def indexed():
+                command(PersonalTracker(storage=TextStorage(path, indexed=True)))
+
+            results = [("загрузка", measure(eager))]
+            offsets = TextStorage(path).offsets_path
+            if os.path.exists(offsets):
+                os.remove(offsets)
+            results.append(("индекс, первый", measure(indexed)))
+            results.append(("индекс, повтор", measure(indexed)))
+            for label, (elapsed, peak) in results:
+                print(f"{name:>8} {label:>15}: {elapsed:8.3f} с  пик {peak / 2**20:8.1f} МиБ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Сравнение загрузчиков data.txt: прежний (split + strptime + проверки Record)
+и потоковый iter_records. Каждый замер выполняется в отдельном процессе,
+чтобы пиковый RSS не смешивался между загрузчиками.
+
+    python -m bench.load --sizes 1000000 10000000
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from bench.synth import write_ledger
+from main import PersonalTracker, Record, iter_records
+
+
+def legacy_load(path: str) -> list:
+    """
+    Копия загрузчика до перехода на iter_records (для сравнения).
+    """
+    records = []
+    with open(path, 'r', encoding='utf8') as file:
+        cur = {}
+        for line in file:
+            line = line.strip()
+            if line:
+                key, value = line.split(':')
+                cur[key.strip().lower()] = value.strip()
+            elif cur:
+                records.append(Record(int(cur['id']), datetime.strptime(cur['дата'], "%Y-%m-%d").date(),
+                                      cur['категория'], int(cur['сумма']), cur['описание']))
+                cur = {}
+            else:
+                break
+    return records
+
+
+def _stream(path: str, trusted: bool) -> int:
+    with open(path, 'r', encoding='utf8') as file:
+        return sum(1 for _ in iter_records(file, trusted))
+
+
+LOADERS = {
+    'legacy': lambda path: len(legacy_load(path)),
+    'list': lambda path: len(list(PersonalTracker().iter_records_from_file(path))),
+    'list-trusted': lambda path: len(list(PersonalTracker().iter_records_from_file(path, trusted=True))),
+    'stream-trusted': lambda path: _stream(path, True),
+}
+
+
+def run_child(name: str, path: str) -> None:
+    start = time.perf_counter()
+    count = LOADERS[name](path)
+    elapsed = time.perf_counter() - start
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{count} {elapsed} {rss_mb}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="бенчмарк загрузки data.txt")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--loaders", nargs="+", choices=list(LOADERS), default=list(LOADERS))
+    parser.add_argument("--child", nargs=2, metavar=("LOADER", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(*args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = write_ledger(os.path.join(tmp, f"data_{size}.txt"), size)
+            print(f"== {size} записей, {os.path.getsize(path) / 2**20:.0f} МБ")
+            for name in args.loaders:
+                out = subprocess.run([sys.executable, "-m", "bench.load", "--child", name, path],
+                                     check=True, capture_output=True, text=True).stdout.split()
+                count, elapsed, rss = int(out[0]), float(out[1]), float(out[2])
+                print(f"{name:>15}: {count / elapsed:12,.0f} записей/с  {elapsed:8.2f} с  пик RSS {rss:8.0f} МБ")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Задержка поиска (равенство и диапазоны): индексы RecordIndex против
+прежнего линейного просмотра.
+
+    python -m bench.lookup --sizes 100000 1000000 10000000
+"""
+import argparse
+import random
+import time
+from datetime import date
+
+from bench.synth import iter_rows
+from main import PersonalTracker, Record, RecordStore
+
+
+def scan(records, date_from=None, date_to=None, amount_min=None, amount_max=None, **kwargs) -> list:
+    """
+    Прежний find_records (просмотр всех записей с getattr на каждое условие)
+    плюс фильтрация диапазонов на стороне клиента.
+    """
+    return [r for r in records if all(getattr(r, key) == value for key, value in kwargs.items())
+            and (date_from is None or r.date >= date_from) and (date_to is None or r.date <= date_to)
+            and (amount_min is None or r.amount >= amount_min) and (amount_max is None or r.amount <= amount_max)]
+
+
+def latency(func, queries) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        func(**query)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="бенчмарк поиска по индексам")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--store", action="store_true", help="хранить записи в RecordStore")
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    for size in args.sizes:
+        storage = RecordStore if args.store else list
+        tracker = PersonalTracker(storage(Record(*row) for row in iter_rows(size)))
+        start = time.perf_counter()
+        tracker.find_records(id=1)
+        print(f"== {size} записей, построение индексов {time.perf_counter() - start:.2f} с")
+        day = lambda: date.fromordinal(date(2015, 1, 1).toordinal() + rnd.randrange(3650))
+        cases = {
+            'id': [{'id': rnd.randint(1, size)} for _ in range(args.queries)],
+            'date': [{'date': day()} for _ in range(args.queries)],
+            'date+category': [{'date': day(), 'category': 'Доход'} for _ in range(args.queries)],
+            'amount': [{'amount': rnd.randint(1, 100000)} for _ in range(args.queries)],
+            'month+amount_min': [{'date_from': date(2020, m, 1), 'date_to': date(2020, m, 28), 'amount_min': 99000,
+                                  'category': 'Расход'} for m in range(1, args.queries % 12 + 2)],
+            'amount range': [{'amount_min': 500, 'amount_max': 510} for _ in range(args.queries)],
+        }
+        for name, queries in cases.items():
+            indexed = latency(tracker.find_records, queries)
+            scanned = latency(lambda **kw: scan(tracker.records, **kw), queries[:3])
+            print(f"{name:>15}: индекс {indexed:10.3f} мс   просмотр {scanned:10.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Память на запись: список объектов Record против колоночного RecordStore.
+
+    python -m bench.memory --size 1000000
+"""
+import argparse
+import tracemalloc
+
+from bench.synth import iter_rows
+from main import Record, RecordStore
+
+
+def measure(build) -> int:
+    tracemalloc.start()
+    data = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    return current
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="бенчмарк памяти хранилищ записей")
+    parser.add_argument("--size", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    layouts = {
+        'list[Record]': lambda: [Record(*row) for row in iter_rows(args.size)],
+        'RecordStore': lambda: RecordStore(Record(*row) for row in iter_rows(args.size)),
+    }
+    for name, build in layouts.items():
+        used = measure(build)
+        print(f"{name:>13}: {used / args.size:8.1f} байт/запись  ({used / 2**20:.0f} МБ на {args.size} записей)")
+
+
+if __name__ == "__main__":
+    main()
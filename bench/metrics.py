@@ -0,0 +1,61 @@
+"""
+Накладные расходы метрик: методы PersonalTracker при выключенных METRICS (в классе исходные функции)
+и при включенных (замеряющие обертки) на коротких операциях, где обертка заметнее всего, и на загрузке.
+
+    python -m bench.metrics --size 100000
+"""
+import argparse
+import os
+import random
+import tempfile
+
+from bench.backends import timed
+from bench.synth import iter_rows, write_ledger
+from main import METRICS, PersonalTracker, Record, TextStorage
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="бенчмарк накладных расходов метрик")
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rnd = random.Random(2)
+    tracker = PersonalTracker([Record(*row) for row in iter_rows(args.size)])
+    tracker.balance()
+    ids = [rnd.randint(1, args.size) for _ in range(args.calls)]
+    operations = {
+        'get': lambda: [tracker.get_record(id) for id in ids],
+        'balance': lambda: [tracker.balance() for _ in ids],
+        'find': lambda: [list(tracker.iter_find_records(id=id)) for id in ids],
+    }
+    print(f"{args.size} записей, {args.calls} вызовов")
+    for name, run in operations.items():
+        # Прогрев (индексы строятся при первом обращении), затем лучшее из нескольких повторов
+        run()
+        disabled = min(timed(run) for _ in range(args.repeat))
+        METRICS.enabled = True
+        enabled = min(timed(run) for _ in range(args.repeat))
+        METRICS.enabled = False
+        per_call = 1e9 / args.calls
+        print(f"{name:>8}: выключены {disabled * per_call:7.0f} нс  включены {enabled * per_call:7.0f} нс "
+              f"({(enabled / disabled - 1) * 100:+5.1f}%)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_ledger(os.path.join(tmp, "data.txt"), args.size)
+
+        def load():
+            PersonalTracker(storage=TextStorage(path)).load_records_from_file(trusted=True)
+
+        disabled = min(timed(load) for _ in range(args.repeat))
+        METRICS.enabled = True
+        enabled = min(timed(load) for _ in range(args.repeat))
+        METRICS.enabled = False
+        print(f"{'load':>8}: выключены {disabled:7.3f} с  включены {enabled:7.3f} с "
+              f"({(enabled / disabled - 1) * 100:+5.1f}%)")
+    METRICS.reset()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Кеш запросов (QueryCache): задержка повторяющихся find_records и balance, как у панели мониторинга,
+без кеша и с кешем, в том числе с редкими правками между запросами (--write-every) и для трекера
+без загрузки записей (индекс смещений), где каждый промах - проход по файлу.
+
+    python -m bench.query_cache --size 1000000 --queries 20 --calls 2000 --write-every 100
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from bench.suite import percentile
+from bench.synth import iter_rows, write_ledger
+from main import PersonalTracker, Record, TextStorage
+
+
+def workload(count: int, seed: int) -> list:
+    """
+    count разных запросов панели: день и категория, месяц, крупные суммы, баланс.
+    """
+    rnd = random.Random(seed)
+    start = date(2015, 1, 1)
+    queries = []
+    for _ in range(count):
+        day = start + timedelta(days=rnd.randrange(3650))
+        queries.append(rnd.choice((
+            ('find', {'date': day, 'category': "Доход"}),
+            ('find', {'date_from': day, 'date_to': day + timedelta(days=30)}),
+            ('find', {'amount_min': 99900}),
+            ('balance', {}),
+        )))
+    return queries
+
+
+def run(tracker: PersonalTracker, queries: list, calls: int, write_every: int, size: int) -> list:
+    rnd = random.Random(1)
+    latencies = []
+    for call in range(1, calls + 1):
+        if write_every and call % write_every == 0:
+            tracker.edit_record_in_file(rnd.randint(1, size), None, None, rnd.randint(1, 100000), None)
+        op, params = rnd.choice(queries)
+        start = time.perf_counter()
+        if op == 'find':
+            tracker.find_records(**params)
+        else:
+            tracker.balance()
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+
+def report(label: str, latencies: list, tracker: PersonalTracker) -> None:
+    stats = tracker.query_cache.stats() if tracker.query_cache is not None else None
+    hits = f"  попаданий {stats['hits'] / (stats['hits'] + stats['misses']):6.1%}" if stats else ""
+    print(f"{label:>24}: p50 {percentile(latencies, 50) * 1e6:10.1f}  p99 {percentile(latencies, 99) * 1e6:10.1f}  "
+          f"среднее {sum(latencies) / len(latencies) * 1e6:10.1f} мкс{hits}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="бенчмарк кеша запросов")
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=20, help="разных запросов в потоке")
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--write-every", type=int, default=100, help="правка после каждых N запросов (0 - без правок)")
+    parser.add_argument("--cache-size", type=int, default=256)
+    args = parser.parse_args()
+
+    queries = workload(args.queries, 2)
+    rows = list(iter_rows(args.size))
+    print(f"{args.size} записей, {args.queries} разных запросов, {args.calls} вызовов, "
+          f"правка каждые {args.write_every or '-'}")
+    # Правки в памяти: запись в журнал здесь не замеряется
+    with patch.object(TextStorage, 'update'):
+        for cache_size in (0, args.cache_size):
+            tracker = PersonalTracker([Record(*row) for row in rows], cache_size=cache_size)
+            tracker.balance()
+            report(f"в памяти, кеш {cache_size}", run(tracker, queries, args.calls, args.write_every, args.size),
+                   tracker)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_ledger(os.path.join(tmp, "data.txt"), args.size)
+        calls = max(1, args.calls // 20)
+        for cache_size in (0, args.cache_size):
+            tracker = PersonalTracker(storage=TextStorage(path, indexed=True), cache_size=cache_size)
+            report(f"без загрузки, кеш {cache_size}", run(tracker, queries, calls, 0, args.size), tracker)
+
+
+if __name__ == "__main__":
+    main()
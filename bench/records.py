@@ -0,0 +1,101 @@
+"""
+Создание записей: прежний Record (словарь атрибутов и цепочка проверок в __setattr__) против Record
+со __slots__ - проверяемый конструктор, make_record(trusted=True) и массовый make_records;
+память на объект; построчная проверка полей против validate_columns.
+
+    python -m bench.records --size 1000000
+"""
+import argparse
+import tracemalloc
+from datetime import date
+
+from bench.backends import timed
+from bench.synth import iter_rows
+from main import Record, make_record, make_records, validate_amount, validate_category, validate_columns, \
+    validate_date, validate_description
+
+
+class LegacyRecord:
+    """
+    Копия Record до перехода на __slots__ (для сравнения).
+    """
+    def __init__(self, id, date, category, amount, description):
+        self.id = id
+        self.date = date
+        self.category = category
+        self.amount = amount
+        self.description = description
+
+    def __setattr__(self, key, value):
+        if key == 'id' and not isinstance(value, int):
+            raise ValueError("id неверного типа данных")
+        elif key == 'date' and not isinstance(value, date):
+            raise ValueError("date неверного типа данных")
+        elif key == 'category' and value not in ('Доход', 'Расход'):
+            raise ValueError("category неверного типа данных", value, type(value))
+        elif key == 'amount' and not isinstance(value, (int, float)) and value <= 0:
+            raise ValueError("amount неверного типа данных")
+        elif key == 'description' and not isinstance(value, str):
+            raise ValueError("description неверного типа данных")
+        return super().__setattr__(key, value)
+
+
+def legacy_trusted(id, day, category, amount, description):
+    record = LegacyRecord.__new__(LegacyRecord)
+    record.__dict__.update(id=id, date=day, category=category, amount=amount, description=description)
+    return record
+
+
+def legacy_validate(rows, today):
+    """
+    Прежняя проверка импорта: строка за строкой, все поля каждой строки подряд.
+    """
+    valid, errors = [], []
+    for number, (day, category, amount, description) in enumerate(rows):
+        try:
+            valid.append((validate_date(day, today), validate_category(category), validate_amount(amount),
+                          validate_description(description)))
+        except ValueError as e:
+            errors.append((number, str(e)))
+    return valid, errors
+
+
+def per_object(build) -> float:
+    tracemalloc.start()
+    data = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / len(data)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="бенчмарк создания записей")
+    parser.add_argument("--size", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rows = list(iter_rows(args.size))
+    print(f"{args.size} записей")
+    builders = {
+        'прежний Record(...)': lambda: [LegacyRecord(*row) for row in rows],
+        'Record(...)': lambda: [Record(*row) for row in rows],
+        'прежний доверенный': lambda: [legacy_trusted(*row) for row in rows],
+        'make_record(trusted)': lambda: [make_record(*row, trusted=True) for row in rows],
+        'make_records': lambda: list(make_records(rows)),
+    }
+    for name, build in builders.items():
+        elapsed = timed(build)
+        print(f"{name:>21}: {args.size / elapsed:12,.0f} записей/с  {per_object(build):6.1f} байт/запись")
+
+    # Строки выписки: каждая сотая - с ошибкой в сумме
+    raw = [(day.isoformat(), category, "0" if id % 100 == 0 else str(amount), description)
+           for id, day, category, amount, description in rows]
+    today = date.today()
+    legacy = timed(lambda: legacy_validate(raw, today))
+    columns = list(zip(*raw))
+    batch = timed(lambda: validate_columns(*columns, today=today))
+    print(f"проверка {args.size} строк: построчно {legacy:.2f} с, колонками {batch:.2f} с "
+          f"(ошибок {len(validate_columns(*columns, today=today)[1])})")
+
+
+if __name__ == "__main__":
+    main()
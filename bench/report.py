@@ -0,0 +1,34 @@
+"""
+Время отчетов report()/balance() по списку Record и по RecordStore.
+
+    python -m bench.report --size 10000000
+"""
+import argparse
+import time
+
+from bench.synth import iter_rows
+from main import PersonalTracker, Record, RecordStore
+
+
+def timed(label: str, func) -> None:
+    start = time.perf_counter()
+    func()
+    print(f"{label:>40}: {time.perf_counter() - start:8.3f} с")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="бенчмарк агрегации")
+    parser.add_argument("--size", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    for name, storage in (('list[Record]', list), ('RecordStore', RecordStore)):
+        tracker = PersonalTracker(storage(Record(*row) for row in iter_rows(args.size)))
+        print(f"== {name}, {args.size} записей")
+        timed("balance()", tracker.balance)
+        timed("report(period='month')", lambda: tracker.report(period='month'))
+        timed("report(period='year', by_category=True)", lambda: tracker.report(period='year', by_category=True))
+        timed("report(keyword='такси')", lambda: tracker.report(keyword='такси'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+data.txt против помесячного хранилища на 10-летнем журнале: миграция, открытие с балансом,
+поиск за месяц, отчет за год и точечная правка.
+
+    python -m bench.sharded --size 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+from datetime import date
+
+from bench.backends import timed
+from bench.synth import iter_rows
+from main import PersonalTracker, Record, ShardedStorage, TextStorage
+
+
+def run(name: str, make_storage, edits: int, size: int) -> None:
+    rnd = random.Random(3)
+
+    def open_balance():
+        tracker = PersonalTracker(storage=make_storage())
+        if not tracker.storage.queryable:
+            tracker.load_records_from_file(trusted=True)
+        return tracker.balance()
+
+    balance = timed(open_balance)
+    tracker = PersonalTracker(storage=make_storage())
+    load = timed(lambda: tracker.load_records_from_file(trusted=True)) if not tracker.storage.queryable else 0.0
+    month = timed(lambda: list(tracker.iter_find_records(date_from=date(2020, 3, 1), date_to=date(2020, 3, 31))), 5)
+    year = timed(lambda: tracker.report(period='month', date_from=date(2020, 1, 1), date_to=date(2020, 12, 31)), 3)
+    edit = timed(lambda: tracker.edit_record_in_file(rnd.randint(1, size), None, None, rnd.randint(1, 999), None),
+                 edits)
+    print(f"{name:>7}: открытие+баланс {balance:7.3f} с  загрузка {load:7.2f} с  месяц {month * 1000:8.1f} мс  "
+          f"год по месяцам {year * 1000:8.1f} мс  правка {edit * 1000:8.3f} мс")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="бенчмарк помесячного хранилища")
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--edits", type=int, default=50)
+    args = parser.parse_args()
+
+    # iter_rows по умолчанию раскладывает записи на 3650 дней - 10 лет, 120 месяцев
+    records = [Record(*row) for row in iter_rows(args.size)]
+    print(f"{args.size} записей за 10 лет")
+    with tempfile.TemporaryDirectory() as tmp:
+        text_path = os.path.join(tmp, "data.txt")
+        PersonalTracker(records, TextStorage(text_path)).save_records_to_file()
+        shard_path = os.path.join(tmp, "ledger")
+        migrate = timed(lambda: PersonalTracker(records, ShardedStorage(shard_path)).save_records_to_file())
+        print(f"миграция data.txt -> {len(ShardedStorage(shard_path).partitions)} месяцев: {migrate:.2f} с")
+        run("text", lambda: TextStorage(text_path), args.edits, args.size)
+        run("sharded", lambda: ShardedStorage(shard_path), args.edits, args.size)
+
+
+if __name__ == "__main__":
+    main()
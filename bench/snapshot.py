@@ -0,0 +1,44 @@
+"""
+Текстовый data.txt против бинарного снимка: размер файла, время старта и balance().
+
+    python -m bench.snapshot --size 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from bench.synth import write_ledger
+from main import PersonalTracker
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="бенчмарк бинарного снимка")
+    parser.add_argument("--size", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        text = write_ledger(os.path.join(tmp, "data.txt"), args.size)
+        snapshot = os.path.join(tmp, "data.bin")
+        tracker = PersonalTracker()
+        load_text = timed(lambda: tracker.records.extend(tracker.iter_records_from_file(text, trusted=True)))
+        tracker.save_snapshot(snapshot)
+
+        mapped = PersonalTracker()
+        load_snapshot = timed(lambda: mapped.load_snapshot(snapshot))
+        print(f"{args.size} записей")
+        print(f"  размер:  текст {os.path.getsize(text) / 2**20:8.1f} МБ   снимок {os.path.getsize(snapshot) / 2**20:8.1f} МБ")
+        print(f"  старт:   текст {load_text:8.3f} с    снимок {load_snapshot:8.4f} с")
+        print(f"  balance: текст {timed(tracker.balance):8.3f} с    снимок {timed(mapped.balance):8.3f} с")
+        print(f"  report(period='month'): текст {timed(lambda: tracker.report(period='month')):8.3f} с"
+              f"    снимок {timed(lambda: mapped.report(period='month')):8.3f} с")
+
+
+if __name__ == "__main__":
+    main()
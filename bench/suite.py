@@ -0,0 +1,236 @@
+"""
+Набор бенчмарков PersonalTracker для отслеживания регрессий: загрузка, сохранение, добавление, правка,
+поиск и баланс на синтетических журналах от 10 тысяч до 10 миллионов записей.
+
+Для каждой операции - пропускная способность, перцентили задержки (p50, p95, p99, максимум) и пик памяти
+(tracemalloc, отдельным проходом, чтобы не искажать время). Каждый размер замеряется в отдельном процессе,
+его пиковый RSS тоже попадает в результат. Результаты пишутся в JSON; с --baseline они сравниваются
+с прежним запуском, и при замедлении больше порога (--threshold) код выхода 1.
+
+    python -m bench.suite --sizes 10000 100000 1000000 10000000 --output bench_results.json
+    python -m bench.suite --sizes 10000 100000 --baseline bench_baseline.json --threshold 0.25
+    python -m bench.suite --check bench_results.json --baseline bench_baseline.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+from bench.synth import DESCRIPTIONS, write_ledger
+from main import PersonalTracker, TextStorage
+
+OPERATIONS = ('load', 'save', 'find', 'balance', 'add', 'edit')
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples: list, p: float) -> float:
+    """
+    Перцентиль по ближайшему рангу для отсортированного списка samples.
+    """
+    return samples[max(0, min(len(samples) - 1, math.ceil(p / 100 * len(samples)) - 1))]
+
+
+def summarize(samples: list, items: int) -> dict:
+    """
+    Сводка по задержкам samples (секунды): items - сколько единиц (записей или операций) обработано за все замеры.
+    """
+    samples = sorted(samples)
+    result = {'samples': len(samples), 'throughput': items / sum(samples) if sum(samples) else None}
+    for p in PERCENTILES:
+        result[f'p{p}_ms'] = percentile(samples, p) * 1000
+    result['max_ms'] = samples[-1] * 1000
+    return result
+
+
+def measure_peak(func) -> float:
+    """
+    Пик памяти Python (МиБ) во время вызова func сверх уже занятой.
+    """
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (peak - base) / 2**20
+
+
+def run_size(size: int, args) -> dict:
+    """
+    Замеряет все операции на журнале из size записей (выполняется в дочернем процессе).
+    """
+    rnd = random.Random(args.seed + 1)
+    start = date(2015, 1, 1)
+
+    def day() -> date:
+        return start + timedelta(days=rnd.randrange(args.days))
+
+    def month(first: date) -> dict:
+        return {'date_from': first, 'date_to': first + timedelta(days=30), 'amount_min': 90000}
+
+    # Точный день, день и категория, месяц с крупными суммами, самые крупные суммы
+    queries = [lambda: {'date': day()}, lambda: {'date': day(), 'category': "Доход"}, lambda: month(day()),
+               lambda: {'amount_min': 99990}]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_ledger(os.path.join(tmp, "data.txt"), size, args.seed, days=args.days,
+                            income_share=args.income_share, vocabulary=args.vocabulary, words=tuple(args.words))
+
+        def load() -> PersonalTracker:
+            tracker = PersonalTracker(storage=TextStorage(path))
+            tracker.load_records_from_file(trusted=True)
+            return tracker
+
+        def sample(func, count: int) -> list:
+            latencies = []
+            for _ in range(count):
+                begin = time.perf_counter()
+                func()
+                latencies.append(time.perf_counter() - begin)
+            return latencies
+
+        tracker = load()
+        samples = {
+            'load': sample(load, args.repeat),
+            'save': sample(tracker.save_records_to_file, args.repeat),
+            'find': sample(lambda: tracker.find_records(**rnd.choice(queries)()), args.samples),
+            'balance': sample(tracker.balance, args.samples),
+            'add': sample(lambda: tracker.add_record_and_save_file(day(), "Расход", rnd.randint(1, 1000), "Кафе"),
+                          args.samples),
+            'edit': sample(lambda: tracker.edit_record_in_file(
+                rnd.randint(1, size), None, None, rnd.randint(1, 1000), None), args.samples),
+        }
+        operations = {name: summarize(samples[name], size * len(samples[name]) if name in ('load', 'save')
+                                      else len(samples[name])) for name in OPERATIONS}
+        if args.memory:
+            # Отдельный проход под tracemalloc: он замедляет выделения памяти в разы
+            peaks = {
+                'load': load,
+                'save': tracker.save_records_to_file,
+                'find': lambda: tracker.find_records(**month(start)),
+                'balance': lambda: PersonalTracker(tracker.records).balance(),
+                'add': lambda: tracker.add_record_and_save_file(start, "Доход", 1, "Кафе"),
+                'edit': lambda: tracker.edit_record_in_file(1, None, None, 2, None),
+            }
+            for name, func in peaks.items():
+                operations[name]['peak_mb'] = measure_peak(func)
+        return {'file_mb': os.path.getsize(path) / 2**20, 'operations': operations,
+                'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def compare(baseline: dict, current: dict, threshold: float, noise_ms: float) -> list:
+    """
+    Сравнивает результаты с baseline; возвращает описания регрессий: медиана задержки или пик памяти
+    выросли больше чем в 1 + threshold раз (и медиана - больше чем на noise_ms, чтобы не ловить шум).
+    """
+    regressions = []
+    for size, result in current['results'].items():
+        before = baseline['results'].get(size)
+        if before is None:
+            continue
+        for name, stats in result['operations'].items():
+            old = before['operations'].get(name)
+            if old is None:
+                continue
+            ratio = stats['p50_ms'] / old['p50_ms'] if old['p50_ms'] else 1.0
+            line = f"{size:>9} {name:>8}: p50 {old['p50_ms']:10.3f} -> {stats['p50_ms']:10.3f} мс ({ratio - 1:+7.1%})"
+            if ratio > 1 + threshold and stats['p50_ms'] - old['p50_ms'] > noise_ms:
+                regressions.append(line)
+            if old.get('peak_mb') and stats.get('peak_mb') and stats['peak_mb'] > old['peak_mb'] * (1 + threshold) \
+                    and stats['peak_mb'] - old['peak_mb'] > 1:
+                regressions.append(f"{size:>9} {name:>8}: пик памяти {old['peak_mb']:.1f} -> {stats['peak_mb']:.1f} МиБ")
+            print(line)
+    return regressions
+
+
+def report(results: dict) -> None:
+    for size, result in results['results'].items():
+        print(f"== {int(size)} записей, {result['file_mb']:.0f} МиБ, пик RSS {result['rss_mb']:.0f} МиБ")
+        for name, stats in result['operations'].items():
+            unit = "записей/с" if name in ('load', 'save') else "оп/с"
+            peak = f"  пик {stats['peak_mb']:8.1f} МиБ" if 'peak_mb' in stats else ""
+            print(f"{name:>8}: {stats['throughput']:14,.0f} {unit:<9}  p50 {stats['p50_ms']:9.3f}  "
+                  f"p95 {stats['p95_ms']:9.3f}  p99 {stats['p99_ms']:9.3f}  макс {stats['max_ms']:9.3f} мс{peak}")
+
+
+def child_command(size: int, args) -> list:
+    command = [sys.executable, "-m", "bench.suite", "--child", str(size), "--seed", str(args.seed),
+               "--samples", str(args.samples), "--repeat", str(args.repeat), "--days", str(args.days),
+               "--income-share", str(args.income_share), "--words", *map(str, args.words)]
+    if args.vocabulary_file:
+        command += ["--vocabulary", args.vocabulary_file]
+    if not args.memory:
+        command.append("--no-memory")
+    return command
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="набор бенчмарков с проверкой регрессий")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--samples", type=int, default=200, help="замеров коротких операций на размер")
+    parser.add_argument("--repeat", type=int, default=3, help="замеров загрузки и сохранения на размер")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--days", type=int, default=3650, help="длина периода журнала в днях")
+    parser.add_argument("--income-share", type=float, default=0.3, help="доля доходов")
+    parser.add_argument("--vocabulary", dest="vocabulary_file", help="файл со словами описаний, по одному на строку")
+    parser.add_argument("--words", type=int, nargs=2, default=(1, 1), metavar=("MIN", "MAX"),
+                        help="число слов в описании")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="не замерять пик памяти")
+    parser.add_argument("--output", default="bench_results.json", help="куда записать результаты")
+    parser.add_argument("--baseline", help="результаты прежнего запуска для проверки регрессий")
+    parser.add_argument("--threshold", type=float, default=0.25, help="допустимое замедление (0.25 - на 25%%)")
+    parser.add_argument("--noise-ms", type=float, default=0.05, help="разница медиан, которая считается шумом")
+    parser.add_argument("--check", metavar="RESULTS", help="только сравнить RESULTS с --baseline, без замеров")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    args.vocabulary = DESCRIPTIONS
+    if args.vocabulary_file:
+        with open(args.vocabulary_file, encoding='utf8') as f:
+            args.vocabulary = [line.strip() for line in f if line.strip()]
+    if args.child:
+        print(json.dumps(run_size(args.child, args)))
+        return
+
+    if args.check:
+        if not args.baseline:
+            parser.error("--check сравнивает с --baseline")
+        with open(args.check, encoding='utf8') as f:
+            results = json.load(f)
+    else:
+        results = {
+            'meta': {'created': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+                     'platform': platform.platform(), 'seed': args.seed, 'days': args.days,
+                     'income_share': args.income_share, 'words': list(args.words),
+                     'vocabulary': len(args.vocabulary)},
+            'results': {},
+        }
+        for size in args.sizes:
+            out = subprocess.run(child_command(size, args), check=True, capture_output=True, text=True).stdout
+            results['results'][str(size)] = json.loads(out)
+        with open(args.output, 'w', encoding='utf8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        report(results)
+        print(f"Результаты записаны в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold, args.noise_ms)
+        if regressions:
+            print(f"Регрессии (порог {args.threshold:.0%}):")
+            for line in regressions:
+                print(line)
+            sys.exit(1)
+        print("Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Генерация синтетических файлов в формате data.txt.
+
+Параметры журнала - размер, период, доля доходов, словарь описаний - настраиваются:
+
+    python -m bench.synth data.txt --size 1000000 --start 2015-01-01 --days 3650 --income-share 0.3 \
+        --vocabulary words.txt --words 1 3
+"""
+import argparse
+import random
+from datetime import date, timedelta
+from typing import Sequence, Tuple
+
+from main import parse_date
+
+DESCRIPTIONS = ("Покупка продуктов", "Услуга", "Инвестиции", "Путешествие", "Зарплата",
+                "Такси", "Кафе", "Аренда", "Подарок", "Коммунальные платежи")
+
+
+def iter_rows(count: int, seed: int = 0, start: date = date(2015, 1, 1), days: int = 3650,
+              income_share: float = 0.3, vocabulary: Sequence[str] = DESCRIPTIONS, words: Tuple[int, int] = (1, 1),
+              amount_max: int = 100000):
+    """
+    Возвращает кортежи (id, дата, категория, сумма, описание) для count записей.
+    - Даты равномерно распределены по days дням от start, доля доходов - income_share.
+    - Описание - от words[0] до words[1] разных слов из vocabulary (по умолчанию - одна фраза из DESCRIPTIONS).
+    - При одинаковых параметрах и seed записи совпадают между запусками.
+    """
+    rnd = random.Random(seed)
+    low, high = min(words[0], len(vocabulary)), min(words[1], len(vocabulary))
+    for id in range(1, count + 1):
+        day = start + timedelta(days=rnd.randrange(days))
+        category = "Доход" if rnd.random() < income_share else "Расход"
+        amount = rnd.randint(1, amount_max)
+        if high == 1:
+            description = rnd.choice(vocabulary)
+        else:
+            description = " ".join(rnd.sample(vocabulary, rnd.randint(low, high))).capitalize()
+        yield id, day, category, amount, description
+
+
+def write_ledger(path: str, count: int, seed: int = 0, **options) -> str:
+    """
+    Записывает в path файл из count синтетических записей и возвращает path.
+    options - параметры журнала для iter_rows (start, days, income_share, vocabulary, words, amount_max).
+    """
+    with open(path, 'w', encoding='utf8', buffering=2**20) as f:
+        for id, d, category, amount, description in iter_rows(count, seed, **options):
+            f.write(f"id: {id}\nДата: {d}\nКатегория: {category}\nСумма: {amount}\nОписание: {description}\n\n")
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="генератор синтетического data.txt")
+    parser.add_argument("path", help="куда записать журнал")
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start", type=parse_date, default=date(2015, 1, 1), help="первая дата YYYY-MM-DD")
+    parser.add_argument("--days", type=int, default=3650, help="длина периода в днях")
+    parser.add_argument("--income-share", type=float, default=0.3, help="доля доходов")
+    parser.add_argument("--amount-max", type=int, default=100000)
+    parser.add_argument("--vocabulary", help="файл со словами описаний, по одному на строку")
+    parser.add_argument("--words", type=int, nargs=2, default=(1, 1), metavar=("MIN", "MAX"),
+                        help="число слов в описании")
+    args = parser.parse_args()
+
+    vocabulary = DESCRIPTIONS
+    if args.vocabulary:
+        with open(args.vocabulary, encoding='utf8') as f:
+            vocabulary = [line.strip() for line in f if line.strip()]
+    write_ledger(args.path, args.size, args.seed, start=args.start, days=args.days, income_share=args.income_share,
+                 vocabulary=vocabulary, words=tuple(args.words), amount_max=args.amount_max)
+
+
+if __name__ == "__main__":
+    main()
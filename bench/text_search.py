@@ -0,0 +1,67 @@
+"""
+Полнотекстовый поиск по описаниям: построение инвертированного индекса, его сохранение и чтение,
+задержка запросов (слово, AND, OR, префикс, с фильтром по дате) против поиска подстроки полным просмотром.
+
+    python -m bench.text_search --size 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date
+
+from bench.backends import timed
+from bench.synth import iter_rows
+from main import PersonalTracker, Record, TextIndex
+
+WORDS = ("такси", "метро", "кафе", "ресторан", "продукты", "аренда", "зарплата", "премия", "подарок", "аптека",
+         "бензин", "парковка", "ремонт", "квартира", "отпуск", "билеты", "кино", "театр", "книги", "одежда",
+         "обувь", "интернет", "телефон", "налоги", "страховка", "врач", "спорт", "школа", "курсы", "дача")
+QUERIES = (("слово", {"text": "такси"}), ("AND", {"text": "такси аэропорт"}), ("OR", {"text": "кино OR театр"}),
+           ("префикс", {"text": "рест*"}),
+           ("с датой", {"text": "аптека", "date_from": date(2020, 1, 1), "date_to": date(2020, 1, 31)}))
+
+
+def description(rnd: random.Random) -> str:
+    words = rnd.sample(WORDS, rnd.randint(1, 3))
+    if rnd.random() < 0.05:
+        words.append("аэропорт")
+    return " ".join(words).capitalize()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="бенчмарк полнотекстового поиска")
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rnd = random.Random(11)
+    records = [Record(id, day, category, amount, description(rnd))
+               for id, day, category, amount, _ in iter_rows(args.size)]
+    tracker = PersonalTracker(records)
+    print(f"{args.size} описаний")
+    build = timed(lambda: TextIndex(records))
+    index = tracker._get_text_index()
+    print(f"построение индекса {build:.2f} с, основ {len(index.postings)}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data_text.idx")
+        save = timed(lambda: index.save(path, (0, 0, 0, 0)))
+        load = timed(lambda: TextIndex.load(path, (0, 0, 0, 0)))
+        print(f"сохранение {save:.2f} с, чтение {load:.2f} с, файл {os.path.getsize(path) / 2**20:.1f} МиБ")
+
+    for name, query in QUERIES:
+        latencies = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            found = sum(1 for _ in tracker.iter_find_records(**query))
+            latencies.append(time.perf_counter() - start)
+        print(f"{name:>8}: найдено {found:7d}  медиана {statistics.median(latencies) * 1000:8.2f} мс  "
+              f"максимум {max(latencies) * 1000:8.2f} мс")
+    scan = timed(lambda: sum(1 for r in records if "такси" in r.description.lower()), 3)
+    print(f"подстрока полным просмотром: {scan * 1000:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
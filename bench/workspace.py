@@ -0,0 +1,49 @@
+"""
+Итоги по множеству журналов (Workspace): последовательно и в пуле процессов, запуск без сохраненных сумм
+(записи разбираются), запуск по суммам, сохраненным рядом с журналами при работе с ними (сам отчет их
+не сохраняет), и повторный запрос к тому же Workspace (кеш по отпечаткам журналов - журналы не читаются).
+
+    python -m bench.workspace --ledgers 1000 --size 2000
+"""
+import argparse
+import glob
+import os
+import tempfile
+
+from bench.backends import timed
+from bench.synth import write_ledger
+from main import PersonalTracker, TextStorage, Workspace
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="бенчмарк отчетов по множеству журналов")
+    parser.add_argument("--ledgers", type=int, default=1000)
+    parser.add_argument("--size", type=int, default=2000, help="записей в журнале")
+    parser.add_argument("--workers", type=int, help="процессов в пуле (по умолчанию - по числу ядер)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for number in range(args.ledgers):
+            write_ledger(os.path.join(tmp, f"client{number}.txt"), args.size, seed=number)
+        print(f"{args.ledgers} журналов по {args.size} записей")
+
+        for label, workers in (("последовательно", 1), ("пул процессов", args.workers)):
+            for path in glob.glob(os.path.join(tmp, "*_totals.bin")):
+                os.remove(path)
+            with Workspace.discover(tmp, workers) as workspace:
+                cold = timed(workspace.balance)
+                cached = timed(workspace.balance)
+                keyword = timed(lambda: workspace.report(period='month', keyword="такси"))
+                # Суммы сохраняет трекер, работающий с журналом (например, команда balance по нему)
+                for path in workspace.paths:
+                    tracker = PersonalTracker(storage=TextStorage(path))
+                    tracker.load_records_from_file(trusted=True)
+                    tracker.balance()
+            with Workspace.discover(tmp, workers) as workspace:
+                warm = timed(workspace.balance)
+            print(f"{label:>16}: первый {cold:7.3f} с  по суммам {warm:7.3f} с  из кеша {cached * 1000:8.2f} мс  "
+                  f"с keyword {keyword:7.3f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,202 +2,4242 @@
 from datetime import datetime,date
 import os
 import argparse
-from typing import List, Optional, Tuple, Union
+import asyncio
+import cProfile
+import csv
+import functools
+import heapq
+import inspect
+import io
+import json
+import mmap
+import pstats
+import re
+import signal
+import socket
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext, suppress
+from itertools import compress
+from operator import attrgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: блокировок между процессами нет, см. FileLock
+    fcntl = None
+
+# Проверки полей Record: значение допустимо, если функция возвращает True.
+_RECORD_CHECKS = {
+    'id': lambda value: isinstance(value, int),
+    'date': lambda value: isinstance(value, date),
+    'category': lambda value: value in ('Доход', 'Расход'),
+    'amount': lambda value: isinstance(value, (int, float)) and value > 0,
+    'description': lambda value: isinstance(value, str),
+}
+
+# Число присваиваний полей уже созданных записей (Record.__setattr__). По нему PersonalTracker замечает
+# правки записей в обход своих методов (records[i].amount = ...) и перестраивает индексы, суммы и кеш запросов.
+_record_mutations = 0
+
+
+def _set_field(record: 'Record', key: str, value) -> None:
+    check = _RECORD_CHECKS.get(key)
+    if check is not None and not check(value):
+        raise ValueError(f"{key} неверного типа данных", value, type(value))
+    object.__setattr__(record, key, value)
+
 
 class Record:
+    """
+    - Финансовая запись; поля хранятся в __slots__, без словаря атрибутов у каждого объекта.
+    - Конструктор и присваивание полей проверяют значения (ValueError).
+    - Уже проверенные данные (загрузка, импорт) создаются без проверок: make_record(trusted=True), make_records.
+    - Присваивание поля учитывается в _record_mutations: трекер, которому принадлежит запись, заметит правку.
+    """
+    __slots__ = ('id', 'date', 'category', 'amount', 'description')
+
     def __init__(self,id:int,date:Optional[date],category:Optional[str],amount:Optional[int],description:Optional[str])->None:
-        self.id = id
-        self.date = date
-        self.category = category
-        self.amount = amount
-        self.description = description
+        # Новая запись еще не принадлежит трекеру - заполнение полей не считается правкой
+        _set_field(self, 'id', id)
+        _set_field(self, 'date', date)
+        _set_field(self, 'category', category)
+        _set_field(self, 'amount', amount)
+        _set_field(self, 'description', description)
+
+    def __setattr__(self, key, value):
+        global _record_mutations
+        _set_field(self, key, value)
+        _record_mutations += 1
+
+    def get_info(self)->None:
+        print(f"Дата: {self.date}")
+        print(f"Категория: {self.category}")
+        print(f"Сумма: {self.amount}")
+        print(f"Описание: {self.description}\n")
+
+
+# Позиции полей записи в формате data.txt (ключи в нижнем регистре); seq есть только в журнале.
+_FIELDS = {'id': 0, 'дата': 1, 'категория': 2, 'сумма': 3, 'описание': 4, 'seq': 5}
+
+DATA_FILE = 'data.txt'
+JOURNAL_FILE = 'data_journal.txt'
+# Журнал сворачивается в data.txt автоматически, когда в нем записей больше, чем
+# max(JOURNAL_LIMIT, числа записей) - так редактирование остается O(1) в среднем.
+JOURNAL_LIMIT = 10000
+
+# Помесячное хранилище (ShardedStorage): каталог с файлами YYYY-MM.txt, манифестом и картой id -> месяц.
+SHARD_DIR = 'ledger'
+MANIFEST_FILE = 'manifest.json'
+SHARD_IDS_FILE = 'ids.bin'
+
+
+def parse_date(value: str) -> date:
+    """
+    Разбирает дату в формате YYYY-MM-DD без strptime (с откатом на strptime для дат вида 2024-1-1);
+    неверная дата - ValueError с текстом ошибки.
+    """
+    if len(value) == 10:
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            pass
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError('Неправильный формат даты: YYYY-MM-DD') from None
+
+
+# Допустимые значения полей записи при вводе (интерактивном и импорте).
+MAX_AMOUNT = 10**9
+MAX_DESCRIPTION = 60
+
+
+def validate_date(value: str, today: Optional[date] = None) -> date:
+    """
+    Проверяет формат YYYY-MM-DD и то, что дата не позже сегодняшней; иначе ValueError с текстом ошибки.
+    """
+    try:
+        result = parse_date(value.strip())
+    except ValueError:
+        raise ValueError('Неправильный формат даты: YYYY-MM-DD') from None
+    if result > (today or date.today()):
+        raise ValueError(f"Вводимая дата {result} больше текущей")
+    return result
+
+
+def validate_amount(value: Union[str, int, float]) -> int:
+    """
+    Проверяет, что value - целое число от 1 до 999999999; иначе ValueError с текстом ошибки.
+    """
+    try:
+        if isinstance(value, float) and not value.is_integer():
+            raise ValueError
+        value = int(value)
+    except ValueError:
+        raise ValueError("Необходимо ввести число !!!") from None
+    if value<=0 or value>=MAX_AMOUNT:
+        raise ValueError(f"значение {value} не входит в диапозон от 1 до 999999999 !!!")
+    return value
+
+
+def validate_category(value: str) -> str:
+    if value not in ('Доход', 'Расход'):
+        raise ValueError("Выберете правильно категорию(Регистр имеет значение!): Доход или Расход")
+    return value
+
+
+def validate_description(value: str) -> str:
+    if len(value) > MAX_DESCRIPTION:
+        raise ValueError("длина описания не больше 60 символов !!!")
+    return value
+
+
+# Колонки проверяются блоками: ошибка заставляет разбирать поэлементно только свой блок
+_COLUMN_BLOCK = 64
+
+
+def _validate_column(values: Sequence, check, validate, errors: Dict[int, str]) -> list:
+    """
+    Проверяет колонку блоками по _COLUMN_BLOCK значений: check(block) - быстрая проверка блока разом
+    (значения или ValueError/TypeError); блок с ошибками проверяется поэлементно validate, в errors
+    записывается первая ошибка каждой строки, а место ошибочного значения в результате занимает None.
+    """
+    result: list = []
+    for start in range(0, len(values), _COLUMN_BLOCK):
+        block = values[start:start + _COLUMN_BLOCK]
+        try:
+            result += check(block)
+            continue
+        except (ValueError, TypeError, AttributeError):
+            pass
+        for row, value in enumerate(block, start):
+            try:
+                result.append(validate(value))
+            except (ValueError, TypeError, AttributeError) as e:
+                errors.setdefault(row, str(e))
+                result.append(None)
+    return result
+
+
+def _check_dates(values: Sequence[str], today: date) -> List[date]:
+    if not all(len(value) == 10 for value in values):
+        raise ValueError
+    result = list(map(date.fromisoformat, values))
+    if result and max(result) > today:
+        raise ValueError
+    return result
+
+
+def _check_categories(values: Sequence[str]) -> list:
+    if not set(values) <= set(CATEGORIES):
+        raise ValueError
+    return list(values)
+
+
+def _check_amounts(values: Sequence) -> List[int]:
+    if any(isinstance(value, float) for value in values):
+        raise TypeError
+    result = list(map(int, values))
+    if result and (min(result) <= 0 or max(result) >= MAX_AMOUNT):
+        raise ValueError
+    return result
+
+
+def _check_descriptions(values: Sequence[str]) -> list:
+    if max(map(len, values), default=0) > MAX_DESCRIPTION:
+        raise ValueError
+    return list(values)
+
+
+def validate_columns(dates: Sequence[str], categories: Sequence[str], amounts: Sequence, descriptions: Sequence[str],
+                     today: Optional[date] = None) -> Tuple[List[tuple], List[Tuple[int, str]]]:
+    """
+    - Проверяет колонки полей по правилам validate_date, validate_category, validate_amount и validate_description,
+      не останавливаясь на первой ошибке.
+    - Колонки проверяются блоками за один проход (разбор map, границы - через min/max),
+      поэлементно разбираются только блоки с ошибками.
+    - Возвращает (строки (дата, категория, сумма, описание) без ошибочных, ошибки (номер строки, текст) по порядку).
+      Для строки с несколькими ошибками сообщается первая по порядку полей.
+    """
+    today = today or date.today()
+    errors: Dict[int, str] = {}
+    columns = (_validate_column(dates, functools.partial(_check_dates, today=today),
+                                functools.partial(validate_date, today=today), errors),
+               _validate_column(categories, _check_categories, validate_category, errors),
+               _validate_column(amounts, _check_amounts, validate_amount, errors),
+               _validate_column(descriptions, _check_descriptions, validate_description, errors))
+    rows = list(zip(*columns))
+    if errors:
+        rows = [row for number, row in enumerate(rows) if number not in errors]
+    return rows, sorted(errors.items())
+
+
+def parse_number(value: str) -> Union[int, float]:
+    """
+    Разбирает сумму: целое число, а при неудаче число с плавающей точкой.
+    """
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def format_record(record: Record) -> str:
+    """
+    Возвращает текст записи в формате data.txt (с завершающей пустой строкой).
+    """
+    return (f"id: {record.id}\nДата: {record.date}\nКатегория: {record.category}\n"
+            f"Сумма: {record.amount}\nОписание: {record.description}\n\n")
+
+
+# Запись в слоты Record в обход проверок __setattr__ (для make_record(trusted=True) и make_records)
+_new_object = object.__new__
+_SET_ID, _SET_DATE, _SET_CATEGORY, _SET_AMOUNT, _SET_DESCRIPTION = (Record.__dict__[name].__set__
+                                                                   for name in Record.__slots__)
+
+
+def make_record(id: int, date: date, category: str, amount: Union[int, float], description: str,
+                trusted: bool = False) -> Record:
+    """
+    Создает запись; при trusted=True проверки Record.__setattr__ пропускаются.
+    """
+    if trusted:
+        record = _new_object(Record)
+        _SET_ID(record, id)
+        _SET_DATE(record, date)
+        _SET_CATEGORY(record, category)
+        _SET_AMOUNT(record, amount)
+        _SET_DESCRIPTION(record, description)
+        return record
+    return Record(id, date, category, amount, description)
+
+
+def make_records(rows: Iterable[tuple]) -> Iterator[Record]:
+    """
+    Массово создает записи из уже проверенных кортежей (id, дата, категория, сумма, описание) без проверок.
+    Все нужные функции связаны с локальными именами, поэтому это быстрее, чем make_record(trusted=True) в цикле.
+    """
+    new, cls = _new_object, Record
+    set_id, set_date, set_category, set_amount, set_description = (_SET_ID, _SET_DATE, _SET_CATEGORY,
+                                                                   _SET_AMOUNT, _SET_DESCRIPTION)
+    for id, day, category, amount, description in rows:
+        record = new(cls)
+        set_id(record, id)
+        set_date(record, day)
+        set_category(record, category)
+        set_amount(record, amount)
+        set_description(record, description)
+        yield record
+
+
+def _build_record(values: list, trusted: bool) -> Record:
+    """
+    Создает запись из списка строковых значений полей.
+    """
+    id, date_str, category, amount, description = values[:5]
+    return make_record(int(id), parse_date(date_str), category, parse_number(amount), description, trusted)
+
+
+def _iter_values(lines: Iterable[str]) -> Iterator[list]:
+    """
+    - Потоково, за один проход разбирает строки формата data.txt и возвращает списки значений полей.
+    - Пустые строки (в том числе несколько подряд) только разделяют записи и не обрывают чтение.
+    - Последняя запись возвращается, даже если после нее нет пустой строки.
+    """
+    fields = _FIELDS
+    values = [None] * 6
+    filled = False
+    for line in lines:
+        key, sep, value = line.partition(':')
+        if sep:
+            slot = fields.get(key.strip().lower())
+            if slot is not None:
+                values[slot] = value.strip()
+                filled = True
+        elif filled:
+            yield values
+            values = [None] * 6
+            filled = False
+    if filled:
+        yield values
+
+
+def iter_records(lines: Iterable[str], trusted: bool = False) -> Iterator[Record]:
+    """
+    Потоково возвращает записи из строк формата data.txt (см. _iter_values).
+    При trusted=True записи создаются массово, без проверок полей (make_records).
+    """
+    if trusted:
+        yield from make_records((int(values[0]), parse_date(values[1]), values[2], parse_number(values[3]), values[4])
+                                for values in _iter_values(lines))
+        return
+    for values in _iter_values(lines):
+        yield _build_record(values, trusted)
+
+
+# Запись в том виде, в каком ее пишет format_record: по этому шаблону TextStorage(indexed=True) строит
+# индекс смещений и разбирает отдельные поля, не создавая записи целиком.
+_RECORD_PATTERN = re.compile(
+    r"(?m)^id: (\d+)\r?\nДата: ([^\r\n]*)\r?\nКатегория: ([^\r\n]*)\r?\nСумма: ([^\r\n]*)\r?\nОписание: ?([^\r\n]*)"
+    .encode('utf8'))
+_ID_LINE = re.compile(rb"(?im)^[ \t]*id[ \t]*:")
+# Строка с номером изменения в журнале data_journal.txt
+_JOURNAL_SEQ = re.compile(rb"(?m)^seq: (\d+)\r?$")
+_RECORD_GROUPS = {'id': 1, 'date': 2, 'category': 3, 'amount': 4, 'description': 5}
+_FIELD_PARSERS = {'id': int, 'date': lambda value: parse_date(value.decode('utf8')),
+                  'category': lambda value: value.decode('utf8'), 'amount': parse_number,
+                  'description': lambda value: value.decode('utf8').strip()}
+
+# Индекс смещений data_offsets.bin: заголовок (признак канонического формата, inode и проиндексированный
+# размер data.txt), затем пары (id, смещение) array 'q' по возрастанию id.
+OFFSETS_MAGIC = b'FTRO'
+OFFSETS_VERSION = 2
+_OFFSETS_HEADER = struct.Struct('<4sHBxQq')
+
+
+def _pairs(ids: array, offsets: array) -> array:
+    """
+    Пары (id, смещение) подряд в одном array 'q' - вид, в котором они лежат в data_offsets.bin.
+    """
+    pairs = array('q', bytes(16 * len(ids)))
+    pairs[::2], pairs[1::2] = ids, offsets
+    return pairs
+
+
+def _match_record(match: re.Match) -> Record:
+    id, day, category, amount, description = match.groups()
+    return make_record(int(id), parse_date(day.decode('utf8')), category.decode('utf8'), parse_number(amount),
+                       description.decode('utf8').strip(), trusted=True)
+
+
+def iter_journal(lines: Iterable[str], trusted: bool = False) -> Iterator[Tuple[int, Record]]:
+    """
+    - Возвращает пары (номер изменения, запись) из журнала изменений.
+    - Недописанная запись (например, после сбоя посреди записи) пропускается.
+    """
+    for values in _iter_values(lines):
+        if None in values:
+            continue
+        yield int(values[5]), _build_record(values, trusted)
+
+
+# Категория хранится в колоночном хранилище однобайтовым флагом.
+CATEGORIES = ('Расход', 'Доход')
+_CATEGORY_FLAGS = {'Расход': 0, 'Доход': 1}
+
+
+class RecordView(Record):
+    """
+    Запись, материализуемая из строки RecordStore по требованию.
+    Чтение и изменение полей идут напрямую в колонки хранилища.
+    """
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store: 'RecordStore', row: int) -> None:
+        object.__setattr__(self, '_store', store)
+        object.__setattr__(self, '_row', row)
+
+    def __repr__(self) -> str:
+        return f"RecordView(row={self._row}, id={self.id})"
+
+    @property
+    def id(self) -> int:
+        return self._store.ids[self._row]
+
+    @id.setter
+    def id(self, value: int) -> None:
+        self._store.thaw().ids[self._row] = value
+
+    @property
+    def date(self) -> date:
+        return date.fromordinal(self._store.ordinals[self._row])
+
+    @date.setter
+    def date(self, value: date) -> None:
+        self._store.thaw().ordinals[self._row] = value.toordinal()
+
+    @property
+    def category(self) -> str:
+        return CATEGORIES[self._store.flags[self._row]]
+
+    @category.setter
+    def category(self, value: str) -> None:
+        self._store.thaw().flags[self._row] = _CATEGORY_FLAGS[value]
+
+    @property
+    def amount(self) -> Union[int, float]:
+        return self._store.amounts[self._row]
+
+    @amount.setter
+    def amount(self, value: Union[int, float]) -> None:
+        self._store.set_amount(self._row, value)
+
+    @property
+    def description(self) -> str:
+        return self._store.description(self._row)
+
+    @description.setter
+    def description(self, value: str) -> None:
+        self._store.set_description(self._row, value)
+
+
+class FrozenRecord(Record):
+    """
+    Неизменяемая копия записи: так кеш запросов отдает результаты, общие для всех одинаковых запросов.
+    Присваивание полей - AttributeError.
+    """
+    __slots__ = ()
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"запись {self.id} только для чтения")
+
+
+def _freeze(record: Record) -> FrozenRecord:
+    frozen = _new_object(FrozenRecord)
+    _SET_ID(frozen, record.id)
+    _SET_DATE(frozen, record.date)
+    _SET_CATEGORY(frozen, record.category)
+    _SET_AMOUNT(frozen, record.amount)
+    _SET_DESCRIPTION(frozen, record.description)
+    return frozen
+
+
+# Бинарный снимок: заголовок и колонки RecordStore (little-endian), каждая выровнена на 8 байт,
+# с версии 2 - перестановки позиций, упорядоченных по id, дате, сумме и категории (индексы для SnapshotIndex),
+# затем куча описаний. Колонки и перестановки читаются из mmap без копирования.
+SNAPSHOT_MAGIC = b'FTRS'
+SNAPSHOT_VERSION = 2
+_SNAPSHOT_HEADER = struct.Struct('<4sHcxQQ8x')
+_SNAPSHOT_COLUMNS = (('ids', 'q'), ('ordinals', 'i'), ('flags', 'b'), ('amounts', None),
+                     ('desc_offsets', 'Q'), ('desc_lengths', 'I'))
+# Перестановка: поле, по которому упорядочены позиции (при равных значениях - по возрастанию позиции)
+_SNAPSHOT_ORDERS = (('id', 'ids'), ('date', 'ordinals'), ('amount', 'amounts'), ('category', 'flags'))
+
+
+def _align(size: int) -> int:
+    return (size + 7) & ~7
+
+
+class RecordStore:
+    """
+    - Компактное колоночное хранилище записей, альтернатива списку объектов Record.
+    - id, дата (ordinal), категория (флаг 0/1) и сумма лежат в массивах array.
+    - Описания хранятся в общей байтовой куче, в колонках только смещение и длина.
+    - Поддерживает протокол последовательности, поэтому подставляется в PersonalTracker.records.
+    - Хранилище из бинарного снимка (from_buffer) ссылается на mmap без копирования,
+      колонки копируются в array только при первом изменении.
+    - orders - перестановки позиций из снимка (поле -> позиции, упорядоченные по нему) для SnapshotIndex;
+      None, если хранилище не из снимка или уже изменено.
+    """
+
+    def __init__(self, records: Iterable[Record] = ()) -> None:
+        self.ids = array('q')
+        self.ordinals = array('i')
+        self.flags = array('b')
+        self.amounts = array('q')
+        self.desc_offsets = array('Q')
+        self.desc_lengths = array('I')
+        self.heap = bytearray()
+        self._buffer = None
+        self.orders: Optional[Dict[str, Sequence[int]]] = None
+        self.extend(records)
+
+    @classmethod
+    def from_buffer(cls, buffer) -> 'RecordStore':
+        """
+        - Создает хранилище поверх буфера с бинарным снимком (например, mmap), не копируя колонки.
+        - Снимки версии 1 (без перестановок) тоже читаются, индексы для них строятся обычным RecordIndex.
+        - ValueError, если буфер не снимок или его размер не совпадает с заголовком (файл обрезан).
+        """
+        view = memoryview(buffer)
+        if len(view) < _SNAPSHOT_HEADER.size:
+            raise ValueError("файл не является снимком финансового трекера")
+        magic, version, amount_code, count, heap_size = _SNAPSHOT_HEADER.unpack_from(view)
+        if magic != SNAPSHOT_MAGIC or version not in (1, SNAPSHOT_VERSION) or amount_code not in (b'q', b'd'):
+            raise ValueError("файл не является снимком финансового трекера")
+        columns = [(name, typecode or amount_code.decode()) for name, typecode in _SNAPSHOT_COLUMNS]
+        if version > 1:
+            columns += [(key, 'I') for key, _ in _SNAPSHOT_ORDERS]
+        expected = _SNAPSHOT_HEADER.size + sum(_align(count * array(typecode).itemsize) for _, typecode in columns)
+        if len(view) != expected + heap_size:
+            raise ValueError(f"снимок поврежден: размер {len(view)} байт, по заголовку {expected + heap_size}")
+        store = cls()
+        offset = _SNAPSHOT_HEADER.size
+        loaded = []
+        for name, typecode in columns:
+            size = count * array(typecode).itemsize
+            column = view[offset:offset + size].cast(typecode)
+            if sys.byteorder != 'little':
+                column = array(typecode, column)
+                column.byteswap()
+            loaded.append(column)
+            offset += _align(size)
+        for (name, _), column in zip(_SNAPSHOT_COLUMNS, loaded):
+            setattr(store, name, column)
+        if version > 1:
+            store.orders = {key: column for (key, _), column in zip(_SNAPSHOT_ORDERS, loaded[len(_SNAPSHOT_COLUMNS):])}
+        store.heap = view[offset:offset + heap_size]
+        store._buffer = buffer
+        return store
+
+    def write_snapshot(self, file) -> None:
+        """
+        Записывает хранилище в бинарный файл file в формате снимка (перестановки сортируются здесь, O(n log n)).
+        """
+        amounts = self.amounts
+        amount_code = amounts.format if isinstance(amounts, memoryview) else amounts.typecode
+        file.write(_SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, amount_code.encode(),
+                                         len(self), len(self.heap)))
+        columns = [(getattr(self, name), typecode or amount_code) for name, typecode in _SNAPSHOT_COLUMNS]
+        for _, name in _SNAPSHOT_ORDERS:
+            values = getattr(self, name)
+            # sorted устойчив: при равных значениях позиции остаются по возрастанию
+            columns.append((array('I', sorted(range(len(self)), key=values.__getitem__)), 'I'))
+        for column, typecode in columns:
+            if sys.byteorder != 'little':
+                column = array(typecode, column)
+                column.byteswap()
+            data = memoryview(column).cast('B')
+            file.write(data)
+            file.write(bytes(_align(len(data)) - len(data)))
+        file.write(self.heap)
+
+    def thaw(self) -> 'RecordStore':
+        """
+        Переводит колонки, отображенные из снимка, в изменяемые array (однократная копия).
+        """
+        if self._buffer is not None:
+            for name, _ in _SNAPSHOT_COLUMNS:
+                column = getattr(self, name)
+                if isinstance(column, memoryview):
+                    setattr(self, name, array(column.format, column))
+            self.heap = bytearray(self.heap)
+            self._buffer = None
+        # После изменения перестановки из снимка уже не соответствуют данным
+        self.orders = None
+        return self
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[RecordView, List[RecordView]]:
+        if isinstance(index, slice):
+            return [RecordView(self, row) for row in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("индекс записи вне диапазона")
+        return RecordView(self, index)
+
+    def __iter__(self) -> Iterator[RecordView]:
+        for row in range(len(self)):
+            yield RecordView(self, row)
+
+    def __contains__(self, record: object) -> bool:
+        if isinstance(record, RecordView) and record._store is self:
+            return True
+        if not isinstance(record, Record):
+            return False
+        values = (record.id, record.date, record.category, record.amount, record.description)
+        return any(self.row_values(row) == values for row, id in enumerate(self.ids) if id == record.id)
+
+    def row_values(self, row: int) -> tuple:
+        """
+        Возвращает поля строки row кортежем (id, дата, категория, сумма, описание).
+        """
+        return (self.ids[row], date.fromordinal(self.ordinals[row]), CATEGORIES[self.flags[row]],
+                self.amounts[row], self.description(row))
+
+    def append(self, record: Record) -> None:
+        self.append_values(record.id, record.date, record.category, record.amount, record.description)
+
+    def append_values(self, id: int, date: date, category: str, amount: Union[int, float], description: str) -> None:
+        self.thaw()
+        self.ids.append(id)
+        self.ordinals.append(date.toordinal())
+        self.flags.append(_CATEGORY_FLAGS[category])
+        self.amounts.append(0)
+        self.set_amount(len(self.ids) - 1, amount)
+        self.desc_offsets.append(0)
+        self.desc_lengths.append(0)
+        self.set_description(len(self.ids) - 1, description)
+
+    def set_values(self, row: int, record: Record) -> None:
+        """
+        Заменяет значения строки row значениями record.
+        """
+        self.thaw()
+        self.ids[row] = record.id
+        self.ordinals[row] = record.date.toordinal()
+        self.flags[row] = _CATEGORY_FLAGS[record.category]
+        self.set_amount(row, record.amount)
+        self.set_description(row, record.description)
+
+    def extend(self, records: Iterable[Record]) -> None:
+        for record in records:
+            self.append(record)
+
+    def set_amount(self, row: int, value: Union[int, float]) -> None:
+        self.thaw()
+        if isinstance(value, float) and self.amounts.typecode == 'q':
+            # Дробные суммы переводят колонку в double один раз
+            self.amounts = array('d', self.amounts)
+        self.amounts[row] = value
+
+    def description(self, row: int) -> str:
+        offset = self.desc_offsets[row]
+        return str(self.heap[offset:offset + self.desc_lengths[row]], 'utf8')
+
+    def matches(self, keyword: str) -> Iterator[bool]:
+        """
+        Для каждой строки возвращает признак вхождения keyword в описание (без учета регистра).
+        Повторяющиеся описания проверяются один раз.
+        """
+        keyword = keyword.lower()
+        heap, seen = self.heap, {}
+        for offset, length in zip(self.desc_offsets, self.desc_lengths):
+            raw = bytes(heap[offset:offset + length])
+            found = seen.get(raw)
+            if found is None:
+                found = seen[raw] = keyword in raw.decode('utf8').lower()
+            yield found
+
+    def set_description(self, row: int, value: str) -> None:
+        # Старое значение остается в куче до пересоздания хранилища
+        self.thaw()
+        data = value.encode('utf8')
+        self.desc_offsets[row] = len(self.heap)
+        self.desc_lengths[row] = len(data)
+        self.heap += data
+
+
+class RecordIndex:
+    """
+    - Вторичные индексы по позициям записей в PersonalTracker.records.
+    - by_id: хеш-индекс id -> позиция.
+    - date_keys/date_rows и amount_keys/amount_rows: отсортированные ordinal'ы дат (суммы)
+      и соответствующие позиции (при равных значениях - по возрастанию); равенство и диапазоны ищутся через bisect.
+    - categories: списки позиций (по возрастанию) для каждой категории.
+    """
+
+    def __init__(self, records: Union[List[Record], RecordStore]) -> None:
+        if isinstance(records, RecordStore):
+            ids, ordinals, amounts = records.ids, records.ordinals, records.amounts
+            categories = [CATEGORIES[flag] for flag in records.flags]
+        else:
+            ids = [r.id for r in records]
+            ordinals = [r.date.toordinal() for r in records]
+            categories = [r.category for r in records]
+            amounts = [r.amount for r in records]
+
+        # При повторяющихся id индекс, как и прежний линейный поиск, указывает на первую запись
+        self.by_id: Dict[int, int] = {}
+        for row, id in enumerate(ids):
+            self.by_id.setdefault(id, row)
+        self.count = len(ids)
+        self.date_keys, self.date_rows = self._sorted('i', ordinals)
+        self.amount_keys, self.amount_rows = self._sorted('d', amounts)
+        self.categories: Dict[str, array] = {}
+        for row, category in enumerate(categories):
+            rows = self.categories.get(category)
+            if rows is None:
+                rows = self.categories[category] = array('q')
+            rows.append(row)
+
+    @staticmethod
+    def _sorted(typecode: str, values) -> Tuple[array, array]:
+        order = sorted(range(len(values)), key=values.__getitem__)
+        return array(typecode, (values[row] for row in order)), array('q', order)
+
+    def sorted_index(self, key: str) -> Tuple[array, array]:
+        """
+        Возвращает пару (отсортированные значения, позиции) для key: 'date' или 'amount'.
+        """
+        if key == 'date':
+            return self.date_keys, self.date_rows
+        return self.amount_keys, self.amount_rows
+
+    @staticmethod
+    def _sort_key(key: str, record: Record) -> Union[int, float]:
+        return record.date.toordinal() if key == 'date' else record.amount
+
+    def add(self, row: int, record: Record) -> None:
+        """
+        Добавляет в индексы запись, находящуюся в позиции row.
+        """
+        if row >= self.count:
+            self.count = row + 1
+        self.by_id.setdefault(record.id, row)
+        for key in ('date', 'amount'):
+            keys, rows = self.sorted_index(key)
+            value = self._sort_key(key, record)
+            # Среди равных значений позиции остаются упорядоченными (см. rows_in_order)
+            at = bisect_left(rows, row, bisect_left(keys, value), bisect_right(keys, value))
+            keys.insert(at, value)
+            rows.insert(at, row)
+        rows = self.categories.get(record.category)
+        if rows is None:
+            rows = self.categories[record.category] = array('q')
+        rows.insert(bisect_left(rows, row), row)
+
+    def remove(self, row: int, record: Record) -> None:
+        """
+        Убирает из индексов значения записи в позиции row (перед ее изменением).
+        """
+        if self.by_id.get(record.id) == row:
+            del self.by_id[record.id]
+        for key in ('date', 'amount'):
+            keys, rows = self.sorted_index(key)
+            value = self._sort_key(key, record)
+            at = rows.index(row, bisect_left(keys, value), bisect_right(keys, value))
+            del keys[at]
+            del rows[at]
+        rows = self.categories[record.category]
+        del rows[bisect_left(rows, row)]
+        if not rows:
+            del self.categories[record.category]
+
+    def range_bounds(self, key: str, low=None, high=None) -> Tuple[int, int]:
+        """
+        Возвращает границы [начало, конец) в отсортированном индексе key ('date' или 'amount')
+        для значений low <= значение <= high (None - без ограничения). Даты передаются ordinal'ами.
+        """
+        keys = self.sorted_index(key)[0]
+        start = 0 if low is None else bisect_left(keys, low)
+        stop = len(keys) if high is None else bisect_right(keys, high)
+        return start, max(start, stop)
+
+    def range_rows(self, key: str, low=None, high=None) -> array:
+        """
+        Позиции записей, у которых значение key лежит в диапазоне [low, high], за O(log n + k).
+        """
+        start, stop = self.range_bounds(key, low, high)
+        return self.sorted_index(key)[1][start:stop]
+
+    def rows_in_order(self, key: str, start: int, stop: int) -> Iterator[int]:
+        """
+        Позиции [start, stop) отсортированного индекса key по возрастанию, лениво: группы равных значений
+        уже упорядочены по позиции и сливаются heapq.merge, без сортировки всех кандидатов.
+        """
+        keys, rows = self.sorted_index(key)
+        # Группы копируются срезами: записи, добавленные во время перебора, их не сдвигают
+        runs = []
+        while start < stop:
+            end = bisect_right(keys, keys[start], start, stop)
+            runs.append(iter(rows[start:end]))
+            start = end
+        return runs[0] if len(runs) == 1 else heapq.merge(*runs)
+
+    def lookup(self, key: str, value) -> Optional[Iterable[int]]:
+        """
+        Возвращает позиции записей с key == value или None, если по key индекса нет.
+        """
+        if key == 'id':
+            row = self.by_id.get(value)
+            return () if row is None else (row,)
+        if key == 'date' and isinstance(value, date):
+            ordinal = value.toordinal()
+            return self.range_rows('date', ordinal, ordinal)
+        if key == 'amount' and isinstance(value, (int, float)):
+            return self.range_rows('amount', value, value)
+        if key == 'category':
+            return self.categories.get(value, ())
+        return None
+
+
+class _OrderedColumn:
+    """
+    Значения колонки values в порядке перестановки rows: отсортированная последовательность для bisect
+    без копирования колонки.
+    """
+    __slots__ = ('values', 'rows')
+
+    def __init__(self, values: Sequence, rows: Sequence[int]) -> None:
+        self.values = values
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, position: int):
+        return self.values[self.rows[position]]
+
+
+class _OrderedIds:
+    """
+    Замена словаря RecordIndex.by_id для снимка: id -> позиция (первая при повторах) через bisect
+    по перестановке, упорядоченной по id.
+    """
+    __slots__ = ('keys',)
+
+    def __init__(self, ids: Sequence[int], rows: Sequence[int]) -> None:
+        self.keys = _OrderedColumn(ids, rows)
+
+    def get(self, id: int, default: Optional[int] = None) -> Optional[int]:
+        keys = self.keys
+        at = bisect_left(keys, id)
+        return keys.rows[at] if at < len(keys) and keys[at] == id else default
+
+    def __getitem__(self, id: int) -> int:
+        row = self.get(id)
+        if row is None:
+            raise KeyError(id)
+        return row
+
+
+class SnapshotIndex(RecordIndex):
+    """
+    - Индексы RecordIndex для снимка, отображенного в память (RecordStore.orders): вместо отсортированных
+      копий колонок и словаря id - перестановки позиций из снимка, поиск идет bisect по значениям колонок
+      через них. Ничего не копируется и не сортируется, поэтому find_records по снимку не строит индексы.
+    - Только для чтения: перед изменением записей PersonalTracker строит обычный RecordIndex.
+    """
+
+    def __init__(self, store: RecordStore) -> None:
+        orders = store.orders
+        self.count = len(store)
+        self.by_id = _OrderedIds(store.ids, orders['id'])
+        self._orders = {'date': (_OrderedColumn(store.ordinals, orders['date']), orders['date']),
+                        'amount': (_OrderedColumn(store.amounts, orders['amount']), orders['amount'])}
+        # Позиции упорядочены по флагу категории: сначала расходы (0), затем доходы (1)
+        rows = orders['category']
+        split = bisect_left(_OrderedColumn(store.flags, rows), 1)
+        self.categories = {category: part for category, part in zip(CATEGORIES, (rows[:split], rows[split:]))
+                           if len(part)}
+
+    def sorted_index(self, key: str) -> Tuple[Sequence, Sequence[int]]:
+        return self._orders[key]
+
+    def add(self, row: int, record: Record) -> None:
+        raise TypeError("индексы снимка только для чтения")
+
+    remove = add
+
+
+# Полнотекстовый поиск по описаниям: слова - последовательности букв и цифр, окончания
+# отбрасываются по списку (от длинных к коротким), если от слова остается не меньше _STEM_MIN букв.
+_WORD = re.compile(r"\w+")
+_ENDINGS = tuple(sorted((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ией', 'иях', 'ях', 'ах', 'ей', 'ой', 'ий',
+    'ый', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ую', 'юю', 'ам', 'ям', 'ом', 'ем', 'ым', 'им', 'ов', 'ев', 'ия',
+    'ию', 'ии', 'ью', 'ых', 'их', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й'), key=len, reverse=True))
+_STEM_MIN = 3
+# Разделители альтернатив в запросе: "такси OR метро", "такси | метро"
+_QUERY_OR = ('or', 'или', '|')
+
+
+def _stem(word: str) -> str:
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _STEM_MIN:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Разбивает текст на основы слов: нижний регистр, ё -> е, отброшенные окончания.
+    """
+    return [_stem(word) for word in _WORD.findall(text.lower().replace('ё', 'е'))]
+
+
+class TextQuery:
+    """
+    - Запрос полнотекстового поиска: слова через пробел - все должны встретиться (AND),
+      группы через OR / ИЛИ / | - достаточно одной (OR); слово со звездочкой в конце - префикс.
+    - Слова приводятся к основам так же, как описания в TextIndex, поэтому "такси" находит "Такси домой",
+      а "покупки" - "Покупка продуктов".
+    """
+
+    def __init__(self, query: str) -> None:
+        # Группы (OR) из условий (AND) вида (основа, префикс ли)
+        self.groups: List[List[Tuple[str, bool]]] = []
+        group: List[Tuple[str, bool]] = []
+        for word in query.split():
+            if word.lower() in _QUERY_OR:
+                if group:
+                    self.groups.append(group)
+                group = []
+                continue
+            terms = tokenize(word)
+            prefix = word.endswith('*')
+            group.extend((term, prefix and i == len(terms) - 1) for i, term in enumerate(terms))
+        if group:
+            self.groups.append(group)
+
+    def matches(self, description: str) -> bool:
+        """
+        Проверяет одно описание без индекса (для хранилищ, которые ищут сами).
+        """
+        terms = set(tokenize(description))
+        return any(all(any(t.startswith(term) for t in terms) if prefix else term in terms for term, prefix in group)
+                   for group in self.groups)
+
+
+class TextIndex:
+    """
+    - Инвертированный индекс описаний: основа слова -> позиции записей (array 'q', по возрастанию).
+    - Префиксы ищутся через bisect по отсортированному списку основ.
+    - add/remove поддерживают индекс при добавлении и правке записи; count - число учтенных записей.
+    - Может сохраняться в файл рядом с данными (save/load) с отпечатком состояния данных, как LedgerTotals.
+    """
+
+    def __init__(self, records: Union[List[Record], RecordStore, None] = None) -> None:
+        self.postings: Dict[str, array] = {}
+        self.count = 0
+        self._terms: Optional[List[str]] = None
+        if records is None:
+            return
+        # Повторяющиеся описания разбираются один раз
+        cache: Dict[str, List[str]] = {}
+        postings = self.postings
+        for row, record in enumerate(records):
+            description = record.description
+            terms = cache.get(description)
+            if terms is None:
+                terms = cache[description] = list(dict.fromkeys(tokenize(description)))
+            for term in terms:
+                rows = postings.get(term)
+                if rows is None:
+                    rows = postings[term] = array('q')
+                rows.append(row)
+        self.count = len(records)
+
+    def add(self, row: int, record: Record) -> None:
+        if row >= self.count:
+            self.count = row + 1
+        for term in dict.fromkeys(tokenize(record.description)):
+            rows = self.postings.get(term)
+            if rows is None:
+                rows = self.postings[term] = array('q')
+                self._terms = None
+            rows.insert(bisect_left(rows, row), row)
+
+    def remove(self, row: int, record: Record) -> None:
+        for term in dict.fromkeys(tokenize(record.description)):
+            rows = self.postings[term]
+            del rows[bisect_left(rows, row)]
+            if not rows:
+                del self.postings[term]
+                self._terms = None
+
+    def _prefix_terms(self, term: str) -> Iterator[str]:
+        """
+        Основы, начинающиеся с term (bisect по отсортированному списку основ).
+        """
+        if self._terms is None:
+            self._terms = sorted(self.postings)
+        for i in range(bisect_left(self._terms, term), len(self._terms)):
+            if not self._terms[i].startswith(term):
+                break
+            yield self._terms[i]
+
+    def _term_rows(self, term: str, prefix: bool) -> set:
+        if not prefix:
+            return set(self.postings.get(term, ()))
+        result: set = set()
+        for key in self._prefix_terms(term):
+            result.update(self.postings[key])
+        return result
+
+    def _term_size(self, term: str, prefix: bool) -> int:
+        """
+        Оценка числа позиций условия без их сбора: для префикса - сумма длин списков всех его основ.
+        """
+        if not prefix:
+            return len(self.postings.get(term, ()))
+        return sum(len(self.postings[key]) for key in self._prefix_terms(term))
+
+    def search(self, query: TextQuery) -> set:
+        """
+        Позиции записей, подходящих под запрос; пересечения начинаются с самого короткого списка
+        (префиксы - по суммарной длине списков их основ).
+        """
+        found: set = set()
+        for group in query.groups:
+            rows = None
+            for term, prefix in sorted(group, key=lambda item: self._term_size(*item)):
+                term_rows = self._term_rows(term, prefix)
+                rows = term_rows if rows is None else rows & term_rows
+                if not rows:
+                    break
+            found |= rows or set()
+        return found
+
+    def save(self, path: str, stamp: tuple) -> None:
+        """
+        Сохраняет индекс: строка JSON (отпечаток данных - Storage.stamp, число записей, основы и длины списков),
+        затем позиции (array 'q').
+        """
+        terms = list(self.postings)
+        header = {'version': 2, 'stamp': list(stamp), 'count': self.count,
+                  'terms': terms, 'lengths': [len(self.postings[term]) for term in terms]}
+        with _atomic_file(path, 'wb') as f:
+            f.write(json.dumps(header, ensure_ascii=False).encode('utf8') + b"\n")
+            for term in terms:
+                self.postings[term].tofile(f)
+
+    @classmethod
+    def load(cls, path: str, storage: 'Storage') -> Optional['TextIndex']:
+        """
+        Читает индекс из path; None, если файла нет, он поврежден или записан для другого состояния данных storage.
+        """
+        try:
+            with open(path, 'rb') as f:
+                header = json.loads(f.readline())
+                rows = array('q')
+                rows.frombytes(f.read())
+        except (OSError, ValueError):
+            return None
+        if header.get('version') != 2 or sum(header['lengths']) != len(rows) \
+                or not storage.stamp_matches(header['stamp']):
+            return None
+        index = cls()
+        start = 0
+        for term, length in zip(header['terms'], header['lengths']):
+            index.postings[term] = rows[start:start + length]
+            start += length
+        index.count = header['count']
+        return index
+
+
+# Группировки отчета по периодам: ключ периода по ordinal даты.
+PERIODS = ('day', 'month', 'year')
+
+
+def _period_key(ordinal: int, period: str) -> str:
+    d = date.fromordinal(ordinal)
+    if period == 'day':
+        return d.isoformat()
+    if period == 'month':
+        return f"{d.year:04d}-{d.month:02d}"
+    return f"{d.year:04d}"
+
+
+class _Fenwick:
+    """
+    Дерево Фенвика: прибавление к элементу и сумма префикса за O(log n).
+    """
+    __slots__ = ('tree',)
+
+    def __init__(self, values: Iterable[Union[int, float]]) -> None:
+        # Построение за O(n): каждый узел передает свою сумму родителю
+        tree = [0, *values]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def add(self, i: int, delta: Union[int, float]) -> None:
+        tree = self.tree
+        i += 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int) -> Union[int, float]:
+        """
+        Сумма элементов с позиции 0 по i - 1.
+        """
+        tree = self.tree
+        total = 0
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+
+# Файл материализованных сумм рядом с data.txt (data_totals.bin): заголовок и два массива 'd'
+# (доходы и расходы по дням); отпечаток - размеры и время изменения data.txt и журнала и контрольная сумма
+# (см. Storage.stamp).
+TOTALS_MAGIC = b'FTRT'
+TOTALS_VERSION = 2
+_TOTALS_HEADER = struct.Struct('<4sH2xqqq5q')
+
+# Файл, измененный меньше чем за это время до сохранения отпечатка, мог измениться еще раз в тот же такт
+# часов файловой системы (на FAT - 2 с), поэтому такой отпечаток дополняется контрольной суммой.
+RACY_WINDOW_NS = 2 * 10**9
+
+
+class LedgerTotals:
+    """
+    - Материализованные суммы записей: доходы и расходы по дням (списки от дня base), итоги
+      и деревья Фенвика по дням для баланса на дату и за период за O(log n).
+    - add/remove обновляют суммы при добавлении и правке записи за O(1) (итоги и день) + O(log n) (деревья).
+    - Суммы по месяцам, годам и категориям сворачиваются из дневных в PersonalTracker.report
+      за O(числа дней), без прохода по записям.
+    - count - число учтенных записей; по нему PersonalTracker замечает, что суммы устарели.
+    """
+
+    def __init__(self, base: int = 0, income: Optional[list] = None, expense: Optional[list] = None,
+                 count: int = 0) -> None:
+        self.base = base
+        self.income = [] if income is None else income
+        self.expense = [] if expense is None else expense
+        self.count = count
+        self.total_income = sum(self.income)
+        self.total_expense = sum(self.expense)
+        # Деревья строятся при первом запросе на дату
+        self._trees: Optional[Tuple[_Fenwick, _Fenwick]] = None
+        # Дни, измененные после сохранения в файл (None - файл пишется целиком)
+        self.changed: Optional[set] = None
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[int, bool, Union[int, float]]]) -> 'LedgerTotals':
+        """
+        Строит суммы по тройкам (ordinal даты, признак дохода, сумма), см. PersonalTracker._aggregate_columns.
+        """
+        income: Dict[int, Union[int, float]] = {}
+        expense: Dict[int, Union[int, float]] = {}
+        income_get, expense_get = income.get, expense.get
+        count = 0
+        for count, (ordinal, is_income, amount) in enumerate(rows, 1):
+            if is_income:
+                income[ordinal] = income_get(ordinal, 0) + amount
+            else:
+                expense[ordinal] = expense_get(ordinal, 0) + amount
+        if not count:
+            return cls()
+        base = min(min(income, default=ordinal), min(expense, default=ordinal))
+        size = max(max(income, default=ordinal), max(expense, default=ordinal)) - base + 1
+        days_income, days_expense = [0] * size, [0] * size
+        for ordinal, amount in income.items():
+            days_income[ordinal - base] = amount
+        for ordinal, amount in expense.items():
+            days_expense[ordinal - base] = amount
+        return cls(base, days_income, days_expense, count)
+
+    def _slot(self, ordinal: int) -> int:
+        """
+        Позиция дня в списках; при дате вне диапазона списки расширяются.
+        """
+        slot = ordinal - self.base
+        if not self.income:
+            self.base, slot = ordinal, 0
+        if slot < 0:
+            self.income[:0] = [0] * -slot
+            self.expense[:0] = [0] * -slot
+            self.base, slot = ordinal, 0
+        elif slot < len(self.income):
+            return slot
+        else:
+            grow = slot + 1 - len(self.income)
+            self.income.extend([0] * grow)
+            self.expense.extend([0] * grow)
+        self._trees = None
+        self.changed = None
+        return slot
+
+    def add(self, record: Record, sign: int = 1) -> None:
+        slot = self._slot(record.date.toordinal())
+        amount = sign * record.amount
+        days = self.income if record.category == "Доход" else self.expense
+        days[slot] += amount
+        if days is self.income:
+            self.total_income += amount
+        else:
+            self.total_expense += amount
+        self.count += sign
+        if self._trees is not None:
+            self._trees[days is self.expense].add(slot, amount)
+        if self.changed is not None:
+            self.changed.add(slot)
+
+    def remove(self, record: Record) -> None:
+        self.add(record, -1)
+
+    def totals(self) -> Tuple[Union[int, float], Union[int, float], Union[int, float]]:
+        return self.total_income, self.total_expense, self.total_income - self.total_expense
+
+    def between(self, date_from: Optional[date] = None, date_to: Optional[date] = None) \
+            -> Tuple[Union[int, float], Union[int, float], Union[int, float]]:
+        """
+        Доходы, расходы и баланс за период [date_from, date_to] (None - без ограничения) за O(log n).
+        """
+        if self._trees is None:
+            self._trees = (_Fenwick(self.income), _Fenwick(self.expense))
+        size = len(self.income)
+        low = 0 if date_from is None else min(max(date_from.toordinal() - self.base, 0), size)
+        high = size if date_to is None else min(max(date_to.toordinal() - self.base + 1, 0), size)
+        if low >= high:
+            return 0, 0, 0
+        dox, ras = (tree.prefix(high) - tree.prefix(low) for tree in self._trees)
+        return dox, ras, dox - ras
+
+    def days(self) -> Tuple[Dict[int, Union[int, float]], Dict[int, Union[int, float]]]:
+        """
+        Доходы и расходы по дням: словари ordinal -> сумма без пустых дней.
+        """
+        base = self.base
+        return ({base + slot: amount for slot, amount in enumerate(self.income) if amount},
+                {base + slot: amount for slot, amount in enumerate(self.expense) if amount})
+
+    def save(self, path: str, stamp: tuple) -> None:
+        """
+        Сохраняет суммы в path с отпечатком данных stamp (Storage.stamp). Если раскладка файла не менялась, перезаписываются только
+        измененные дни и заголовок; иначе файл пишется целиком через временный.
+        """
+        header = _TOTALS_HEADER.pack(TOTALS_MAGIC, TOTALS_VERSION, self.base, len(self.income), self.count,
+                                     *stamp)
+        if self.changed is None or not os.path.exists(path):
+            with _atomic_file(path, 'wb') as f:
+                f.write(header)
+                array('d', self.income).tofile(f)
+                array('d', self.expense).tofile(f)
+        else:
+            with open(path, 'r+b') as f:
+                for slot in sorted(self.changed):
+                    for offset, days in ((slot, self.income), (len(self.income) + slot, self.expense)):
+                        f.seek(_TOTALS_HEADER.size + 8 * offset)
+                        f.write(array('d', (days[slot],)).tobytes())
+                f.seek(0)
+                f.write(header)
+        self.changed = set()
+
+    @classmethod
+    def load(cls, path: str, storage: 'Storage') -> Optional['LedgerTotals']:
+        """
+        Читает суммы из path; None, если файла нет, он поврежден или записан для другого состояния данных storage.
+        """
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < _TOTALS_HEADER.size:
+            return None
+        magic, version, base, size, count, *saved = _TOTALS_HEADER.unpack_from(data)
+        if magic != TOTALS_MAGIC or version != TOTALS_VERSION or len(data) != _TOTALS_HEADER.size + 16 * size \
+                or not storage.stamp_matches(saved):
+            return None
+        days = array('d')
+        days.frombytes(data[_TOTALS_HEADER.size:])
+        # Суммы целых чисел возвращаются целыми, как при подсчете по записям
+        days = [int(amount) if amount.is_integer() else amount for amount in days]
+        totals = cls(base, days[:size], days[size:], count)
+        totals.changed = set()
+        return totals
+
+
+# Названия колонок CSV и ключей JSONL при импорте выписок.
+IMPORT_FIELDS = {'date': 'date', 'дата': 'date', 'category': 'category', 'категория': 'category',
+                 'amount': 'amount', 'сумма': 'amount', 'description': 'description', 'описание': 'description'}
+_IMPORT_ORDER = ('date', 'category', 'amount', 'description')
+# Файлы меньше этого размера разбираются в текущем процессе, без пула.
+IMPORT_CHUNK_SIZE = 8 * 2**20
+
+
+def _import_fields(values: dict) -> tuple:
+    """
+    Приводит поля импортируемой строки к виду для validate_columns (дата, категория, сумма, описание).
+    Если категория не указана, она определяется по знаку суммы (как в банковских выписках).
+    """
+    amount = values.get('amount')
+    # true/false из JSON - не числа, хотя bool наследует int
+    if isinstance(amount, bool):
+        raise ValueError("Необходимо ввести число !!!")
+    if isinstance(amount, str):
+        amount = amount.strip().replace(' ', '')
+    category = (values.get('category') or '').strip()
+    if not category:
+        number = parse_number(amount) if isinstance(amount, str) else amount
+        if number is None:
+            raise ValueError("Необходимо ввести число !!!")
+        category = 'Расход' if number < 0 else 'Доход'
+        amount = abs(number)
+    return str(values.get('date') or ''), category, amount, str(values.get('description') or '').strip()
+
+
+def _parse_import_chunk(path: str, fmt: str, start: int, end: int, columns: Optional[Dict[str, int]],
+                        delimiter: str, today: date) -> Tuple[List[tuple], List[Tuple[int, str]], int]:
+    """
+    - Разбирает байты [start, end) файла импорта (границы выровнены по записям, см. _import_chunks).
+    - Возвращает (проверенные строки, ошибки (номер строки в куске, текст), число строк в куске).
+      Строки считаются, как в csv (включая переводы строк внутри полей в кавычках); в JSONL строки
+      разделяются только \\n, как того требует формат.
+    - Выполняется в процессе пула, поэтому получает только простые аргументы.
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8-sig' if start == 0 else 'utf8')
+    fields: List[tuple] = []
+    numbers: List[int] = []
+    errors: List[Tuple[int, str]] = []
+    if fmt == 'csv':
+        reader = csv.reader(io.StringIO(text, newline=''), delimiter=delimiter)
+
+        def numbered():
+            # Номер строки, с которой начинается запись (поле в кавычках может занимать несколько строк):
+            # число строк, прочитанных до нее
+            line = 0
+            for item in reader:
+                yield line, item
+                line = reader.line_num
+        parsed = numbered()
+    else:
+        lines = text.split('\n')
+        if not lines[-1]:
+            lines.pop()
+        parsed = enumerate(lines)
+    for number, item in parsed:
+        try:
+            if fmt == 'csv':
+                if not item:
+                    continue
+                values = {name: item[i] if i < len(item) else None for name, i in columns.items()}
+            else:
+                if not item.strip():
+                    continue
+                values = {IMPORT_FIELDS.get(key.lower(), key): value for key, value in json.loads(item).items()}
+            fields.append(_import_fields(values))
+            numbers.append(number)
+        except (ValueError, AttributeError, TypeError) as e:
+            errors.append((number, str(e)))
+    # Поля проверяются колонками; номера строк колонок переводятся обратно в номера строк куска
+    rows, invalid = validate_columns(*(zip(*fields) if fields else ((), (), (), ())), today=today)
+    if invalid:
+        errors = sorted(errors + [(numbers[row], message) for row, message in invalid])
+    return rows, errors, reader.line_num if fmt == 'csv' else len(lines)
+
+
+def _csv_records(f, delimiter: str) -> Iterator[Tuple[List[str], int]]:
+    """
+    Записи CSV из двоичного файла f с текущей позиции вместе с позицией (в байтах) конца каждой: записи
+    разбирает csv.reader, поэтому перевод строки внутри поля в кавычках не считается концом записи.
+    """
+    position = f.tell()
+
+    def lines():
+        nonlocal position
+        for line in f:
+            position += len(line)
+            yield line.decode('utf-8-sig')
+    for record in csv.reader(lines(), delimiter=delimiter):
+        yield record, position
+
+
+def _import_chunks(path: str, chunk_size: int, start: int, delimiter: Optional[str] = None) -> List[Tuple[int, int]]:
+    """
+    - Делит файл на куски примерно по chunk_size байт, границы сдвигаются на начало строки.
+    - Для CSV (задан delimiter) с кавычками граница ставится только между записями: файл больше chunk_size
+      просматривается csv.reader целиком. Если файл не разбирается (csv.Error), остаток идет одним куском.
+      Без кавычек записи не содержат переводов строк и границы ищутся так же, как для JSONL.
+    """
+    size = os.path.getsize(path)
+    bounds = [start]
+    with open(path, 'rb') as f:
+        if delimiter is not None and start + chunk_size < size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data.find(b'"', start) < 0:
+                    delimiter = None
+        if delimiter is not None:
+            if start + chunk_size < size:
+                f.seek(start)
+                with suppress(csv.Error):
+                    for _, position in _csv_records(f, delimiter):
+                        if position >= size:
+                            break
+                        if position - bounds[-1] >= chunk_size:
+                            bounds.append(position)
+        else:
+            while bounds[-1] + chunk_size < size:
+                f.seek(bounds[-1] + chunk_size)
+                f.readline()
+                if f.tell() >= size:
+                    break
+                bounds.append(f.tell())
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def parse_import_file(path: str, fmt: Optional[str] = None, delimiter: str = ',', workers: Optional[int] = None,
+                      chunk_size: int = IMPORT_CHUNK_SIZE,
+                      today: Optional[date] = None) -> Tuple[List[tuple], List[str]]:
+    """
+    - Разбирает выписку CSV или JSONL (fmt по умолчанию определяется по расширению).
+    - CSV может начинаться с заголовка (date,category,amount,description или дата,категория,сумма,описание),
+      без заголовка колонки идут в этом же порядке.
+    - Большой файл делится на куски, которые разбираются параллельно в ProcessPoolExecutor.
+    - Возвращает (строки (дата, категория, сумма, описание) в порядке файла, ошибки "строка N: текст").
+    """
+    if fmt is None:
+        fmt = 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+    today = today or date.today()
+    start, line_base, columns = 0, 0, None
+    if fmt == 'csv':
+        with open(path, 'rb') as f:
+            header, end = next(_csv_records(f, delimiter), ([], 0))
+        names = [IMPORT_FIELDS.get(name.strip().lower()) for name in header]
+        if 'date' in names and 'amount' in names:
+            columns = {name: i for i, name in enumerate(names) if name}
+            start, line_base = end, 1
+        else:
+            columns = {name: i for i, name in enumerate(_IMPORT_ORDER)}
+
+    chunks = _import_chunks(path, chunk_size, start, delimiter if fmt == 'csv' else None)
+    args = [(path, fmt, a, b, columns, delimiter, today) for a, b in chunks]
+    if len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_parse_import_chunk, *zip(*args)))
+    else:
+        results = [_parse_import_chunk(*a) for a in args]
+
+    rows: List[tuple] = []
+    errors: List[str] = []
+    for chunk_rows, chunk_errors, count in results:
+        rows.extend(chunk_rows)
+        errors.extend(f"строка {line_base + number + 1}: {message}" for number, message in chunk_errors)
+        line_base += count
+    return rows, errors
+
+
+class Metrics:
+    """
+    - Счетчики и гистограммы времени операций PersonalTracker и хранилищ (load, save, append, find, balance...).
+    - По умолчанию выключены и ничего не стоят: методы, отмеченные _instrumented, заменяются замеряющими
+      обертками только на время, пока enabled=True.
+    - Экспорт - as_dict() (JSON) и prometheus() (текстовый формат Prometheus).
+    """
+    # Верхние границы корзин гистограмм, секунды
+    BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+    def __init__(self) -> None:
+        self._enabled = False
+        # Отмеченные методы: (класс, имя, исходная функция, метрика, операция)
+        self._methods: List[tuple] = []
+        self.reset()
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value: bool) -> None:
+        if value == self._enabled:
+            return
+        self._enabled = value
+        for owner, name, func, metric, op in self._methods:
+            setattr(owner, name, _timed(func, metric, op) if value else func)
+
+    def reset(self) -> None:
+        self.counters: Dict[str, int] = {}
+        # (метрика, операция) -> [число в каждой корзине (последняя - +Inf), сумма, количество]
+        self.histograms: Dict[Tuple[str, str], list] = {}
+
+    def inc(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, metric: str, op: str, seconds: float) -> None:
+        histogram = self.histograms.get((metric, op))
+        if histogram is None:
+            histogram = self.histograms[metric, op] = [[0] * (len(self.BUCKETS) + 1), 0.0, 0]
+        histogram[0][bisect_left(self.BUCKETS, seconds)] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+    @contextmanager
+    def timer(self, metric: str, op: str):
+        if not self._enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(metric, op, time.perf_counter() - start)
+
+    def as_dict(self) -> dict:
+        """
+        Метрики в виде JSON: {"counters": {...}, "histograms": {метрика: {операция: {"buckets": [...], "sum", "count"}}}}.
+        Корзины накопительные, как в Prometheus, последняя - +Inf.
+        """
+        histograms: Dict[str, dict] = {}
+        for (metric, op), (buckets, total, count) in sorted(self.histograms.items()):
+            cumulative, running = [], 0
+            for value in buckets:
+                running += value
+                cumulative.append(running)
+            histograms.setdefault(metric, {})[op] = {'buckets': cumulative, 'sum': total, 'count': count}
+        return {'counters': dict(sorted(self.counters.items())), 'histograms': histograms}
+
+    def prometheus(self) -> str:
+        return metrics_to_prometheus(self.as_dict())
+
+
+def metrics_to_prometheus(data: dict, prefix: str = 'tracker') -> str:
+    """
+    Переводит метрики из Metrics.as_dict() в текстовый формат Prometheus.
+    """
+    lines = []
+    for name, value in data['counters'].items():
+        lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+    bounds = [repr(bound) for bound in Metrics.BUCKETS] + ['+Inf']
+    for metric, ops in data['histograms'].items():
+        name = f"{prefix}_{metric}"
+        lines.append(f"# TYPE {name} histogram")
+        for op, histogram in ops.items():
+            for bound, value in zip(bounds, histogram['buckets']):
+                lines.append(f'{name}_bucket{{op="{op}",le="{bound}"}} {value}')
+            lines.append(f'{name}_sum{{op="{op}"}} {histogram["sum"]!r}')
+            lines.append(f'{name}_count{{op="{op}"}} {histogram["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def profiled(path: Optional[str] = None, limit: int = 25):
+    """
+    - Профилирует блок: cProfile (время по функциям) и tracemalloc (пик памяти и места выделений).
+    - Отчет выводится в stderr; path - дополнительно сохранить статистику cProfile (для pstats, snakeviz).
+    """
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if path:
+            profiler.dump_stats(path)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(limit)
+        print(f"Пик памяти: {peak / 2**20:.1f} МиБ", file=sys.stderr)
+        for stat in snapshot.statistics('lineno')[:10]:
+            print(stat, file=sys.stderr)
+
+
+def _count_read(file) -> None:
+    """
+    Учитывает в METRICS (bytes_read) размер файла, который читается целиком.
+    """
+    if METRICS.enabled:
+        METRICS.inc('bytes_read', os.fstat(file.fileno()).st_size)
+
+
+class _instrumented:
+    """
+    Отмечает метод класса для замера времени в гистограмму metric с меткой op (см. Metrics.enabled).
+    В классе остается исходная функция, поэтому при выключенных метриках вызов не меняется.
+    """
+    def __init__(self, op: str, metric: str = 'operation_seconds') -> None:
+        self.op, self.metric = op, metric
+
+    def __call__(self, func):
+        self.func = func
+        return self
+
+    def __set_name__(self, owner, name: str) -> None:
+        METRICS._methods.append((owner, name, self.func, self.metric, self.op))
+        setattr(owner, name, _timed(self.func, self.metric, self.op) if METRICS.enabled else self.func)
+
+
+def _timed(func, metric: str, op: str):
+    """
+    Обертка func, замеряющая время вызова; у генераторов - время внутри генератора до исчерпания или закрытия.
+    """
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return _timed_iter(func(*args, **kwargs), metric, op)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                METRICS.observe(metric, op, time.perf_counter() - start)
+    return wrapper
+
+
+def _timed_iter(iterator: Iterator, metric: str, op: str) -> Iterator:
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                elapsed += time.perf_counter() - start
+                return
+            elapsed += time.perf_counter() - start
+            yield item
+    finally:
+        iterator.close()
+        METRICS.observe(metric, op, elapsed)
+
+
+class StaleLedgerError(Exception):
+    """
+    Данные в хранилище изменены другим процессом после загрузки: перезапись записями из памяти потеряла бы их.
+    """
+
+
+@contextmanager
+def _atomic_file(path: str, mode: str = 'w', **kwargs):
+    """
+    Файл для атомарной замены path: запись идет во временный файл с уникальным именем в том же каталоге,
+    после успешной записи - fsync и os.replace (читатели видят либо старый файл, либо новый целиком).
+    При ошибке временный файл удаляется, path не меняется.
+    """
+    directory, name = os.path.split(path)
+    fd, temp = tempfile.mkstemp(prefix=name + '.', suffix='.tmp', dir=directory or '.')
+    try:
+        with suppress(FileNotFoundError):
+            # mkstemp создает файл с правами 0600 - сохраняем права заменяемого файла
+            os.chmod(temp, os.stat(path).st_mode)
+        with open(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+    except BaseException:
+        with suppress(OSError):
+            os.remove(temp)
+        raise
+    _fsync_directory(directory)
+
+
+def _fsync_directory(directory: str) -> None:
+    """
+    Сбрасывает на диск запись каталога (переименование или удаление файла в нем).
+    """
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory or '.', os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _append_durably(path: str, text: Union[str, Iterable[str]], buffering: int = -1) -> None:
+    """
+    Дописывает text в конец path и дожидается записи на диск (fsync).
+    """
+    with open(path, 'a', encoding='utf8', buffering=buffering) as file:
+        if isinstance(text, str):
+            file.write(text)
+        else:
+            file.writelines(text)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+class FileLock:
+    """
+    - Рекомендательная блокировка между процессами (fcntl.flock) на файле path: общая - для чтения,
+      исключительная - для записи.
+    - Вложенные hold того же объекта не блокируют повторно; внутри общей блокировки исключительную
+      взять нельзя (RuntimeError): повышение блокировки может взаимно заблокировать два процесса.
+    - Без fcntl (Windows) блокировки не выполняются.
+    - create=False: файл блокировки не создается (для чтения без следов рядом с данными); если его нет,
+      ни один процесс еще не писал, и общая блокировка не берется.
+    """
+
+    def __init__(self, path: str, create: bool = True) -> None:
+        self.path = path
+        self.create = create
+        self._file = None
+        self._depth = 0
+        self._exclusive = False
+
+    @contextmanager
+    def hold(self, exclusive: bool) -> Iterator[None]:
+        if self._depth == 0:
+            self._acquire(exclusive)
+        elif exclusive and not self._exclusive:
+            raise RuntimeError("блокировка записи внутри блокировки чтения")
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if self._depth == 0 and self._file is not None:
+                # Закрытие файла снимает блокировку
+                self._file.close()
+                self._file = None
+
+    def _acquire(self, exclusive: bool) -> None:
+        self._exclusive = exclusive
+        if fcntl is None:
+            return
+        try:
+            file = open(self.path, 'a' if self.create else 'r')
+        except OSError:
+            if exclusive:
+                raise
+            # Каталог только для чтения (или файла блокировки нет): писать в него некому, читаем без блокировки
+            return
+        start = time.perf_counter()
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        except BaseException:
+            file.close()
+            raise
+        if METRICS.enabled:
+            METRICS.observe('lock_wait_seconds', 'write' if exclusive else 'read', time.perf_counter() - start)
+        self._file = file
+
+
+class Storage(ABC):
+    """
+    - Интерфейс хранилища записей PersonalTracker: загрузка, дозапись, правка и перезапись;
+      iter_records, append, update и rewrite обязательны для наследников.
+    - queryable=True означает, что хранилище само выполняет поиск и баланс (get, max_id, count, find, totals),
+      и PersonalTracker не загружает записи в память без необходимости.
+    - pending - число изменений, ожидающих свертки методом compact.
+    - read_only=True: хранилище только читается - PersonalTracker не сохраняет рядом с данными суммы и индексы.
+    """
+    queryable = False
+    read_only = False
+    # Файлы материализованных сумм (LedgerTotals) и полнотекстового индекса (TextIndex) рядом с данными;
+    # None - хранилище их не сохраняет
+    totals_path: Optional[str] = None
+    text_index_path: Optional[str] = None
+
+    @property
+    def pending(self) -> int:
+        return 0
+
+    def fingerprint(self) -> tuple:
+        """
+        Отпечаток состояния данных (4 числа: размеры и время изменения файлов): сохраненные суммы действительны,
+        пока он не изменился.
+        """
+        return 0, 0, 0, 0
+
+    def checksum(self) -> int:
+        """
+        Контрольная сумма содержимого данных (см. stamp).
+        """
+        return 0
+
+    def stamp(self) -> tuple:
+        """
+        - Отпечаток для файлов рядом с данными (суммы, индекс описаний): fingerprint() и контрольная сумма.
+        - Правка в обход программы в тот же такт часов файловой системы с тем же размером файла не меняет
+          fingerprint. Поэтому, если данные изменены меньше чем за RACY_WINDOW_NS до сохранения отпечатка,
+          в него добавляется checksum(), иначе -1 (последующая правка уже изменит время).
+        """
+        fingerprint = self.fingerprint()
+        recent = time.time_ns() - max(fingerprint[1::2]) < RACY_WINDOW_NS
+        return (*fingerprint, self.checksum() if recent else -1)
+
+    def stamp_matches(self, stamp: Sequence[int]) -> bool:
+        """
+        Соответствует ли отпечаток stamp текущему состоянию данных; контрольная сумма считается только
+        для отпечатков, сохраненных сразу после изменения данных.
+        """
+        *fingerprint, checksum = stamp
+        return tuple(fingerprint) == tuple(self.fingerprint()) and (checksum < 0 or checksum == self.checksum())
+
+    def reading(self):
+        """
+        Блокировка для согласованного чтения несколькими вызовами (например, iter_records и iter_updates):
+        другие процессы не меняют данные, пока она взята.
+        """
+        return nullcontext()
+
+    def writing(self):
+        """
+        Исключительная блокировка для изменения данных: другие процессы не читают и не пишут, пока она взята.
+        """
+        return nullcontext()
+
+    def version(self) -> Optional[tuple]:
+        """
+        Версия данных для оптимистичной проверки: меняется при любом изменении, в том числе другим процессом.
+        None - хранилище версий не отслеживает.
+        """
+        return None
+
+    def changes_since(self, version: tuple) -> Optional[Tuple[List[Record], List[Record]]]:
+        """
+        Изменения после версии version: (новые записи, правки - как iter_updates) или None,
+        если данные с тех пор перезаписаны и их нужно прочитать заново.
+        """
+        return None
+
+    def close(self) -> None:
+        """
+        Освобождает ресурсы хранилища (соединение с базой и т. п.).
+        """
+
+    @abstractmethod
+    def iter_records(self, trusted: bool = False) -> Iterator[Record]:
+        """
+        Возвращает сохраненные записи.
+        """
+
+    def iter_updates(self, trusted: bool = False) -> Iterator[Record]:
+        """
+        Возвращает изменения поверх iter_records: запись с известным id заменяет прежнюю, с новым - добавляется.
+        """
+        return iter(())
+
+    def begin(self) -> None:
+        """
+        Начинает пакет изменений: до commit они могут копиться в памяти.
+        """
+
+    def commit(self) -> None:
+        """
+        Сохраняет изменения, накопленные с begin.
+        """
+
+    @abstractmethod
+    def append(self, record: Record) -> None:
+        """
+        Сохраняет новую запись.
+        """
+
+    def append_many(self, records: Iterable[Record]) -> None:
+        for record in records:
+            self.append(record)
+
+    @abstractmethod
+    def update(self, record: Record) -> None:
+        """
+        Сохраняет правку записи с известным id.
+        """
+
+    @abstractmethod
+    def rewrite(self, records: Iterable[Record]) -> None:
+        """
+        Заменяет все сохраненные записи записями records.
+        """
+
+    def compact(self, records: Iterable[Record]) -> None:
+        """
+        Сворачивает накопленные изменения (records - актуальное состояние всех записей).
+        """
+        if self.pending:
+            self.rewrite(records)
+
+    def count(self) -> int:
+        """
+        Число записей (с учетом iter_updates); хранилища с queryable=True считают его без разбора записей.
+        """
+        ids = {record.id for record in self.iter_records(trusted=True)}
+        ids.update(record.id for record in self.iter_updates(trusted=True))
+        return len(ids)
+
+
+def _read_locked(method):
+    """
+    Метод чтения TextStorage под общей блокировкой: запись другого процесса не попадет в середину чтения.
+    Накопленные в пакетном режиме изменения записываются до нее. Блокировка снимается при возврате из метода,
+    поэтому метод, возвращающий итератор, должен зафиксировать читаемое состояние до возврата (см. find).
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._flush()
+        with self.reading():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class TextStorage(Storage):
+    """
+    - Текстовый файл формата data.txt и журнал изменений рядом с ним (data_journal.txt).
+    - Новые записи дописываются в конец файла, правки - в журнал, оба за O(1) и с fsync.
+    - Перезапись идет через временный файл с уникальным именем и атомарный os.replace, после нее журнал удаляется.
+    - Несколько процессов могут работать с одним файлом: чтение идет под общей блокировкой data.lock,
+      изменения - под исключительной (FileLock); version и changes_since позволяют трекеру подтянуть
+      чужие изменения перед своими.
+    - indexed=True: хранилище отвечает на запросы само, не загружая записи (queryable). Рядом с data.txt
+      ведется индекс смещений data_offsets.bin (id -> байтовое смещение записи): get читает одну запись
+      по seek, а find и totals разбирают только нужные поля (например, категорию и сумму для баланса).
+    - read_only=True: только чтение, рядом с data.txt ничего не создается (ни data.lock, ни суммы и индексы),
+      изменения отклоняются (PermissionError).
+    """
+
+    def __init__(self, path: str = DATA_FILE, indexed: bool = False, read_only: bool = False) -> None:
+        self.path = path
+        self.queryable = indexed
+        self.read_only = read_only
+        base, ext = os.path.splitext(path)
+        self.journal_path = f"{base}_journal{ext}"
+        self.totals_path = f"{base}_totals.bin"
+        self.text_index_path = f"{base}_text.idx"
+        self.offsets_path = f"{base}_offsets.bin"
+        self.lock = FileLock(f"{base}.lock", create=not read_only)
+        # Номер последнего изменения в журнале
+        self.seq = 0
+        # Буферы пакетного режима (begin/commit): текст для data.txt и для журнала (номера изменений
+        # присваиваются при записи)
+        self._appends: Optional[List[str]] = None
+        self._updates: Optional[List[str]] = None
+        # Индекс смещений (indexed=True): отсортированные id и параллельно их смещения (id могут быть сколь
+        # угодно большими и редкими), до какого байта data.txt он построен, inode файла (после перезаписи
+        # индекс строится заново), канонический ли формат файла и еще не сохраненные пары (None - сохранить целиком)
+        self._offset_ids: Optional[array] = None
+        self._offsets: Optional[array] = None
+        self._indexed_size = 0
+        self._inode = 0
+        self._canonical = True
+        self._changed_offsets: Optional[array] = None
+        # Последние версии записей из журнала, позиция, до которой журнал прочитан, и его inode
+        self._journal: Dict[int, Record] = {}
+        self._journal_size = 0
+        self._journal_inode = 0
+
+    def fingerprint(self) -> tuple:
+        result = []
+        for path in (self.path, self.journal_path):
+            try:
+                stat = os.stat(path)
+                result += [stat.st_size, stat.st_mtime_ns]
+            except FileNotFoundError:
+                result += [0, 0]
+        return tuple(result)
+
+    def checksum(self) -> int:
+        """
+        CRC32 содержимого data.txt и журнала.
+        """
+        crc = 0
+        for path in (self.path, self.journal_path):
+            try:
+                with open(path, 'rb') as f:
+                    for chunk in iter(functools.partial(f.read, 1 << 20), b''):
+                        crc = zlib.crc32(chunk, crc)
+            except FileNotFoundError:
+                pass
+        return crc
+
+    def reading(self):
+        return self.lock.hold(False)
+
+    def writing(self):
+        if self.read_only:
+            raise PermissionError(f"{self.path} открыт только для чтения")
+        return self.lock.hold(True)
+
+    def version(self) -> tuple:
+        """
+        (inode, размер) data.txt и журнала: дозапись меняет размер, перезапись и свертка - inode.
+        """
+        result = []
+        for path in (self.path, self.journal_path):
+            try:
+                stat = os.stat(path)
+                result += [stat.st_ino, stat.st_size]
+            except FileNotFoundError:
+                result += [0, 0]
+        return tuple(result)
+
+    def changes_since(self, version: tuple) -> Optional[Tuple[List[Record], List[Record]]]:
+        """
+        Дочитывает хвосты data.txt и журнала, дописанные после version; None, если файлы с тех пор переписаны.
+        """
+        with self.reading():
+            current = self.version()
+            tails = []
+            for path, (inode, size), (new_inode, new_size) in zip(
+                    (self.path, self.journal_path), (version[:2], version[2:]), (current[:2], current[2:])):
+                if new_size == size and new_inode == inode:
+                    tails.append("")
+                    continue
+                if inode and (new_inode != inode or new_size < size):
+                    return None
+                # Журнала не было (inode 0) - читается целиком
+                start = size if inode else 0
+                with open(path, 'rb') as f:
+                    f.seek(start)
+                    tails.append(f.read(new_size - start).decode('utf8'))
+                if METRICS.enabled:
+                    METRICS.inc('bytes_read', new_size - start)
+        appended = list(iter_records(tails[0].splitlines(), trusted=True))
+        updates = []
+        for seq, record in iter_journal(tails[1].splitlines(), trusted=True):
+            self.seq = max(self.seq, seq)
+            updates.append(record)
+        return appended, updates
+
+    def begin(self) -> None:
+        self._appends, self._updates = [], []
+
+    def commit(self) -> None:
+        self._flush()
+        self._appends = self._updates = None
+
+    def _flush(self) -> None:
+        """
+        Записывает накопленные в пакетном режиме изменения, оставаясь в пакетном режиме.
+        """
+        appends, updates = self._appends, self._updates
+        if not appends and not updates:
+            return
+        self._appends, self._updates = [], []
+        with self.writing():
+            if appends:
+                _append_durably(self.path, ''.join(appends))
+            if updates:
+                self._append_journal(updates)
+
+    def _journal_tail(self) -> Tuple[int, str]:
+        """
+        - Последний номер изменения в журнале (по его хвосту) и разделитель, который нужно дописать перед
+          новыми записями.
+        - Файл может кончаться не пустой строкой после недописанной записи (сбой посреди записи): без
+          разделителя она склеилась бы со следующей.
+        """
+        try:
+            file = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            return 0, ""
+        with file:
+            end = file.seek(0, os.SEEK_END)
+            if not end:
+                return 0, ""
+            size = 4096
+            while True:
+                start = max(end - size, 0)
+                file.seek(start)
+                tail = file.read(end - start)
+                # Строка на границе прочитанного куска может быть неполной
+                seqs = [int(match.group(1)) for match in _JOURNAL_SEQ.finditer(tail) if start == 0 or match.start()]
+                if seqs or not start:
+                    break
+                size *= 4
+        separator = "" if tail.endswith(b"\n\n") else "\n" if tail.endswith(b"\n") else "\n\n"
+        return max(seqs, default=0), separator
+
+    def _append_journal(self, entries: List[str]) -> None:
+        """
+        Дописывает в журнал записи entries (format_record), вызывается под блокировкой записи. Номера изменений
+        продолжают последний номер в журнале: его мог продолжить другой экземпляр хранилища.
+        """
+        last, separator = self._journal_tail()
+        self.seq = max(self.seq, last)
+        text = [separator]
+        for entry in entries:
+            self.seq += 1
+            text.append(f"seq: {self.seq}\n{entry}")
+        # Одна запись в журнале - один вызов write
+        _append_durably(self.journal_path, ''.join(text))
+
+    @property
+    def pending(self) -> int:
+        return self.seq + len(self._updates or ())
+
+    def iter_records(self, trusted: bool = False) -> Iterator[Record]:
+        with self.reading(), open(self.path, 'r', encoding='utf8') as file:
+            _count_read(file)
+            yield from iter_records(file, trusted)
+
+    def iter_updates(self, trusted: bool = False) -> Iterator[Record]:
+        with self.reading():
+            if not os.path.exists(self.journal_path):
+                return
+            with open(self.journal_path, 'r', encoding='utf8') as file:
+                _count_read(file)
+                for seq, record in iter_journal(file, trusted):
+                    self.seq = max(self.seq, seq)
+                    yield record
+
+    def append(self, record: Record) -> None:
+        if self._appends is not None:
+            self._appends.append(format_record(record))
+            return
+        with self.writing():
+            _append_durably(self.path, format_record(record))
+
+    def append_many(self, records: Iterable[Record]) -> None:
+        if self._appends is not None:
+            self._appends.extend(map(format_record, records))
+            return
+        # Одно открытие файла и буферизованная запись вместо open/close на каждую запись
+        with self.writing():
+            _append_durably(self.path, map(format_record, records), buffering=2**20)
+
+    def update(self, record: Record) -> None:
+        entry = format_record(record)
+        if self._updates is not None:
+            self._updates.append(entry)
+            return
+        with self.writing():
+            self._append_journal([entry])
+
+    def rewrite(self, records: Iterable[Record]) -> None:
+        if self._appends is not None:
+            # Перезапись уже содержит все накопленные изменения
+            self._appends, self._updates = [], []
+        with self.writing():
+            with _atomic_file(self.path, 'w', encoding='utf8') as f:
+                for obj in records:
+                    f.write(format_record(obj))
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+                _fsync_directory(os.path.dirname(self.path))
+            self.seq = 0
+
+    def compact(self, records: Optional[Iterable[Record]]) -> None:
+        with self.writing():
+            if os.path.exists(self.journal_path):
+                if records is None:
+                    # Записи не загружены трекером: собираем актуальное состояние сами
+                    self._flush()
+                    current = {}
+                    for record in self.iter_records(trusted=True):
+                        current.setdefault(record.id, record)
+                    for record in self.iter_updates(trusted=True):
+                        current[record.id] = record
+                    records = current.values()
+                self.rewrite(records)
+
+    # Чтение без загрузки записей (indexed=True)
+
+    def _refresh_offsets(self) -> None:
+        """
+        Приводит индекс смещений в соответствие с data.txt: читает его из data_offsets.bin, дописанный
+        хвост файла дочитывает, после перезаписи файла (другой inode) строит заново; изменения сохраняет.
+        """
+        self._flush()
+        try:
+            stat = os.stat(self.path)
+            size, inode = stat.st_size, stat.st_ino
+        except FileNotFoundError:
+            size = inode = 0
+        if self._offsets is None:
+            self._load_offsets()
+        if self._offsets is None or inode != self._inode or size < self._indexed_size:
+            self._offset_ids, self._offsets, self._indexed_size, self._inode = array('q'), array('q'), 0, inode
+            self._canonical, self._changed_offsets = True, None
+        if size == self._indexed_size:
+            return
+        if METRICS.enabled:
+            METRICS.inc('bytes_read', size - self._indexed_size)
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = self._indexed_size
+            count = 0
+            ids, offsets = array('q'), array('q')
+            for count, match in enumerate(_RECORD_PATTERN.finditer(data, start), 1):
+                ids.append(int(match.group(1)))
+                offsets.append(match.start())
+            # Записи в другом виде (порядок полей, регистр) разбираются только общим парсером
+            if count != len(_ID_LINE.findall(data, start)):
+                self._canonical = False
+        self._add_offsets(ids, offsets)
+        self._indexed_size = size
+        self._save_offsets()
+
+    def _add_offsets(self, ids: array, offsets: array) -> None:
+        """
+        - Добавляет в индекс смещения записей ids; для id, который уже есть (или повторяется), остается первое
+          смещение - как у первого вхождения записи в data.txt.
+        - Дописанные в конец data.txt записи обычно идут по возрастанию id: они добавляются в конец массивов
+          и потом дописываются в data_offsets.bin. Иначе массивы собираются заново и файл переписывается целиком,
+          так что пары в нем всегда идут по возрастанию id.
+        """
+        known_ids = self._offset_ids
+        if (not ids or not known_ids or ids[0] > known_ids[-1]) and all(map(int.__lt__, ids, ids[1:])):
+            known_ids.extend(ids)
+            self._offsets.extend(offsets)
+            if self._changed_offsets is not None:
+                self._changed_offsets.extend(_pairs(ids, offsets))
+            return
+        current = dict(zip(known_ids, self._offsets))
+        for id, offset in zip(ids, offsets):
+            current.setdefault(id, offset)
+        order = sorted(current)
+        self._offset_ids, self._offsets = array('q', order), array('q', map(current.__getitem__, order))
+        self._changed_offsets = None
+
+    def _offset_of(self, id: int) -> Optional[int]:
+        ids = self._offset_ids
+        position = bisect_left(ids, id)
+        return self._offsets[position] if position < len(ids) and ids[position] == id else None
+
+    def _load_offsets(self) -> None:
+        try:
+            with open(self.offsets_path, 'rb') as f:
+                header = f.read(_OFFSETS_HEADER.size)
+                magic, version, canonical, inode, size = _OFFSETS_HEADER.unpack(header)
+                if magic != OFFSETS_MAGIC or version != OFFSETS_VERSION:
+                    return
+                pairs = array('q')
+                # Недописанная при сбое последняя пара отбрасывается
+                pairs.fromfile(f, (os.fstat(f.fileno()).st_size - _OFFSETS_HEADER.size) // 16 * 2)
+        except (OSError, struct.error, EOFError):
+            return
+        self._offset_ids, self._offsets = pairs[::2], pairs[1::2]
+        self._canonical, self._inode, self._indexed_size = bool(canonical), inode, size
+        self._changed_offsets = array('q')
+
+    def _save_offsets(self) -> None:
+        """
+        Сохраняет индекс смещений: целиком после построения, иначе - дописывает новые пары и обновляет заголовок.
+        """
+        if self.read_only:
+            return
+        header = _OFFSETS_HEADER.pack(OFFSETS_MAGIC, OFFSETS_VERSION, self._canonical, self._inode, self._indexed_size)
+        try:
+            if self._changed_offsets is None or not os.path.exists(self.offsets_path):
+                with _atomic_file(self.offsets_path, 'wb') as f:
+                    f.write(header)
+                    _pairs(self._offset_ids, self._offsets).tofile(f)
+            else:
+                with open(self.offsets_path, 'r+b') as f:
+                    # Новые пары пишутся поверх недописанной при сбое последней пары, если она есть
+                    f.seek(0, os.SEEK_END)
+                    f.seek(f.tell() - (f.tell() - _OFFSETS_HEADER.size) % 16)
+                    self._changed_offsets.tofile(f)
+                    f.seek(0)
+                    f.write(header)
+            self._changed_offsets = array('q')
+        except OSError:
+            # Индекс - только ускорение: при следующем запуске он будет построен заново
+            self._changed_offsets = None
+
+    def _refresh_journal(self) -> None:
+        """
+        Дочитывает новые записи журнала (он только дописывается до свертки).
+        """
+        self._flush()
+        try:
+            stat = os.stat(self.journal_path)
+            size, inode = stat.st_size, stat.st_ino
+        except FileNotFoundError:
+            size = inode = 0
+        if size < self._journal_size or inode != self._journal_inode:
+            # Журнал свернут (и, возможно, начат заново другим процессом) - читается с начала
+            self._journal, self._journal_size, self._journal_inode, self.seq = {}, 0, inode, 0
+        if size == self._journal_size:
+            return
+        with open(self.journal_path, 'rb') as f:
+            f.seek(self._journal_size)
+            tail = f.read(size - self._journal_size).decode('utf8')
+        if METRICS.enabled:
+            METRICS.inc('bytes_read', size - self._journal_size)
+        for seq, record in iter_journal(tail.splitlines(), trusted=True):
+            self.seq = max(self.seq, seq)
+            self._journal[record.id] = record
+        self._journal_size = size
+
+    def _map(self) -> Optional[mmap.mmap]:
+        """
+        Отображает data.txt в память (None - файла нет или он пуст). Отображение не меняется, когда другой процесс
+        дописывает файл или подменяет его при перезаписи, поэтому читать его можно и после снятия блокировки.
+        """
+        if not os.path.exists(self.path) or not os.path.getsize(self.path):
+            return None
+        with open(self.path, 'rb') as f:
+            _count_read(f)
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def _scan(data: Optional[mmap.mmap], journal: Dict[int, Record]) -> Iterator[Tuple[re.Match, Optional[Record]]]:
+        """
+        Проходит отображение data.txt (см. _map) по записям канонического вида: пары (совпадение _RECORD_PATTERN,
+        версия из журнала или None), в конце закрывает его. Поля из совпадения разбираются вызывающим
+        только по необходимости.
+        """
+        if data is None:
+            return
+        with data:
+            for match in _RECORD_PATTERN.finditer(data):
+                yield match, journal.get(int(match.group(1))) if journal else None
+
+    def _current_records(self) -> Iterator[Record]:
+        """
+        Актуальные записи общим парсером (для файлов не канонического вида).
+        """
+        current: Dict[int, Record] = {}
+        for record in self.iter_records(trusted=True):
+            current.setdefault(record.id, record)
+        current.update(self._journal)
+        return iter(current.values())
+
+    @_read_locked
+    def get(self, id: int) -> Optional[Record]:
+        self._refresh_journal()
+        record = self._journal.get(id)
+        if record is not None:
+            return record
+        self._refresh_offsets()
+        if not self._canonical:
+            return next((r for r in self._current_records() if r.id == id), None)
+        offset = self._offset_of(id)
+        if offset is None:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            lines = []
+            for line in f:
+                if not line.strip():
+                    break
+                lines.append(line.decode('utf8'))
+            if METRICS.enabled:
+                METRICS.inc('bytes_read', f.tell() - offset)
+        return next(iter_records(lines, trusted=True), None)
+
+    @_read_locked
+    def max_id(self) -> int:
+        self._refresh_journal()
+        self._refresh_offsets()
+        if not self._canonical:
+            return max((r.id for r in self._current_records()), default=0)
+        return max(self._offset_ids[-1] if self._offset_ids else 0, max(self._journal, default=0))
+
+    @_read_locked
+    def count(self) -> int:
+        self._refresh_journal()
+        self._refresh_offsets()
+        if not self._canonical:
+            return sum(1 for _ in self._current_records())
+        # Записи журнала с новыми id добавляются к записям data.txt
+        return len(self._offset_ids) + sum(1 for id in self._journal if self._offset_of(id) is None)
+
+    @_read_locked
+    def find(self, criteria: dict, ranges: dict) -> Iterator[Record]:
+        """
+        - Поиск по условиям на равенство criteria и диапазонам ranges ({поле: (от, до)}), см. iter_find_records.
+        - У каждой записи сначала разбираются только поля из условий, целиком - только у подходящих.
+        - Под блокировкой фиксируется состояние данных (отображение data.txt и версии из журнала), записи
+          выдаются уже без нее: вызывающий может перебирать их сколько угодно долго, не задерживая запись.
+        """
+        self._refresh_journal()
+        self._refresh_offsets()
+        fields = [(key, value, None, None) for key, value in criteria.items()]
+        fields += [(key, None, low, high) for key, (low, high) in ranges.items()]
+        for key, *_ in fields:
+            if key not in _RECORD_GROUPS:
+                raise AttributeError(f"у записи нет поля {key}")
+        if not self._canonical:
+            records = self._current_records()
+        else:
+            journal = dict(self._journal)
+            # Записи, которые есть только в журнале
+            extra = [record for id, record in journal.items() if self._offset_of(id) is None]
+            records = self._scan_matching(fields, self._map(), journal, extra)
+        return (record for record in records if self._matches(record, fields))
+
+    @staticmethod
+    def _matches(record: Record, fields: list) -> bool:
+        for key, value, low, high in fields:
+            field = getattr(record, key)
+            if value is not None and field != value:
+                return False
+            if (low is not None and field < low) or (high is not None and field > high):
+                return False
+        return True
+
+    def _scan_matching(self, fields: list, data: Optional[mmap.mmap], journal: Dict[int, Record],
+                       extra: List[Record]) -> Iterator[Record]:
+        seen = set()
+        converters = [(_RECORD_GROUPS[key], _FIELD_PARSERS[key], value, low, high) for key, value, low, high in fields]
+        for match, edited in self._scan(data, journal):
+            if edited is not None:
+                # Запись изменена в журнале: проверяется ее последняя версия
+                if edited.id not in seen:
+                    seen.add(edited.id)
+                    yield edited
+                continue
+            for group, parse, value, low, high in converters:
+                field = parse(match.group(group))
+                if (value is not None and field != value) or (low is not None and field < low) \
+                        or (high is not None and field > high):
+                    break
+            else:
+                yield _match_record(match)
+        yield from extra
+
+    @_read_locked
+    def totals(self) -> Tuple[int, int, int]:
+        """
+        Доходы, расходы и баланс: у записей разбираются только категория и сумма.
+        """
+        self._refresh_journal()
+        self._refresh_offsets()
+        dox = ras = 0
+        if not self._canonical:
+            for record in self._current_records():
+                if record.category == "Доход":
+                    dox += record.amount
+                else:
+                    ras += record.amount
+            return dox, ras, dox - ras
+        income = "Доход".encode('utf8')
+        for match, edited in self._scan(self._map(), self._journal):
+            if edited is not None:
+                continue
+            if match.group(3) == income:
+                dox += parse_number(match.group(4))
+            else:
+                ras += parse_number(match.group(4))
+        # Версии из журнала заменяют пропущенные выше записи data.txt
+        for record in self._journal.values():
+            if record.category == "Доход":
+                dox += record.amount
+            else:
+                ras += record.amount
+        return dox, ras, dox - ras
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    category TEXT NOT NULL,
+    amount NUMERIC NOT NULL,
+    description TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_date ON records(date);
+CREATE INDEX IF NOT EXISTS records_category ON records(category, date);
+CREATE INDEX IF NOT EXISTS records_amount ON records(amount);
+"""
+_SQLITE_SELECT = "SELECT id, date, category, amount, description FROM records"
+_SQLITE_UPSERT = "INSERT OR REPLACE INTO records (id, date, category, amount, description) VALUES (?, ?, ?, ?, ?)"
+_SQLITE_COLUMNS = ('id', 'date', 'category', 'amount', 'description')
+
+
+class SqliteStorage(Storage):
+    """
+    - Хранилище в базе SQLite (стандартный модуль sqlite3) в режиме WAL.
+    - Записи лежат в таблице records с индексами по дате, категории и сумме;
+      поиск и баланс выполняются запросами SQL, без загрузки записей в память.
+    - Перезапись идет одной транзакцией через executemany; запросы параметризованы
+      и берутся из кэша подготовленных выражений sqlite3.
+    - version - PRAGMA data_version (меняется при изменениях через другие соединения) и счетчик своих изменений.
+    """
+    queryable = True
+
+    def __init__(self, path: str = 'data.db') -> None:
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(_SQLITE_SCHEMA)
+        self._batch = False
+        self._changes = 0
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def begin(self) -> None:
+        self._batch = True
+
+    def commit(self) -> None:
+        self._batch = False
+        self.connection.commit()
+
+    def version(self) -> tuple:
+        return self.connection.execute("PRAGMA data_version").fetchone()[0], self._changes
+
+    def _write(self, sql: str, params) -> None:
+        # В пакетном режиме все изменения попадают в одну транзакцию
+        self._changes += 1
+        self.connection.execute(sql, params)
+        if not self._batch:
+            self.connection.commit()
+
+    @staticmethod
+    def _row(record: Record) -> tuple:
+        return record.id, record.date.isoformat(), record.category, record.amount, record.description
+
+    @staticmethod
+    def _record(row: tuple) -> Record:
+        id, day, category, amount, description = row
+        return make_record(id, date.fromisoformat(day), category, amount, description, trusted=True)
+
+    def iter_records(self, trusted: bool = False) -> Iterator[Record]:
+        for row in self.connection.execute(_SQLITE_SELECT + " ORDER BY id"):
+            yield self._record(row)
+
+    def append(self, record: Record) -> None:
+        self._write(_SQLITE_UPSERT, self._row(record))
+
+    def append_many(self, records: Iterable[Record]) -> None:
+        self._changes += 1
+        self.connection.executemany(_SQLITE_UPSERT, map(self._row, records))
+        if not self._batch:
+            self.connection.commit()
+
+    update = append
+
+    def rewrite(self, records: Iterable[Record]) -> None:
+        self._changes += 1
+        # Вне пакета - отдельная транзакция; в пакете перезапись входит в его транзакцию до commit
+        with nullcontext() if self._batch else self.connection:
+            self.connection.execute("DELETE FROM records")
+            self.connection.executemany(_SQLITE_UPSERT, map(self._row, records))
+
+    def compact(self, records: Iterable[Record]) -> None:
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def get(self, id: int) -> Optional[Record]:
+        row = self.connection.execute(_SQLITE_SELECT + " WHERE id = ?", (id,)).fetchone()
+        return None if row is None else self._record(row)
+
+    def max_id(self) -> int:
+        return self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM records").fetchone()[0]
+
+    def count(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def find(self, criteria: dict, ranges: dict) -> Iterator[Record]:
+        """
+        Поиск по условиям на равенство criteria и диапазонам ranges ({поле: (от, до)}), см. iter_find_records.
+        """
+        clauses, params = [], []
+        for key, value in criteria.items():
+            if key not in _SQLITE_COLUMNS:
+                raise AttributeError(f"у записи нет поля {key}")
+            if key == 'date':
+                if not isinstance(value, date):
+                    return
+                value = value.isoformat()
+            clauses.append(f"{key} = ?")
+            params.append(value)
+        for key, (low, high) in ranges.items():
+            for op, bound in ((">=", low), ("<=", high)):
+                if bound is not None:
+                    clauses.append(f"{key} {op} ?")
+                    params.append(bound.isoformat() if key == 'date' else bound)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        for row in self.connection.execute(f"{_SQLITE_SELECT}{where} ORDER BY id", params):
+            yield self._record(row)
+
+    def totals(self) -> Tuple[int, int, int]:
+        dox, ras = self.connection.execute(
+            "SELECT COALESCE(SUM(CASE WHEN category = 'Доход' THEN amount END), 0), "
+            "COALESCE(SUM(CASE WHEN category <> 'Доход' THEN amount END), 0) FROM records").fetchone()
+        return dox, ras, dox - ras
+
+
+def _month_key(day: date) -> int:
+    return day.year * 12 + day.month - 1
+
+
+def _month_name(key: int) -> str:
+    return f"{key // 12:04d}-{key % 12 + 1:02d}"
+
+
+# Файл месяца помесячного хранилища; прочие файлы каталога (заметки и т.п.) не трогаются.
+_MONTH_FILE = re.compile(r'(\d{4})-(0[1-9]|1[0-2])\.txt')
+
+
+def _month_of(name: str) -> Optional[int]:
+    """
+    Ключ месяца (year * 12 + month - 1) по имени файла YYYY-MM.txt; None для других файлов.
+    """
+    match = _MONTH_FILE.fullmatch(name)
+    return None if match is None else int(match[1]) * 12 + int(match[2]) - 1
+
+
+def _partition_summary(records: List[Record]) -> dict:
+    """
+    Сводка месяца для манифеста: число записей, границы дат и id, суммы доходов и расходов.
+    """
+    income = sum(r.amount for r in records if r.category == "Доход")
+    return {'count': len(records),
+            'min_date': min(r.date for r in records), 'max_date': max(r.date for r in records),
+            'min_id': min(r.id for r in records), 'max_id': max(r.id for r in records),
+            'income': income, 'expense': sum(r.amount for r in records) - income}
+
+
+class ShardedStorage(Storage):
+    """
+    - Записи разложены по месяцам: каталог (по умолчанию ledger/) с файлами YYYY-MM.txt в формате data.txt,
+      внутри файла записи идут по возрастанию id.
+    - manifest.json хранит для каждого месяца число записей, min/max дату и id, суммы доходов и расходов:
+      баланс считается по манифесту без чтения файлов, поиск читает только месяцы, подходящие под условия.
+    - Манифест пишется после файлов месяцев и хранит размер и mtime каждого файла: если при открытии они
+      не совпадают (сбой между записью месяца и манифеста, правка вручную), сводка месяца и карта id
+      строятся заново по файлам.
+    - ids.bin - номер месяца для каждого id, по нему get и правка находят файл без перебора: пары (id, месяц + 1)
+      array 'q', 0 - запись удалена. Изменения дописываются в конец, последняя пара для id главнее; когда
+      устаревших пар становится больше живых, файл переписывается целиком через временный файл.
+    - Правка переписывает только затронутые месяцы: один, или два, если запись переехала в другой месяц.
+    """
+    queryable = True
+
+    def __init__(self, path: str = SHARD_DIR) -> None:
+        self.path = path
+        self.manifest_path = os.path.join(path, MANIFEST_FILE)
+        self.ids_path = os.path.join(path, SHARD_IDS_FILE)
+        os.makedirs(path, exist_ok=True)
+        # Сводки месяцев по ключу year * 12 + month - 1
+        self.partitions: Dict[int, dict] = {}
+        # Номер месяца для каждого id (словарь: id могут быть сколь угодно большими и редкими),
+        # читается при первом обращении; _ids_stored - число пар в ids.bin
+        self._ids: Optional[Dict[int, int]] = None
+        self._changed_ids: Optional[set] = set()
+        self._ids_stored = 0
+        # Буфер пакетного режима (begin/commit): новые записи по месяцам
+        self._appends: Optional[Dict[int, List[Record]]] = None
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding='utf8') as f:
+                for name, entry in json.load(f)['partitions'].items():
+                    year, month = name.split('-')
+                    entry['min_date'], entry['max_date'] = map(date.fromisoformat, (entry['min_date'], entry['max_date']))
+                    self.partitions[int(year) * 12 + int(month) - 1] = entry
+            self._check_partitions()
+        elif any(_month_of(name) is not None for name in os.listdir(path)):
+            self.rebuild()
+
+    def _stamp(self, key: int) -> None:
+        """
+        Запоминает в сводке месяца размер и mtime его файла (после каждой записи файла).
+        """
+        stat = os.stat(self._file(key))
+        self.partitions[key].update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+    def _check_partitions(self) -> None:
+        """
+        Сверяет сводки манифеста с файлами месяцев: сводки месяцев, чей файл изменен, удален или появился
+        после записи манифеста, строятся заново, а карта id - по всем файлам.
+        """
+        stale = False
+        files = {_month_of(name) for name in os.listdir(self.path)} - {None}
+        for key in set(self.partitions) | files:
+            entry = self.partitions.get(key)
+            try:
+                stat = os.stat(self._file(key))
+            except FileNotFoundError:
+                stat = None
+            if entry is not None and stat is not None \
+                    and (entry.get('size'), entry.get('mtime_ns')) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            stale = True
+            records = list(self._read(key)) if stat is not None else []
+            if records:
+                self.partitions[key] = _partition_summary(records)
+                self._stamp(key)
+            else:
+                self.partitions.pop(key, None)
+        if stale:
+            self._ids = None
+            if os.path.exists(self.ids_path):
+                os.remove(self.ids_path)
+            self._get_ids()
+            self._save()
+
+    def _file(self, key: int) -> str:
+        return os.path.join(self.path, _month_name(key) + '.txt')
+
+    def _read(self, key: int, trusted: bool = True) -> Iterator[Record]:
+        with open(self._file(key), 'r', encoding='utf8') as file:
+            _count_read(file)
+            yield from iter_records(file, trusted)
+
+    def _write(self, key: int, records: List[Record]) -> None:
+        """
+        Переписывает файл месяца через временный файл (пустой месяц удаляется) и обновляет его сводку.
+        """
+        path = self._file(key)
+        if not records:
+            self.partitions.pop(key, None)
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        with _atomic_file(path, 'w', encoding='utf8') as f:
+            f.writelines(map(format_record, records))
+        self.partitions[key] = _partition_summary(records)
+        self._stamp(key)
+
+    def _get_ids(self) -> Dict[int, int]:
+        if self._ids is None:
+            ids: Dict[int, int] = {}
+            pairs = array('q')
+            if os.path.exists(self.ids_path):
+                with open(self.ids_path, 'rb') as f:
+                    data = f.read()
+                # Недописанная при сбое последняя пара отбрасывается
+                pairs.frombytes(data[:len(data) - len(data) % (2 * pairs.itemsize)])
+            for id, key in zip(pairs[::2], pairs[1::2]):
+                if key:
+                    ids[id] = key - 1
+                else:
+                    ids.pop(id, None)
+            self._ids_stored = len(pairs) // 2
+            if max(ids, default=0) < self.max_id():
+                # Карта отстала от манифеста (например, удалена) - строим заново по файлам
+                ids = {}
+                for key in self.partitions:
+                    for record in self._read(key):
+                        ids[record.id] = key
+                self._changed_ids = None
+            self._ids = ids
+        return self._ids
+
+    def _set_id(self, ids: Dict[int, int], id: int, key: Optional[int]) -> None:
+        if key is None:
+            ids.pop(id, None)
+        else:
+            ids[id] = key
+        if self._changed_ids is not None:
+            self._changed_ids.add(id)
+
+    def _partition_of(self, id: int) -> Optional[int]:
+        return self._get_ids().get(id)
+
+    def _save(self) -> None:
+        """
+        Сохраняет манифест (атомарно) и изменения карты id -> месяц; вызывается после записи файлов месяцев.
+        """
+        if self._appends is not None:
+            return
+        manifest = {'partitions': {
+            _month_name(key): dict(entry, min_date=entry['min_date'].isoformat(), max_date=entry['max_date'].isoformat())
+            for key, entry in sorted(self.partitions.items())}}
+        with _atomic_file(self.manifest_path, 'w', encoding='utf8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        if self._ids is None:
+            return
+        ids = self._ids
+        if self._changed_ids is None or not os.path.exists(self.ids_path) \
+                or self._ids_stored + len(self._changed_ids) > 2 * len(ids):
+            pairs = array('q')
+            for id, key in ids.items():
+                pairs.extend((id, key + 1))
+            with _atomic_file(self.ids_path, 'wb') as f:
+                pairs.tofile(f)
+            self._ids_stored = len(ids)
+        elif self._changed_ids:
+            pairs = array('q')
+            for id in sorted(self._changed_ids):
+                pairs.extend((id, ids[id] + 1 if id in ids else 0))
+            with open(self.ids_path, 'ab') as f:
+                pairs.tofile(f)
+            self._ids_stored += len(self._changed_ids)
+        self._changed_ids = set()
+
+    def rebuild(self) -> None:
+        """
+        Пересчитывает манифест и карту id по файлам месяцев (YYYY-MM.txt, прочие файлы пропускаются).
+        """
+        self.partitions = {}
+        for name in sorted(os.listdir(self.path)):
+            key = _month_of(name)
+            if key is None:
+                continue
+            records = list(self._read(key))
+            if records:
+                self.partitions[key] = _partition_summary(records)
+                self._stamp(key)
+        self._ids = None
+        if os.path.exists(self.ids_path):
+            os.remove(self.ids_path)
+        self._get_ids()
+        self._save()
+
+    def begin(self) -> None:
+        self._appends = {}
+
+    def commit(self) -> None:
+        self._flush()
+        self._appends = None
+        self._save()
+
+    def _flush(self) -> None:
+        """
+        Дописывает накопленные в пакетном режиме записи, по одному открытию файла на месяц.
+        """
+        if not self._appends:
+            return
+        appends, self._appends = self._appends, {}
+        ids = self._get_ids()
+        for key, records in appends.items():
+            with open(self._file(key), 'a', encoding='utf8') as f:
+                f.writelines(map(format_record, records))
+            summary = _partition_summary(records)
+            entry = self.partitions.get(key)
+            if entry is not None:
+                summary = {'count': entry['count'] + summary['count'],
+                           'min_date': min(entry['min_date'], summary['min_date']),
+                           'max_date': max(entry['max_date'], summary['max_date']),
+                           'min_id': min(entry['min_id'], summary['min_id']),
+                           'max_id': max(entry['max_id'], summary['max_id']),
+                           'income': entry['income'] + summary['income'],
+                           'expense': entry['expense'] + summary['expense']}
+            self.partitions[key] = summary
+            self._stamp(key)
+            for record in records:
+                self._set_id(ids, record.id, key)
+
+    def iter_records(self, trusted: bool = False) -> Iterator[Record]:
+        self._flush()
+        return heapq.merge(*(self._read(key, trusted) for key in sorted(self.partitions)), key=attrgetter('id'))
+
+    def append(self, record: Record) -> None:
+        self.append_many((record,))
+
+    def append_many(self, records: Iterable[Record]) -> None:
+        batch = self._appends is not None
+        if not batch:
+            self._appends = {}
+        for record in records:
+            self._appends.setdefault(_month_key(record.date), []).append(record)
+        if not batch:
+            self._flush()
+            self._appends = None
+            self._save()
+
+    def update(self, record: Record) -> None:
+        self._flush()
+        old = self._partition_of(record.id)
+        if old is None:
+            self.append(record)
+            return
+        key = _month_key(record.date)
+        records = [r for r in self._read(old) if r.id != record.id]
+        if key != old:
+            self._write(old, records)
+            records = list(self._read(key)) if key in self.partitions else []
+        ids = [r.id for r in records]
+        records.insert(bisect_left(ids, record.id), record)
+        self._write(key, records)
+        self._set_id(self._get_ids(), record.id, key)
+        self._save()
+
+    def rewrite(self, records: Iterable[Record]) -> None:
+        if self._appends is not None:
+            self._appends = {}
+        months: Dict[int, List[Record]] = {}
+        for record in records:
+            months.setdefault(_month_key(record.date), []).append(record)
+        for key in set(self.partitions) - set(months):
+            self._write(key, [])
+        ids: Dict[int, int] = {}
+        for key, month in months.items():
+            month.sort(key=attrgetter('id'))
+            self._write(key, month)
+            for record in month:
+                self._set_id(ids, record.id, key)
+        self._ids, self._changed_ids = ids, None
+        self._save()
+
+    def get(self, id: int) -> Optional[Record]:
+        self._flush()
+        key = self._partition_of(id)
+        if key is None:
+            return None
+        for record in self._read(key):
+            if record.id == id:
+                return record
+        return None
+
+    def max_id(self) -> int:
+        pending = (records[-1].id for records in (self._appends or {}).values())
+        return max(max((entry['max_id'] for entry in self.partitions.values()), default=0), max(pending, default=0))
+
+    def count(self) -> int:
+        self._flush()
+        return sum(entry['count'] for entry in self.partitions.values())
+
+    def find(self, criteria: dict, ranges: dict) -> Iterator[Record]:
+        """
+        Поиск по условиям на равенство criteria и диапазонам ranges ({поле: (от, до)}), см. iter_find_records.
+        Читаются только месяцы, чьи границы дат, id и суммы по категориям не исключают совпадений.
+        """
+        self._flush()
+        keys = sorted(self.partitions)
+        if 'id' in criteria:
+            key = self._partition_of(criteria['id']) if isinstance(criteria['id'], int) else None
+            keys = [] if key is None else [key]
+        low, high = ranges.get('date', (None, None))
+        category = criteria.get('category')
+        keys = [key for key in keys
+                if (low is None or self.partitions[key]['max_date'] >= low)
+                and (high is None or self.partitions[key]['min_date'] <= high)
+                and (category is None or self.partitions[key]['income' if category == "Доход" else 'expense'] > 0)]
+        for record in heapq.merge(*map(self._read, keys), key=attrgetter('id')):
+            for key, value in criteria.items():
+                if getattr(record, key) != value:
+                    break
+            else:
+                for key, (low, high) in ranges.items():
+                    value = getattr(record, key)
+                    if (low is not None and value < low) or (high is not None and value > high):
+                        break
+                else:
+                    yield record
+
+    def totals(self) -> Tuple[int, int, int]:
+        dox = sum(entry['income'] for entry in self.partitions.values())
+        ras = sum(entry['expense'] for entry in self.partitions.values())
+        return dox, ras, dox - ras
+
+
+def _query_matches(record: Record, criteria: dict, ranges: dict, query: Optional['TextQuery']) -> bool:
+    """
+    Подходит ли запись под нормализованный запрос (см. PersonalTracker._normalize_query) и текстовый запрос query.
+    """
+    for key, value in criteria.items():
+        if getattr(record, key) != value:
+            return False
+    for key, (low, high) in ranges.items():
+        value = getattr(record, key)
+        if (low is not None and value < low) or (high is not None and value > high):
+            return False
+    return query is None or query.matches(record.description)
+
+
+def _find_affected(criteria: dict, ranges: dict, query: Optional['TextQuery'], old: Optional[Record],
+                   new: Record) -> bool:
+    # Результат поиска меняется, если под запрос подходила прежняя версия записи или подходит новая
+    return (old is not None and _query_matches(old, criteria, ranges, query)) or _query_matches(new, criteria, ranges, query)
+
+
+_BALANCE_KEY = ('balance',)
+
+
+def _balance_affected(old: Optional[Record], new: Record) -> bool:
+    # Правка только даты или описания баланс не меняет
+    return old is None or old.category != new.category or old.amount != new.amount
+
+
+class QueryCache:
+    """
+    - Ограниченный LRU-кеш результатов запросов PersonalTracker (find_records и balance) по нормализованным
+      параметрам: при переполнении вытесняется давно не запрошенный результат.
+    - С каждым результатом хранится условие affected(прежняя запись или None, новая запись): при добавлении
+      и правке записи (invalidate) удаляются только результаты, которые это изменение может затронуть.
+    - Результаты хранятся неизменяемыми (кортежи FrozenRecord, а не живые записи трекера), поэтому вызывающий
+      не может испортить их для следующих запросов.
+    - Считает попадания, промахи, вытеснения и сброшенные результаты (stats), при включенных METRICS -
+      еще и в счетчиках query_cache_*.
+    """
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+        # Версия данных хранилища (Storage.version), для которой записаны результаты без загрузки записей
+        self.version: Optional[tuple] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple) -> Optional[tuple]:
+        """
+        Результат по ключу (и отметка о недавнем использовании) или None, если его нет.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            if METRICS.enabled:
+                METRICS.inc('query_cache_misses')
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        if METRICS.enabled:
+            METRICS.inc('query_cache_hits')
+        return entry[0]
+
+    def put(self, key: tuple, value: tuple, affected) -> None:
+        self._entries[key] = (value, affected)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+            if METRICS.enabled:
+                METRICS.inc('query_cache_evictions')
+
+    def invalidate(self, old: Optional[Record], new: Record) -> None:
+        """
+        Удаляет результаты, которые может изменить замена записи old на new (old=None - новая запись).
+        """
+        stale = [key for key, (_, affected) in self._entries.items() if affected(old, new)]
+        for key in stale:
+            del self._entries[key]
+        self.invalidations += len(stale)
+
+    def clear(self) -> None:
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'invalidations': self.invalidations}
+
+
+def _exclusive(method):
+    """
+    Изменение хранилища методом PersonalTracker под исключительной блокировкой (см. PersonalTracker._write_access).
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._write_access():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class PersonalTracker:
+    def __init__(self, records: Optional[Union[List[Record], RecordStore]] = None,
+                 storage: Optional[Storage] = None, cache_size: int = 0)->None:
+        """
+        - records - записи в памяти: по умолчанию список Record, либо RecordStore.
+        - storage - где записи хранятся: по умолчанию TextStorage (файл "data.txt").
+        - cache_size - сколько результатов find_records и balance хранить в кеше запросов (QueryCache);
+          0 - кеш выключен.
+        """
+        self.records = [] if records is None else records
+        self.storage = TextStorage() if storage is None else storage
+        self.query_cache: Optional[QueryCache] = QueryCache(cache_size) if cache_size else None
+        self._index: Optional[RecordIndex] = None
+        self._totals: Optional[LedgerTotals] = None
+        self._text_index: Optional[TextIndex] = None
+        # Суммы прочитаны из файла без загрузки записей (load_totals)
+        self._totals_only = False
+        # Записи в памяти совпадают с хранилищем (после загрузки или сохранения): только тогда
+        # суммы можно сохранять в файл рядом с данными
+        self._synced = False
+        self._batching = False
+        # Версия данных хранилища (Storage.version), с которой совпадают записи или суммы в памяти;
+        # None - не отслеживается (записи переданы явно)
+        self._version: Optional[tuple] = None
+        # Исключительная блокировка хранилища уже взята этим трекером
+        self._writing = False
+        # Переданные явно записи считаются загруженными
+        self._loaded = records is not None
+        # Значение _record_mutations, для которого построены индексы, суммы и кеш запросов
+        self._mutations = _record_mutations
+
+    @property
+    def _lazy(self) -> bool:
+        """
+        Записи не загружены в память, а хранилище само отвечает на запросы (например, SQLite).
+        """
+        return self.storage.queryable and not self._loaded
+
+    def _check_mutations(self) -> None:
+        """
+        - Поля записей могли быть изменены присваиванием в обход методов трекера (records[i].category = ...):
+          тогда индексы, суммы и кеш запросов, построенные по прежним значениям, сбрасываются и строятся заново.
+        - Записи в памяти после этого уже могут не совпадать с хранилищем, поэтому суммы и индекс описаний
+          не сохраняются в файлы рядом с данными до сохранения или загрузки записей.
+        - Счетчик правок общий для всех записей процесса: правка записи другого трекера тоже приводит к сбросу.
+        """
+        if self._mutations == _record_mutations:
+            return
+        self._mutations = _record_mutations
+        if self._lazy:
+            return
+        self._index = self._text_index = None
+        if not self._totals_only:
+            self._totals = None
+        self._synced = False
+        if self.query_cache is not None:
+            self.query_cache.clear()
+
+    def _get_index(self, writable: bool = False) -> RecordIndex:
+        """
+        - Возвращает индексы, строя их при первом обращении; дальше они поддерживаются
+          в add_record и edit_record_in_file.
+        - Для неизмененного снимка - SnapshotIndex по перестановкам из файла (без копирования колонок);
+          writable=True (индексы будут меняться) заменяет его обычным RecordIndex.
+        """
+        self._check_mutations()
+        index = self._index
+        if index is None or index.count != len(self.records) or (writable and isinstance(index, SnapshotIndex)):
+            records = self.records
+            if not writable and isinstance(records, RecordStore) and records.orders is not None:
+                self._index = SnapshotIndex(records)
+            else:
+                self._index = RecordIndex(records)
+        return self._index
+
+    def _get_totals(self) -> LedgerTotals:
+        """
+        Возвращает материализованные суммы (LedgerTotals), строя их по записям при первом обращении;
+        дальше они поддерживаются в add_record, add_record_and_save_file и edit_record_in_file.
+        """
+        self._check_mutations()
+        if self._totals is None or (self._totals.count != len(self.records) and not self._totals_only):
+            self._totals = LedgerTotals.from_rows(self._aggregate_columns(None))
+            self._save_totals()
+        return self._totals
 
-    def __setattr__(self, key, value):
-        if key=='id' and  not isinstance(value, int):
-            raise ValueError("id неверного типа данных")
-        elif  key=='date' and not isinstance(value, date):
-            raise ValueError("date неверного типа данных")
-        elif  key=='category' and value not in ('Доход','Расход'):
-            raise ValueError("category неверного типа данных",value, type(value))
-        elif  key=='amount' and not isinstance(value, (int,float)) and value <=0:
-            raise ValueError("amount неверного типа данных")
-        elif  key=='description' and not isinstance(value, str):
-            raise ValueError("description неверного типа данных")
-        return super().__setattr__(key, value)
+    def _get_text_index(self) -> TextIndex:
+        """
+        Возвращает полнотекстовый индекс описаний: при первом обращении читает его из файла рядом с данными
+        (если он записан для текущего состояния данных) или строит по записям и сохраняет;
+        дальше индекс поддерживается при добавлении и правке.
+        """
+        self._check_mutations()
+        if self._text_index is None or self._text_index.count != len(self.records):
+            path = self.storage.text_index_path
+            index = None
+            if path is not None and self._synced:
+                with self.storage.reading():
+                    if self._current():
+                        index = TextIndex.load(path, self.storage)
+            if index is None or index.count != len(self.records):
+                index = TextIndex(self.records)
+                self._text_index = index
+                self._save_text_index()
+            self._text_index = index
+        return self._text_index
 
-    def get_info(self)->None:
-        print(f"Дата: {self.date}")
-        print(f"Категория: {self.category}")
-        print(f"Сумма: {self.amount}")
-        print(f"Описание: {self.description}\n")
+    def _save_text_index(self) -> None:
+        """
+        Сохраняет полнотекстовый индекс целиком (O(n)), поэтому только после построения и полной перезаписи данных.
+        """
+        path = self.storage.text_index_path
+        if path is None or self._text_index is None or not self._synced or self._batching or self.storage.read_only:
+            return
+        try:
+            with self.storage.reading():
+                if self._current():
+                    self._text_index.save(path, self.storage.stamp())
+        except OSError:
+            # Индекс - только ускорение: при следующем запуске он будет построен заново
+            pass
 
+    def _save_totals(self) -> None:
+        """
+        Сохраняет суммы рядом с данными (для data.txt - data_totals.bin), если записи в памяти совпадают с хранилищем
+        или суммы прочитаны из файла и поддерживаются без загрузки записей.
+        """
+        path = self.storage.totals_path
+        if path is None or self._totals is None or not (self._synced or self._totals_only) or self._batching \
+                or self.storage.read_only:
+            return
+        try:
+            with self.storage.reading():
+                if self._current():
+                    self._totals.save(path, self.storage.stamp())
+        except OSError:
+            # Файл сумм - только ускорение: при следующем запуске они будут пересчитаны по записям
+            pass
 
+    def _current(self) -> bool:
+        """
+        - Соответствуют ли данные в памяти хранилищу: с загрузки (или своего последнего изменения) их не изменил
+          другой процесс, либо идет свое изменение под блокировкой записи.
+        - Вызывается под блокировкой хранилища: только тогда суммы и индекс можно сохранить (или прочитать)
+          с отпечатком stamp() текущего состояния данных, иначе отпечаток подошел бы к чужим данным.
+        """
+        return self._writing or self.storage.version() == self._version
 
+    @_instrumented('load_totals')
+    def load_totals(self) -> bool:
+        """
+        - Читает сохраненные суммы без загрузки записей, если они соответствуют текущему состоянию данных.
+        - После этого balance и report без keyword отвечают по суммам; для остальных операций нужна загрузка записей.
+        - Возвращает True, если суммы прочитаны.
+        """
+        path = self.storage.totals_path
+        with self.storage.reading():
+            totals = None if path is None else LedgerTotals.load(path, self.storage)
+            version = self.storage.version()
+        if totals is None:
+            return False
+        self._totals, self._totals_only = totals, True
+        self._version = version
+        return True
 
-class PersonalTracker:
-    def __init__(self)->None:
-        self.records=[]
+    def _lazy_totals(self) -> Optional[LedgerTotals]:
+        """
+        Суммы, которые нужно поддерживать при изменении: при загруженных записях - построенные по ним,
+        без загрузки - прочитанные из файла (читаются перед изменением, пока файл соответствует данным).
+        """
+        if not self._lazy:
+            return self._totals
+        if self._totals is None:
+            self.load_totals()
+        return self._totals if self._totals_only else None
 
     def add_record(self, record: Record)->None:
         """
         Добавляет новую запись в список records.
         """
+        if self._lazy:
+            self.load_records_from_file(trusted=True)
+        self._loaded = True
+        self._synced = False
+        self._append_record(record)
+
+    @contextmanager
+    def batch(self) -> Iterator['PersonalTracker']:
+        """
+        Пакет изменений: add_record_and_save_file и edit_record_in_file внутри блока with
+        сохраняются в хранилище один раз при выходе из блока. Блокировка записи держится весь пакет.
+        """
+        with self._write_access():
+            self.storage.begin()
+            self._batching = True
+            try:
+                yield self
+            finally:
+                self._batching = False
+                self.storage.commit()
+                self._save_totals()
+
+    @contextmanager
+    def _write_access(self) -> Iterator[None]:
+        """
+        - Исключительная блокировка хранилища на время изменения (вложенные вызовы ее не берут повторно).
+        - Перед изменением подтягиваются изменения других процессов (_sync), после - запоминается версия данных,
+          так что id новых записей и правки считаются от актуального состояния, а не от загруженного.
+        """
+        if self._writing:
+            yield
+            return
+        with self.storage.writing():
+            self._writing = True
+            try:
+                self._sync()
+                self._cache()
+                yield
+            finally:
+                self._writing = False
+                if self._version is not None:
+                    self._version = self.storage.version()
+                if self.query_cache is not None and self._lazy:
+                    # Свои изменения кеш уже учел (invalidate), чужих под блокировкой не было
+                    self.query_cache.version = self.storage.version()
+
+    def _cache(self) -> Optional[QueryCache]:
+        """
+        Кеш запросов, если он включен. Без загруженных записей данные в хранилище могут изменить другие
+        процессы, поэтому при изменении версии данных кеш сбрасывается, а если хранилище версий
+        не отслеживает (version() - None), кеш не используется.
+        """
+        self._check_mutations()
+        cache = self.query_cache
+        if cache is not None and self._lazy:
+            version = self.storage.version()
+            if version is None:
+                return None
+            if version != cache.version:
+                cache.clear()
+                cache.version = version
+        return cache
+
+    def _sync(self) -> None:
+        """
+        Применяет изменения, сделанные в хранилище другими процессами после загрузки: дописанные записи
+        и правки из журнала - к записям в памяти; если данные с тех пор перезаписаны целиком, записи
+        загружаются заново. Без загруженных записей сбрасываются только прочитанные из файла суммы.
+        """
+        if self._version is None or self.storage.version() == self._version:
+            return
+        if not self._loaded:
+            self._totals, self._totals_only = None, False
+        else:
+            changes = self.storage.changes_since(self._version)
+            if changes is None:
+                self.records = RecordStore() if isinstance(self.records, RecordStore) else []
+                self._index = None
+                self.load_records_from_file(trusted=True)
+                return
+            appended, updates = changes
+            for record in appended:
+                self._append_record(record)
+            for record in updates:
+                row = self._get_index().by_id.get(record.id)
+                if row is None:
+                    self._append_record(record)
+                else:
+                    self._replace_record(row, record)
+        self._version = self.storage.version()
+
+    def _append_record(self, record: Record) -> None:
+        if self.query_cache is not None:
+            self.query_cache.invalidate(None, record)
+        if isinstance(self._index, SnapshotIndex):
+            # Индексы снимка не изменяются: при следующем запросе будет построен RecordIndex
+            self._index = None
         self.records.append(record)
+        if self._index is not None:
+            self._index.add(len(self.records) - 1, record)
+        if self._totals is not None:
+            self._totals.add(record)
+        if self._text_index is not None:
+            self._text_index.add(len(self.records) - 1, record)
 
+    @_instrumented('save')
     def save_records_to_file(self)->Optional[bool]:
         """
-        - Сохраняет все записи из списка records в файл "data.txt".
-        - Перезаписывает временный файл "data_temp.txt" с обновленными данными.
-        - Возвращает True, если операция выполнена успешно, иначе обрабатывает исключение FileExistsError.
-        """
-        try:
-            flag = False
-            with open('data_temp.txt', 'w', encoding='utf8') as f:
-                for obj in self.records:
-                    id,date,category,amount,description = obj.id, obj.date, obj.category, obj.amount, obj.description
-                    f.write(f"id: {id}\n")
-                    f.write(f"Дата: {str(date)}\n")
-                    f.write(f"Категория: {category}\n")
-                    f.write(f"Сумма: {amount}\n")
-                    f.write(f"Описание: {description}\n")
-                    f.write("\n")
-            flag=True
-            if flag:
-                os.remove('data.txt')
-                os.rename('data_temp.txt', 'data.txt')
+        - Сохраняет все записи из списка records в хранилище (по умолчанию файл "data.txt").
+        - Файл переписывается через временный файл с атомарной подменой,
+          после этого журнал изменений уже учтен в "data.txt" и удаляется.
+        - Если после загрузки данные изменил другой процесс, они не перезаписываются (StaleLedgerError):
+          выводится сообщение и возвращается None.
+        - Возвращает True, если операция выполнена успешно, иначе выводит ошибку работы с файлом.
+        """
+        if self._lazy:
             return True
-        except FileExistsError as e:
+        try:
+            with self.storage.writing():
+                if self._version is not None and self.storage.version() != self._version:
+                    raise StaleLedgerError("данные изменены другим процессом после загрузки, загрузите их заново")
+                self.storage.rewrite(self.records)
+                self._version = self.storage.version()
+        except StaleLedgerError as e:
+            print("Записи не сохранены:", str(e))
+            return None
+        except (OSError, sqlite3.Error) as e:
+            print("Ошибка с открытием файла:",str(e))
+            return None
+        self._synced = True
+        self._save_totals()
+        self._save_text_index()
+        return True
+
+    @_instrumented('compact')
+    @_exclusive
+    def compact(self) -> Optional[bool]:
+        """
+        Сворачивает журнал изменений в "data.txt". Если журнала нет, ничего не делает.
+        """
+        self._lazy_totals()
+        try:
+            # Без загруженных записей хранилище собирает актуальное состояние само
+            self.storage.compact(None if self._lazy else self.records)
+        except (OSError, sqlite3.Error) as e:
             print("Ошибка с открытием файла:",str(e))
+            return None
+        self._save_totals()
+        self._save_text_index()
+        return True
 
-    def load_records_from_file(self)->Optional[str]:
+    def iter_records_from_file(self, path: str = DATA_FILE, trusted: bool = False) -> Iterator[Record]:
         """
-        - Загружает записи из файла "data.txt" и добавляет их в список records.
-        - Обрабатывает исключение FileExistsError и возвращает сообщение об ошибке.
+        Лениво читает записи из файла path, не загружая их в список records.
         """
+        with open(path, 'r', encoding='utf8') as file:
+            yield from iter_records(file, trusted)
+
+    @_instrumented('load')
+    def load_records_from_file(self, trusted: bool = False)->Optional[str]:
+        """
+        - Загружает записи из хранилища (по умолчанию файл "data.txt") и добавляет их в список records.
+        - Затем применяет поверх них журнал изменений "data_journal.txt", если он есть:
+          запись с известным id заменяет прежнюю, с новым id - добавляется.
+        - При trusted=True пропускает проверку полей (для файлов, записанных самим приложением).
+        - Обрабатывает ошибки открытия файла и возвращает сообщение об ошибке.
+        """
+        synced = not self.records
+        count = len(self.records)
+        self._totals, self._totals_only = None, False
+        self._text_index = None
+        if self.query_cache is not None:
+            self.query_cache.clear()
         try:
-            with open("data.txt", 'r', encoding='utf8' ) as file:
-                cur = {}
-                for line in file:
-                    line = line.strip()
-                    if line:
-                        key, value = line.split(':')
-                        key = key.strip().lower()
-                        value = value.strip()
-                        cur[key]=value
+            with self.storage.reading():
+                self.records.extend(self.storage.iter_records(trusted))
+                self._index = None
+                count = len(self.records) - count
+                for record in self.storage.iter_updates(trusted):
+                    count += 1
+                    row = self._get_index().by_id.get(record.id)
+                    if row is None:
+                        self._append_record(record)
                     else:
-                        if cur:
-                            id = int(cur['id'])
-                            date = datetime.strptime(cur['дата'],"%Y-%m-%d").date()
-                            category = cur['категория']
-                            amount = int(cur['сумма'])
-                            description = cur['описание']
-                            self.add_record(Record(id,date,category,amount,description))
-                            cur={}
-                        else:
-                            break
-        except FileExistsError as e:
+                        self._replace_record(row, record)
+                self._synced = synced
+                if synced:
+                    self._version = self.storage.version()
+                if synced and self.storage.totals_path is not None:
+                    # Сохраненные суммы подхватываются, чтобы дальше поддерживать их, а не пересчитывать
+                    totals = LedgerTotals.load(self.storage.totals_path, self.storage)
+                    if totals is not None and totals.count == len(self.records):
+                        self._totals = totals
+                if METRICS.enabled:
+                    METRICS.inc('records_parsed', count)
+        except (OSError, sqlite3.Error) as e:
+            return f"Ошибка с открытием файла - {str(e)}"
+        finally:
+            self._loaded = True
+
+    def save_snapshot(self, path: str) -> Optional[bool]:
+        """
+        - Сохраняет все записи в бинарный снимок path: колонки фиксированной ширины и отдельная куча описаний.
+        - Файл пишется во временный и атомарно подменяется.
+        """
+        store = self.records if isinstance(self.records, RecordStore) else RecordStore(self.records)
+        try:
+            with _atomic_file(path, 'wb') as f:
+                store.write_snapshot(f)
+            return True
+        except OSError as e:
+            print("Ошибка с открытием файла:",str(e))
+
+    @_instrumented('load_snapshot')
+    def load_snapshot(self, path: str) -> Optional[str]:
+        """
+        - Заменяет records записями из бинарного снимка path, отображая файл в память через mmap.
+        - Колонки не копируются, поэтому старт почти мгновенный, а balance и find_records
+          читают данные прямо из отображения: поиск по полям идет по перестановкам из снимка (SnapshotIndex),
+          копии появляются только при изменении записей и полнотекстовом поиске (text, TextIndex).
+        - Возвращает сообщение об ошибке, если файл не открылся или не является снимком.
+        """
+        try:
+            with open(path, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.records = RecordStore.from_buffer(buffer)
+        except (OSError, ValueError) as e:
             return f"Ошибка с открытием файла - {str(e)}"
+        self._index = None
+        self._totals, self._totals_only, self._synced = None, False, False
+        self._text_index = None
+        if self.query_cache is not None:
+            self.query_cache.clear()
+        self._loaded = True
 
+    def _replace_record(self, row: int, record: Record) -> None:
+        if self.query_cache is not None:
+            self.query_cache.invalidate(self.records[row], record)
+        index = self._get_index(writable=True)
+        index.remove(row, self.records[row])
+        if self._totals is not None:
+            self._totals.remove(self.records[row])
+            self._totals.add(record)
+        if self._text_index is not None:
+            self._text_index.remove(row, self.records[row])
+            self._text_index.add(row, record)
+        if isinstance(self.records, RecordStore):
+            self.records.set_values(row, record)
+        else:
+            self.records[row] = record
+        index.add(row, record)
+
+    def _store_update(self, record: Record) -> Optional[bool]:
+        """
+        Сохраняет правку записи в хранилище (для data.txt - дозапись в журнал за O(1)).
+        Журнал сворачивается, когда в нем изменений больше, чем max(JOURNAL_LIMIT, числа записей).
+        """
+        try:
+            self.storage.update(record)
+        except (OSError, sqlite3.Error) as e:
+            print("Ошибка с открытием файла:",str(e))
+            return None
+        if self.storage.pending > max(JOURNAL_LIMIT, len(self.records)):
+            return self.compact()
+        self._save_totals()
+        return True
+
+    @_instrumented('append')
+    @_exclusive
     def add_record_and_save_file(self, date:date, category:str, amount:int, description:str)->Optional[bool]:
         """
-        Принимает дату, категорию, сумму и описание, создает новую запись и сохраняет ее в файл "data.txt".
+        Принимает дату, категорию, сумму и описание, создает новую запись и дописывает ее в хранилище
+        (в конец файла "data.txt").
         Возвращает True, если операция выполнена успешно.
         """
-        last_id = self.records[-1].id
+        totals = self._lazy_totals()
+        if self._lazy:
+            last_id = self.storage.max_id()
+        else:
+            last_id = self.records[-1].id if self.records else 0
         id = last_id + 1
-        self.add_record(Record(id, date, category, amount, description))
-        try:
-            with open("data.txt", 'a', encoding='utf8') as file:
-                file.write(f"id: {id}\n")
-                file.write(f"Дата: {date}\n")
-                file.write(f"Категория: {category}\n")
-                file.write(f"Сумма: {amount}\n")
-                file.write(f"Описание: {description}\n")
-                file.write("\n")
-                file.seek(0)
-            return True
-        except FileExistsError as e:
+        record = Record(id, date, category, amount, description)
+        if not self._lazy:
+            self._append_record(record)
+        else:
+            if totals is not None:
+                totals.add(record)
+            if self.query_cache is not None:
+                self.query_cache.invalidate(None, record)
+        try:
+            self.storage.append(record)
+        except (OSError, sqlite3.Error) as e:
             print(str(e))
+            return None
+        self._save_totals()
+        return True
+
+    @_instrumented('import')
+    def import_records(self, path: str, fmt: Optional[str] = None, delimiter: str = ',',
+                       workers: Optional[int] = None, skip_invalid: bool = False,
+                       chunk_size: int = IMPORT_CHUNK_SIZE) -> Tuple[int, List[str]]:
+        """
+        - Импортирует записи из выписки CSV/JSONL (см. parse_import_file).
+        - Новым записям подряд выдаются id после последнего, все они дописываются в хранилище одной записью.
+        - Если есть ошибочные строки, ничего не импортируется, пока не задан skip_invalid.
+        - Выписка разбирается и проверяется без блокировки хранилища: исключительная блокировка берется
+          только на выдачу id и дописывание, чтобы не задерживать другие процессы на время разбора.
+        - Возвращает (число импортированных записей, список ошибок).
+        """
+        rows, errors = parse_import_file(path, fmt, delimiter, workers, chunk_size)
+        if errors and not skip_invalid:
+            return 0, errors
+        with self._write_access():
+            if self._lazy:
+                last_id = self.storage.max_id()
+            else:
+                last_id = self.records[-1].id if self.records else 0
+            records = list(make_records((id, *row) for id, row in enumerate(rows, last_id + 1)))
+            self.storage.append_many(records)
+            if self.query_cache is not None:
+                # Массовое добавление затрагивает почти любые запросы
+                self.query_cache.clear()
+            if not self._lazy:
+                if self._index is None and self._totals is None and self._text_index is None:
+                    self.records.extend(records)
+                else:
+                    for record in records:
+                        self._append_record(record)
+                self._save_totals()
+        return len(records), errors
 
+    @_instrumented('edit')
+    @_exclusive
     def edit_record_in_file(self, id:int, date:Optional[date],category:Optional[str],amount:Optional[int],description:Optional[str])->Optional[bool]:
         """
          Редактирует существующую запись по заданному id.
-         Если указаны новые значения для даты, категории, суммы или описания, обновляет их и сохраняет изменения в файл.
+         Если указаны новые значения для даты, категории, суммы или описания, обновляет их
+         и сохраняет новое состояние записи в хранилище (для "data.txt" - в журнал изменений, без перезаписи файла).
          Возвращает True, если операция выполнена успешно.
         """
-        for obj in self.records:
-            if obj.id==id:
-                flag=False
-                if date:
-                    flag=True
-                    obj.date = date
-                if category:
-                    flag = True
-                    obj.category = category
-                if amount:
-                    flag = True
-                    obj.amount = amount
-                if description:
-                    flag = True
-                    obj.description = description
-                if flag:
-                    return self.save_records_to_file()
+        self._check_mutations()
+        totals = self._lazy_totals()
+        obj = self.get_record(id)
+        if obj is None:
+            return None
+        # Прежняя версия записи - для точного сброса кеша запросов
+        old = None if self.query_cache is None else make_record(obj.id, obj.date, obj.category, obj.amount,
+                                                                 obj.description, trusted=True)
+        index = None if self._lazy else self._get_index(writable=True)
+        text_index = None if self._lazy else self._text_index
+        if index is not None:
+            row = index.by_id[id]
+            index.remove(row, obj)
+        if totals is not None:
+            totals.remove(obj)
+        if text_index is not None:
+            text_index.remove(row, obj)
+        try:
+            flag=False
+            if date:
+                flag=True
+                obj.date = date
+            if category:
+                flag = True
+                obj.category = category
+            if amount:
+                flag = True
+                obj.amount = amount
+            if description:
+                flag = True
+                obj.description = description
+        finally:
+            # Свои присваивания учтены в индексах и суммах ниже
+            self._mutations = _record_mutations
+            if index is not None:
+                index.add(row, obj)
+            if totals is not None:
+                totals.add(obj)
+            if text_index is not None:
+                text_index.add(row, obj)
+            if old is not None and flag:
+                self.query_cache.invalidate(old, obj)
+        if flag:
+            return self._store_update(obj)
+        else:
+            return False
+
+    @_instrumented('get')
+    def get_record(self, id: int) -> Optional[Record]:
+        """
+        Возвращает запись по id через хеш-индекс или None, если такой записи нет.
+        """
+        if self._lazy:
+            return self.storage.get(id)
+        row = self._get_index().by_id.get(id)
+        return None if row is None else self.records[row]
+
+    def count_records(self) -> int:
+        """
+        Число записей: без загрузки записей - по хранилищу или по суммам, прочитанным из файла.
+        """
+        if self._lazy:
+            return self.storage.count()
+        if self._totals_only:
+            return self._totals.count
+        return len(self.records)
+
+    @staticmethod
+    def _normalize_query(date_from, date_to, amount_min, amount_max, kwargs: dict) -> Tuple[dict, dict]:
+        """
+        Приводит условия поиска к виду (равенства {поле: значение}, диапазоны {поле: (от, до)}).
+        Пустые значения отбрасываются, равенство по дате или сумме становится диапазоном.
+        """
+        criteria = {key: value for key, value in kwargs.items() if value is not None and value != ''}
+        ranges = {}
+        for key, low, high, kind in (('date', date_from, date_to, date),
+                                     ('amount', amount_min, amount_max, (int, float))):
+            value = criteria.get(key)
+            if isinstance(value, kind):
+                del criteria[key]
+                low = value if low is None else max(low, value)
+                high = value if high is None else min(high, value)
+            if low is not None or high is not None:
+                ranges[key] = (low, high)
+        return criteria, ranges
+
+    @_instrumented('find')
+    def iter_find_records(self, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                          amount_min: Optional[Union[int, float]] = None,
+                          amount_max: Optional[Union[int, float]] = None, text: Optional[str] = None,
+                          **kwargs) -> Iterator[Record]:
+        """
+        - Лениво возвращает записи, удовлетворяющие условиям, в порядке records.
+        - kwargs - условия на равенство полей, пустые значения ('' и None) не участвуют в поиске.
+        - date_from/date_to и amount_min/amount_max - границы диапазонов (включительно).
+        - Из условий по индексированным полям (id, дата, категория, сумма) выбирается самое
+          селективное (O(log n) на оценку), остальные проверяются только на его k кандидатах.
+        - Полный просмотр выполняется, только если ни одно условие не покрыто индексом.
+        - text - полнотекстовый запрос по описанию (см. TextQuery), ищется по инвертированному индексу
+          и участвует в выборе самого селективного условия наравне с остальными.
+        - Если записи не загружены, а хранилище умеет искать само (SQLite), запрос выполняет хранилище.
+        """
+        criteria, ranges = self._normalize_query(date_from, date_to, amount_min, amount_max, kwargs)
+        query = TextQuery(text) if text else None
+        if self._lazy:
+            for record in self.storage.find(criteria, ranges):
+                if query is None or query.matches(record.description):
+                    yield record
+            return
+
+        rows: Optional[Iterable[int]] = None
+        matched = None if query is None else self._get_text_index().search(query)
+        if criteria or ranges or matched is not None:
+            index = self._get_index()
+            rows, driver = matched, None if matched is None else 'text'
+            for key, value in criteria.items():
+                candidates = index.lookup(key, value)
+                if candidates is not None and (rows is None or len(candidates) < len(rows)):
+                    rows, driver = candidates, key
+            for key, (low, high) in ranges.items():
+                if key == 'date':
+                    low, high = (day.toordinal() if day else None for day in (low, high))
+                start, stop = index.range_bounds(key, low, high)
+                if rows is None or stop - start < len(rows):
+                    rows, driver = range(start, stop), key
+            # Кандидаты перебираются в порядке records: списки категорий и группы равных дат (сумм)
+            # уже упорядочены, диапазон сливается из групп лениво; сортируется только множество из TextIndex
+            if driver in ranges:
+                rows = index.rows_in_order(driver, rows.start, rows.stop)
+                del ranges[driver]
+            elif driver == 'text':
+                rows = sorted(rows)
+            elif driver in criteria:
+                del criteria[driver]
+            if matched is not None and driver != 'text':
+                rows = (row for row in rows if row in matched)
+        records = self.records if rows is None else (self.records[row] for row in rows)
+
+        for record in records:
+            for key, value in criteria.items():
+                if getattr(record, key)!=value:
+                    break
+            else:
+                for key, (low, high) in ranges.items():
+                    value = getattr(record, key)
+                    if (low is not None and value < low) or (high is not None and value > high):
+                        break
                 else:
-                    return False
+                    yield record
 
-    def find_records(self, **kwargs)->Optional[List[Record]]:
+    def find_records(self, **kwargs)->Optional[Sequence[Record]]:
         """
-       Поиск записей по заданным параметрам, переданным как ключевые аргументы.
+       Поиск записей по заданным параметрам, переданным как ключевые аргументы
+       (поля записи и границы date_from, date_to, amount_min, amount_max), см. iter_find_records.
        Возвращает список записей, удовлетворяющих условиям поиска.
+       С кешем запросов (cache_size) повторный запрос с теми же условиями не выполняется заново,
+       а результат возвращается кортежем неизменяемых копий записей (FrozenRecord), общим для всех таких запросов:
+       ни кеш, ни записи трекера через него изменить нельзя.
         """
-        results:List[Record] = []
-        print('kwargsssssssssssss',kwargs)
-        for record in self.records:
-            flag = True
-            for key, value in kwargs.items():
-                value = None if value=='' else value
-                if value is not None and getattr(record, key)!=value:
-                    flag=False
-                    break
-            if flag:
-                results.append(record)
-        if results:
-            return results
-        else:
-            return None
+        cache = self._cache()
+        if cache is None:
+            results:List[Record] = list(self.iter_find_records(**kwargs))
+            if results:
+                return results
+            else:
+                return None
+        options = dict(kwargs)
+        text = options.pop('text', None) or None
+        criteria, ranges = self._normalize_query(options.pop('date_from', None), options.pop('date_to', None),
+                                                 options.pop('amount_min', None), options.pop('amount_max', None),
+                                                 options)
+        key = ('find', tuple(sorted(criteria.items())), tuple(sorted(ranges.items())), text)
+        cached = cache.get(key)
+        if cached is None:
+            cached = tuple(map(_freeze, self.iter_find_records(**kwargs)))
+            cache.put(key, cached, functools.partial(_find_affected, criteria, ranges, TextQuery(text) if text else None))
+        return cached or None
 
+    @_instrumented('balance')
     def balance(self)->Tuple[int,int,int]:
         """
          Вычисляет баланс доходов и расходов на основе всех записей.
         """
-        sum_dox:int=0
-        sum_ras:int=0
+        cache = self._cache()
+        if cache is not None:
+            cached = cache.get(_BALANCE_KEY)
+            if cached is not None:
+                return cached
+        if self._lazy and not self._totals_only:
+            result = self.storage.totals()
+        else:
+            # Итоги поддерживаются при добавлении и правке, полный пересчет - только при первом обращении
+            result = self._get_totals().totals()
+        if cache is not None:
+            cache.put(_BALANCE_KEY, result, _balance_affected)
+        return result
 
-        for record in self.records:
-            if record.category=="Доход":
-                sum_dox+=record.amount
-            else:
-                sum_ras+=record.amount
-        sum_pr=sum_dox-sum_ras
-        return sum_dox,sum_ras,sum_pr
+    def balance_as_of(self, day: date) -> Tuple[int, int, int]:
+        """
+        Доходы, расходы и баланс по записям с датой не позже day за O(log n) по материализованным суммам.
+        """
+        return self.report(date_to=day)[()]
+
+    def _aggregate_columns(self, keyword: Optional[str]) -> Iterable[Tuple[int, bool, Union[int, float]]]:
+        """
+        Возвращает тройки (ordinal даты, признак дохода, сумма) по всем записям,
+        при заданном keyword - только по записям, в описании которых оно встречается.
+        """
+        if isinstance(self.records, RecordStore):
+            store = self.records
+            rows = zip(store.ordinals, store.flags, store.amounts)
+            if keyword:
+                rows = compress(rows, store.matches(keyword))
+            return rows
+        records = self.records
+        if keyword:
+            keyword = keyword.lower()
+            records = (r for r in records if keyword in r.description.lower())
+        return ((r.date.toordinal(), r.category == "Доход", r.amount) for r in records)
+
+    @_instrumented('report')
+    def report(self, period: Optional[str] = None, by_category: bool = False, date_from: Optional[date] = None,
+               date_to: Optional[date] = None, keyword: Optional[str] = None) -> Dict[tuple, Tuple[int, int, int]]:
+        """
+        - Считает доходы, расходы и баланс за один проход по записям.
+        - period ('day', 'month', 'year') и by_category задают группировку, ключ отчета - кортеж
+          (период, категория) из выбранных частей; без группировки единственный ключ - ().
+        - date_from/date_to ограничивают период (включительно), keyword - подстрока описания без учета регистра.
+        - Без keyword отчет строится по материализованным суммам по дням (LedgerTotals), без прохода по записям;
+          итог за период без группировки - за O(log n).
+        - Если записи не загружены, а хранилище умеет искать само, читаются только записи периода.
+        - Возвращает словарь ключ -> (доходы, расходы, баланс), упорядоченный по ключу.
+        """
+        if self._lazy and not (self._totals_only and not keyword):
+            # Хранилище отдает только записи периода (для помесячного - только нужные месяцы)
+            ranges = {'date': (date_from, date_to)} if date_from or date_to else {}
+            return PersonalTracker(list(self.storage.find({}, ranges))).report(period, by_category, date_from,
+                                                                             date_to, keyword)
+        if not keyword:
+            # Без фильтра по описанию хватает материализованных сумм по дням
+            totals = self._get_totals()
+            if not period and not by_category:
+                return {(): totals.between(date_from, date_to)}
+            income, expense = totals.days()
+        else:
+            # Сначала суммы по дням: цикл по записям делает минимум работы,
+            # фильтр по датам и свертка в периоды идут уже по дням.
+            income: Dict[int, Union[int, float]] = {}
+            expense: Dict[int, Union[int, float]] = {}
+            income_get, expense_get = income.get, expense.get
+            for ordinal, is_income, amount in self._aggregate_columns(keyword):
+                if is_income:
+                    income[ordinal] = income_get(ordinal, 0) + amount
+                else:
+                    expense[ordinal] = expense_get(ordinal, 0) + amount
+
+        low = date_from.toordinal() if date_from else None
+        high = date_to.toordinal() if date_to else None
+        totals: Dict[tuple, List[Union[int, float]]] = {}
+        for slot, days in ((0, income), (1, expense)):
+            for ordinal, amount in days.items():
+                if (low is not None and ordinal < low) or (high is not None and ordinal > high):
+                    continue
+                key = (_period_key(ordinal, period),) if period else ()
+                if by_category:
+                    key += (CATEGORIES[1 - slot],)
+                acc = totals.setdefault(key, [0, 0])
+                acc[slot] += amount
+        if not totals and not period and not by_category:
+            totals[()] = [0, 0]
+        return {key: (dox, ras, dox - ras) for key, (dox, ras) in sorted(totals.items())}
 
     def get_records(self)->List[Record]:
         """
          Возвращает все имеющиеся записи.
         """
+        if self._lazy:
+            self.load_records_from_file(trusted=True)
         return  self.records
 
     def get_record_by_id(self,id:int)->None:
         """
         Выводит информацию о записи по заданному id.
         """
-        for obj in self.records:
-            if obj.id==id:
-                print(obj.id)
-                print(obj.date)
-                print(obj.category)
-                print(obj.amount)
-                print(obj.description)
+        obj = self.get_record(id)
+        if obj is not None:
+            print(obj.id)
+            print(obj.date)
+            print(obj.category)
+            print(obj.amount)
+            print(obj.description)
+
+
+def _is_ledger(path: str) -> bool:
+    """
+    Похож ли файл на журнал в формате data.txt: первая непустая строка - id записи.
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(256).lstrip()
+    except OSError:
+        return False
+    return _ID_LINE.match(head) is not None
+
+
+def _ledger_report(path: str, options: dict) -> Tuple[tuple, Optional[dict], Optional[str]]:
+    """
+    Отчет (PersonalTracker.report с options) по одному журналу, выполняется в процессе пула Workspace.
+    - Без keyword отчет строится по сохраненным суммам, если они соответствуют данным; иначе записи загружаются.
+    - Журнал только читается: рядом с ним ничего не создается и не сохраняется (TextStorage с read_only).
+    - Возвращает (отпечаток данных, для которого посчитан отчет, отчет, None) или (отпечаток, None, ошибка).
+    """
+    tracker = PersonalTracker(storage=TextStorage(path, read_only=True))
+    try:
+        with tracker.storage.reading():
+            fingerprint = tracker.storage.fingerprint()
+            if options.get('keyword') or not tracker.load_totals():
+                error = tracker.load_records_from_file(trusted=True)
+                if error:
+                    return fingerprint, None, error
+            return fingerprint, tracker.report(**options), None
+    except (OSError, ValueError, TypeError, KeyError) as e:
+        # Файл не в формате журнала
+        return (), None, f"Ошибка с чтением журнала - {str(e)}"
+
+
+class Workspace:
+    """
+    - Набор журналов в формате data.txt (например, по одному на клиента): пути задаются явно или
+      находятся в каталоге (discover).
+    - balance и report отвечают по всем журналам сразу (суммы складываются), reports - по каждому отдельно;
+      интерфейс тот же, что у PersonalTracker, поэтому команды вывода работают с ним без изменений.
+    - Журналы обрабатываются параллельно в общем пуле процессов (ProcessPoolExecutor, создается при первом
+      обращении и переиспользуется до close).
+    - Результаты запоминаются вместе с отпечатком журнала (размер и mtime data.txt и журнала изменений):
+      неизмененные журналы повторно не читаются.
+    """
+
+    def __init__(self, paths: Iterable[str], workers: Optional[int] = None) -> None:
+        self.paths = list(paths)
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # (путь, параметры отчета) -> (отпечаток журнала, отчет)
+        self._cache: Dict[Tuple[str, tuple], Tuple[tuple, dict]] = {}
+
+    @classmethod
+    def discover(cls, root: str, workers: Optional[int] = None) -> 'Workspace':
+        """
+        Все журналы каталога root: файлы *.txt, кроме журналов изменений (*_journal.txt), которые начинаются
+        с записи (строка "id: ..."). Прочие текстовые файлы (заметки, README и т.п.) пропускаются.
+        """
+        paths = [os.path.join(root, name) for name in sorted(os.listdir(root))
+                 if name.endswith('.txt') and not name.endswith('_journal.txt')]
+        return cls([path for path in paths if _is_ledger(path)], workers)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __enter__(self) -> 'Workspace':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def open(self, path: str) -> PersonalTracker:
+        """
+        Трекер одного журнала (записи не загружены).
+        """
+        return PersonalTracker(storage=TextStorage(path))
+
+    def reports(self, period: Optional[str] = None, by_category: bool = False, date_from: Optional[date] = None,
+                date_to: Optional[date] = None, keyword: Optional[str] = None) -> Dict[str, Dict[tuple, tuple]]:
+        """
+        Отчеты PersonalTracker.report по каждому журналу: путь -> отчет. Журналы с ошибками чтения
+        пропускаются с сообщением в sys.stderr (в stdout может идти JSONL или CSV).
+        """
+        options = {'period': period, 'by_category': by_category, 'date_from': date_from, 'date_to': date_to,
+                   'keyword': keyword}
+        query = tuple(options.values())
+        results: Dict[str, Dict[tuple, tuple]] = {}
+        stale = []
+        for path in self.paths:
+            cached = self._cache.get((path, query))
+            if cached is not None and cached[0] == TextStorage(path).fingerprint():
+                results[path] = cached[1]
+                if METRICS.enabled:
+                    METRICS.inc('workspace_cache_hits')
+            else:
+                stale.append(path)
+        if METRICS.enabled:
+            METRICS.inc('workspace_cache_misses', len(stale))
+        if len(stale) > 1 and self.workers != 1:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            # Журналы передаются пачками: на тысячах мелких журналов пересылка по одному дороже их чтения
+            chunksize = max(1, len(stale) // (4 * (self.workers or os.cpu_count() or 1)))
+            computed = self._executor.map(_ledger_report, stale, [options] * len(stale), chunksize=chunksize)
+        else:
+            computed = (_ledger_report(path, options) for path in stale)
+        for path, (fingerprint, report, error) in zip(stale, computed):
+            if error:
+                print(f"{path}: {error}", file=sys.stderr)
+                continue
+            self._cache[path, query] = (fingerprint, report)
+            results[path] = report
+        return {path: results[path] for path in self.paths if path in results}
+
+    def report(self, period: Optional[str] = None, by_category: bool = False, date_from: Optional[date] = None,
+               date_to: Optional[date] = None, keyword: Optional[str] = None) -> Dict[tuple, Tuple[int, int, int]]:
+        """
+        Отчет по всем журналам вместе (см. PersonalTracker.report): суммы по одинаковым ключам складываются.
+        """
+        totals: Dict[tuple, List[Union[int, float]]] = {}
+        for report in self.reports(period, by_category, date_from, date_to, keyword).values():
+            for key, (dox, ras, _) in report.items():
+                acc = totals.setdefault(key, [0, 0])
+                acc[0] += dox
+                acc[1] += ras
+        if not totals and not period and not by_category:
+            totals[()] = [0, 0]
+        return {key: (dox, ras, dox - ras) for key, (dox, ras) in sorted(totals.items())}
+
+    def balance(self) -> Tuple[int, int, int]:
+        """
+        Доходы, расходы и баланс по всем журналам.
+        """
+        return self.report()[()]
+
+
+def record_to_json(record: Record) -> dict:
+    return {'id': record.id, 'date': record.date.isoformat(), 'category': record.category,
+            'amount': record.amount, 'description': record.description}
+
+
+def record_from_json(data: dict) -> Record:
+    return make_record(data['id'], parse_date(data['date']), data['category'], data['amount'], data['description'],
+                       trusted=True)
+
+
+# Параметры запросов демона, которые передаются строками YYYY-MM-DD.
+_JSON_DATES = ('date', 'date_from', 'date_to')
+
+
+def _params_to_json(params: dict) -> dict:
+    return {key: value.isoformat() if isinstance(value, date) else value for key, value in params.items()}
+
+
+def _params_from_json(params: dict) -> dict:
+    return {key: parse_date(value) if key in _JSON_DATES and value else value for key, value in params.items()}
+
+
+# Операции, изменяющие записи (в сервере и пакетном режиме выполняются по одной).
+WRITE_OPERATIONS = ('add', 'edit', 'compact')
+
+
+def execute_operation(tracker: PersonalTracker, op: str, params: dict, read_only: bool = False):
+    """
+    - Выполняет одну операцию над PersonalTracker: get, search, balance, report, add, edit, compact,
+      а также metrics - снимок METRICS (см. Metrics.as_dict).
+    - params - параметры операции в виде JSON (даты строками YYYY-MM-DD).
+    - Значения для add и edit проверяются теми же правилами, что и при ручном вводе.
+    - Возвращает результат в виде, пригодном для JSON; ошибки - ValueError/KeyError/TypeError.
+    """
+    if op in WRITE_OPERATIONS and read_only:
+        raise ValueError("записи открыты только для чтения")
+    params = _params_from_json(params)
+    if op == 'get':
+        record = tracker.get_record(params['id'])
+        return None if record is None else record_to_json(record)
+    if op == 'search':
+        # С кешем запросов повторный поиск берется из кеша
+        records = (tracker.find_records(**params) or ()) if tracker.query_cache is not None \
+            else tracker.iter_find_records(**params)
+        return [record_to_json(record) for record in records]
+    if op == 'balance':
+        return list(tracker.balance())
+    if op == 'report':
+        return [[list(key), list(values)] for key, values in tracker.report(**params).items()]
+    if op == 'add':
+        return tracker.add_record_and_save_file(validate_date(params['date'].isoformat()),
+                                                validate_category(params['category']),
+                                                validate_amount(params['amount']),
+                                                validate_description(params['description']))
+    if op == 'edit':
+        return tracker.edit_record_in_file(
+            params['id'], params.get('date') and validate_date(params['date'].isoformat()),
+            params.get('category') and validate_category(params['category']),
+            params.get('amount') and validate_amount(params['amount']),
+            params.get('description') and validate_description(params['description']))
+    if op == 'compact':
+        return tracker.compact()
+    if op == 'metrics':
+        return METRICS.as_dict()
+    raise ValueError(f"неизвестная операция {op}")
+
+
+class LedgerServer:
+    """
+    - Долгоживущий сервер: загружает PersonalTracker один раз и держит записи и индексы в памяти.
+    - Принимает запросы по Unix-сокету, по одному JSON-объекту на строку: {"op": ..., параметры}.
+      Ответ - {"ok": true, "result": ...} или {"ok": false, "error": "..."}.
+    - Чтения (get, search, balance, report) выполняются сразу; изменения (add, edit, compact)
+      проходят через очередь с единственным обработчиком, поэтому параллельные клиенты безопасны.
+    """
+    def __init__(self, tracker: PersonalTracker, path: str, read_only: bool = False) -> None:
+        self.tracker = tracker
+        self.path = path
+        self.read_only = read_only
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    def serve_forever(self, ready: Optional[threading.Event] = None) -> None:
+        """
+        Запускает сервер в текущем потоке до вызова stop() или прерывания.
+        """
+        try:
+            asyncio.run(self._run(ready))
+        finally:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def stop(self) -> None:
+        """
+        Останавливает сервер (можно вызывать из другого потока).
+        """
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    async def _run(self, ready: Optional[threading.Event]) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        if threading.current_thread() is threading.main_thread():
+            self._loop.add_signal_handler(signal.SIGTERM, self._stopping.set)
+        writer = asyncio.create_task(self._write_loop())
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        if ready is not None:
+            ready.set()
+        async with server:
+            await self._stopping.wait()
+        writer.cancel()
+
+    async def _write_loop(self) -> None:
+        while True:
+            op, params, future = await self._queue.get()
+            try:
+                future.set_result(self.execute(op, params))
+            except Exception as e:
+                future.set_exception(e)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    op = request.pop('op')
+                    with METRICS.timer('request_seconds', op):
+                        if op in WRITE_OPERATIONS:
+                            future = self._loop.create_future()
+                            await self._queue.put((op, request, future))
+                            result = await future
+                        else:
+                            result = self.execute(op, request)
+                    response = {'ok': True, 'result': result}
+                    data = json.dumps(response, ensure_ascii=False)
+                except Exception as e:
+                    # Ошибка одного запроса (в том числе неожиданная, например OSError хранилища)
+                    # не обрывает соединение: клиент получает ее текст
+                    data = json.dumps({'ok': False, 'error': str(e)}, ensure_ascii=False)
+                writer.write(data.encode('utf8') + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def execute(self, op: str, params: dict):
+        """
+        Выполняет один запрос к PersonalTracker (см. execute_operation).
+        """
+        return execute_operation(self.tracker, op, params, self.read_only)
+
+
+class RemoteTracker:
+    """
+    Клиент LedgerServer с теми же методами, что у PersonalTracker: ConsoleInterface
+    работает с ним без изменений, а записи не загружаются при каждом запуске.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = None
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._socket.close()
+            self._file = None
+
+    def _call(self, op: str, **params):
+        if self._file is None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(self.path)
+            self._file = self._socket.makefile('rwb')
+        request = dict(_params_to_json(params), op=op)
+        self._file.write(json.dumps(request, ensure_ascii=False).encode('utf8') + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("сервер закрыл соединение")
+        response = json.loads(line)
+        if not response['ok']:
+            raise ValueError(response['error'])
+        return response['result']
+
+    def get_record(self, id: int) -> Optional[Record]:
+        data = self._call('get', id=id)
+        return None if data is None else record_from_json(data)
+
+    def iter_find_records(self, **kwargs) -> Iterator[Record]:
+        return map(record_from_json, self._call('search', **kwargs))
+
+    def find_records(self, **kwargs) -> Optional[List[Record]]:
+        return list(self.iter_find_records(**kwargs)) or None
+
+    def balance(self) -> Tuple[int, int, int]:
+        return tuple(self._call('balance'))
+
+    def report(self, **kwargs) -> Dict[tuple, Tuple[int, int, int]]:
+        return {tuple(key): tuple(values) for key, values in self._call('report', **kwargs)}
+
+    def add_record_and_save_file(self, date: date, category: str, amount: int, description: str) -> Optional[bool]:
+        return self._call('add', date=date, category=category, amount=amount, description=description)
+
+    def edit_record_in_file(self, id: int, date: Optional[date], category: Optional[str], amount: Optional[int],
+                            description: Optional[str]) -> Optional[bool]:
+        return self._call('edit', id=id, date=date, category=category, amount=amount, description=description)
+
+    def compact(self) -> Optional[bool]:
+        return self._call('compact')
+
+    def metrics(self) -> dict:
+        return self._call('metrics')
+
+
+# Форматы вывода search и balance; json - по одному объекту на строку (JSON Lines).
+OUTPUT_FORMATS = ('text', 'json', 'csv')
+# Форматы экспорта метрик (--metrics, команда metrics)
+METRICS_FORMATS = ('prometheus', 'json')
+_CSV_HEADER = ('id', 'date', 'category', 'amount', 'description')
+
+
+def _argument(validator):
+    """
+    Оборачивает функцию проверки поля для type= в argparse, сохраняя текст ошибки.
+    """
+    def convert(value: str):
+        try:
+            return validator(value)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e)) from None
+    convert.__name__ = validator.__name__
+    return convert
+
 
 class ConsoleInterface:
     def __init__(self, wallet:PersonalTracker)->None:
@@ -211,9 +4251,8 @@ class ConsoleInterface:
         """
         try:
             id = int(id)
-            for obj in self.wallet.records:
-                if obj.id==id:
-                    return id
+            if self.wallet.get_record(id) is not None:
+                return id
             # return id
             print("нет id поддходящего")
         except ValueError as e:
@@ -229,14 +4268,11 @@ class ConsoleInterface:
         if value=='' and flag:
             return None
         try:
-            value=int(value)
-            if value<=0 or value>=10**9:
-                print(f"значение {value} не входит в диапозон от 1 до 999999999 !!!")
-                return False
-            return value
+            return validate_amount(value)
         except ValueError as e:
-            print("Необходимо ввести число !!!")
+            print(str(e))
             return False
+
     def check_date(self, date:Optional[str], flag=False)->Union[date, bool]:
         """
         - Проверяет корректность формата даты и ее соответствие текущей дате.
@@ -245,42 +4281,362 @@ class ConsoleInterface:
         if date=='' and flag:
             return None
         try:
-            add_date = datetime.strptime(date.strip(), "%Y-%m-%d")
-            if add_date.date() > datetime.now().date():
-                print(f"Вводимая дата {add_date} больше текущей")
-                return False
-            return add_date.date()
+            return validate_date(date)
         except ValueError as e:
-            print('Неправильный формат даты: YYYY-MM-DD')
+            print(str(e))
             return False
 
     def start(self):
         """
         - Инициализирует парсер аргументов командной строки с описанием приложения.
-        - Добавляет подпарсеры для различных команд: "add_record", "edit_record", "search", "balance".
-        - Выполняет соответствующую функцию в зависимости от выбранной команды.
+        - Добавляет подпарсеры для различных команд: "add_record", "edit_record", "search", "balance", "compact", "import", "convert", "serve", "metrics".
+        - Загружает записи (из data.txt, журнала --ledger или бинарного снимка --snapshot) и выполняет
+          соответствующую функцию в зависимости от выбранной команды.
+        - balance (report) --all считает итоги сразу по всем журналам каталога --workspace (см. Workspace).
+        - --metrics и --profile включают сбор метрик и профилирование на время выполнения команды.
 
         """
         parser = argparse.ArgumentParser(description="my first cli appp")
+        source = parser.add_mutually_exclusive_group()
+        source.add_argument("--ledger", metavar="FILE", help="файл журнала в формате data.txt вместо data.txt")
+        source.add_argument("--snapshot", help="читать записи из бинарного снимка (только search и balance)")
+        source.add_argument("--sqlite", help="хранить записи в базе SQLite вместо data.txt")
+        source.add_argument("--sharded", metavar="DIR", help="хранить записи помесячно в каталоге DIR вместо data.txt")
+        source.add_argument("--server", metavar="SOCKET", help="выполнять команды на запущенном сервере (serve)")
+        parser.add_argument("--batch", metavar="FILE",
+                            help="выполнить операции из файла JSONL ('-' - из stdin) с одной загрузкой и одним сохранением")
+        parser.add_argument("--metrics", choices=METRICS_FORMATS,
+                            help="собирать метрики и вывести их в stderr по завершении (serve - отдает их командой metrics)")
+        parser.add_argument("--profile", action="store_true",
+                            help="вывести в stderr профиль cProfile и пик памяти tracemalloc")
+        parser.add_argument("--profile-out", metavar="FILE", help="с --profile: сохранить статистику cProfile в FILE")
         subparser = parser.add_subparsers()
 
-        parser_add = subparser.add_parser("add_record", help="добавляет запись")
-        parser_add.set_defaults(func=self.add_record)
+        # Поля записи для неинтерактивного режима: проверяются теми же правилами, что и ввод
+        fields = argparse.ArgumentParser(add_help=False)
+        fields.add_argument("--date", type=_argument(validate_date), help="дата YYYY-MM-DD")
+        fields.add_argument("--category", type=_argument(validate_category), help="Доход или Расход")
+        fields.add_argument("--amount", type=_argument(validate_amount), help="сумма")
+        output = argparse.ArgumentParser(add_help=False)
+        output.add_argument("--format", choices=OUTPUT_FORMATS, help="вывод без запросов ввода: text, json (JSON Lines) или csv")
+        description = argparse.ArgumentParser(add_help=False)
+        description.add_argument("--description", type=_argument(validate_description), help="описание")
+
+        parser_add = subparser.add_parser("add_record", parents=[fields, description], help="добавляет запись")
+        parser_add.set_defaults(func=self.add_record, writes=True, indexed=True)
+
+        parser_edit = subparser.add_parser("edit_record", parents=[fields, description], help="редактирует запись")
+        parser_edit.add_argument("--id", type=int, help="id редактируемой записи")
+        parser_edit.set_defaults(func=self.edit_record, writes=True, indexed=True)
 
-        parser_edit = subparser.add_parser("edit_record",  help="редактирует запись")
-        parser_edit.set_defaults(func=self.edit_record)
+        parser_search = subparser.add_parser("search", parents=[fields, output], help='поиск записей')
+        parser_search.add_argument("--date-from", type=parse_date, help="не раньше даты YYYY-MM-DD")
+        parser_search.add_argument("--date-to", type=parse_date, help="не позже даты YYYY-MM-DD")
+        parser_search.add_argument("--amount-min", type=parse_number, help="сумма не меньше")
+        parser_search.add_argument("--amount-max", type=parse_number, help="сумма не больше")
+        parser_search.add_argument("--text", help='поиск по словам описания: "такси метро", "такси OR метро", "прод*"')
+        parser_search.set_defaults(func=self.search_records, indexed=True)
 
-        parser_search = subparser.add_parser("search", help='поиск записей')
-        parser_search.set_defaults(func=self.search_records)
+        parser_balance = subparser.add_parser("balance", aliases=["report"], parents=[output],
+                                              help="баланс, в том числе по периодам и категориям")
+        parser_balance.add_argument("--period", choices=PERIODS, help="группировка по дню, месяцу или году")
+        parser_balance.add_argument("--by-category", action="store_true", help="группировка по категории")
+        parser_balance.add_argument("--from", dest="date_from", type=parse_date, help="начало периода YYYY-MM-DD")
+        parser_balance.add_argument("--to", dest="date_to", type=parse_date, help="конец периода YYYY-MM-DD")
+        parser_balance.add_argument("--keyword", help="учитывать только записи с этим словом в описании")
+        parser_balance.add_argument("--all", action="store_true", help="итоги по всем журналам каталога --workspace")
+        parser_balance.add_argument("--workspace", metavar="DIR", default=".",
+                                    help="с --all: каталог журналов (*.txt), по умолчанию текущий")
+        parser_balance.add_argument("--workers", type=int, help="с --all: число процессов для чтения журналов")
+        parser_balance.set_defaults(func=self.display_balance, totals=True, indexed=True)
 
-        parser_balance = subparser.add_parser("balance")
-        parser_balance.set_defaults(func=self.display_balance)
+        parser_compact = subparser.add_parser("compact", help="сворачивает журнал изменений в data.txt")
+        parser_compact.set_defaults(func=self.compact, writes=True)
+
+        parser_import = subparser.add_parser("import", help="импортирует записи из выписки CSV или JSONL")
+        parser_import.add_argument("path", help="файл выписки")
+        parser_import.add_argument("--format", choices=("csv", "jsonl"), help="по умолчанию - по расширению файла")
+        parser_import.add_argument("--delimiter", default=",", help="разделитель колонок CSV")
+        parser_import.add_argument("--workers", type=int, help="число процессов для разбора")
+        parser_import.add_argument("--skip-invalid", action="store_true", help="импортировать корректные строки")
+        parser_import.set_defaults(func=self.import_records, writes=True, remote=False)
+
+        parser_convert = subparser.add_parser("convert", help="конвертирует data.txt в снимок, SQLite или помесячный каталог и обратно")
+        parser_convert.add_argument("path", help="файл бинарного снимка, базы SQLite или каталог помесячного хранилища")
+        parser_convert.add_argument("--to", choices=("snapshot", "sqlite", "sharded", "text"), default="snapshot",
+                                    help="snapshot/sqlite/sharded: data.txt -> path, text: path -> data.txt")
+        parser_convert.set_defaults(func=self.convert, load=False, remote=False)
+
+        parser_serve = subparser.add_parser("serve", help="запускает сервер с загруженными записями")
+        parser_serve.add_argument("--socket", default="data.sock", help="путь к Unix-сокету")
+        parser_serve.add_argument("--cache-size", type=int, default=0,
+                                  help="сколько результатов поиска и баланса держать в кеше запросов (0 - без кеша)")
+        parser_serve.set_defaults(func=self.serve, remote=False)
+
+        parser_metrics = subparser.add_parser("metrics", help="метрики запущенного сервера (с --server)")
+        parser_metrics.add_argument("--format", choices=METRICS_FORMATS, default="prometheus", help="формат вывода")
+        parser_metrics.set_defaults(func=self.show_metrics, load=False)
 
         args = parser.parse_args()
 
-        args.func(args)
+        if args.batch:
+            if getattr(args, 'func', None):
+                parser.error("--batch выполняется без команды")
+            if args.snapshot:
+                parser.error("снимок открывается только для чтения")
+            args.func, args.remote = self.run_batch, False
+        elif not getattr(args, 'func', None):
+            parser.error("укажите команду или --batch")
+        if args.func == self.add_record and self._given(args, 'date', 'category', 'amount', 'description'):
+            missing = [name for name in ('date', 'category', 'amount') if getattr(args, name) is None]
+            if missing:
+                parser.error("для добавления без запросов нужны --" + ", --".join(missing))
+        if args.func == self.edit_record and self._given(args, 'date', 'category', 'amount', 'description'):
+            if args.id is None:
+                parser.error("для редактирования без запросов нужен --id")
+
+        if args.snapshot and getattr(args, 'writes', False):
+            parser.error("снимок открывается только для чтения: с --snapshot доступны search и balance")
+        if getattr(args, 'all', False) and (args.ledger or args.snapshot or args.sqlite or args.sharded or args.server):
+            parser.error("--all читает журналы каталога --workspace, без --ledger, --snapshot, --sqlite, --sharded и --server")
+        if args.func == self.show_metrics and not args.server:
+            parser.error("метрики запрашиваются у сервера: укажите --server")
+        if args.metrics:
+            if args.server:
+                parser.error("метрики сервера выводит команда metrics")
+            METRICS.enabled = True
+        with profiled(args.profile_out) if args.profile else nullcontext():
+            try:
+                self.run(args, parser)
+            finally:
+                if args.metrics and args.func != self.serve:
+                    sys.stderr.write(self.format_metrics(METRICS.as_dict(), args.metrics))
+
+    def run(self, args, parser) -> None:
+        """
+        Выполняет разобранную команду: на сервере (--server) или локально, загрузив записи при необходимости.
+        """
+        if args.server:
+            if not getattr(args, 'remote', True):
+                parser.error("эта команда не выполняется через --server")
+            self.wallet = RemoteTracker(args.server)
+            try:
+                args.func(args)
+            except (OSError, ValueError) as e:
+                parser.exit(1, f"Ошибка сервера - {str(e)}\n")
+            return
+        if getattr(args, 'all', False):
+            try:
+                workspace = Workspace.discover(args.workspace, args.workers)
+            except OSError as e:
+                parser.exit(1, f"Ошибка с открытием каталога - {str(e)}\n")
+            with workspace:
+                self.wallet = workspace
+                args.func(args)
+            return
+        if args.ledger:
+            self.wallet.storage = TextStorage(args.ledger)
+        if args.sqlite:
+            try:
+                self.wallet.storage = SqliteStorage(args.sqlite)
+            except sqlite3.Error as e:
+                parser.exit(1, f"Ошибка с открытием базы - {str(e)}\n")
+        if args.sharded:
+            self.wallet.storage = ShardedStorage(args.sharded)
+        storage = self.wallet.storage
+        if getattr(args, 'indexed', False) and not args.snapshot and type(storage) is TextStorage:
+            # Одиночные команды не загружают весь data.txt: записи читаются по индексу смещений
+            self.wallet.storage = TextStorage(storage.path, indexed=True)
+        try:
+            if getattr(args, 'load', True):
+                if args.snapshot:
+                    error = self.wallet.load_snapshot(args.snapshot)
+                    if error:
+                        parser.exit(1, error + "\n")
+                elif getattr(args, 'totals', False) and not args.keyword and self.wallet.load_totals():
+                    # Баланс и отчеты без keyword считаются по сохраненным суммам, записи не нужны
+                    pass
+                elif not self.wallet.storage.queryable:
+                    self.wallet.load_records_from_file(trusted=True)
+            args.func(args)
+        except BrokenPipeError:
+            # Вывод оборван читателем (например, search ... | head): молча завершаемся
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+        finally:
+            # Соединение с базой (--sqlite) закрывается и при выходе по ошибке
+            self.wallet.storage.close()
+
+    @staticmethod
+    def _given(args, *names: str) -> bool:
+        """
+        Заданы ли в командной строке какие-либо из опций names (тогда ввод не запрашивается).
+        """
+        return any(getattr(args, name, None) is not None for name in names)
+
+    def run_batch(self, args) -> None:
+        """
+        - Выполняет операции из файла JSONL, по одной на строку, в формате запросов сервера: {"op": ..., параметры}.
+        - Записи загружаются один раз, а изменения сохраняются в хранилище одной записью в конце.
+        - Результат каждой операции выводится строкой JSON {"ok": ..., "result" или "error": ...};
+          если хоть одна операция не выполнена, код выхода 1.
+        """
+        failed = False
+        try:
+            file = sys.stdin if args.batch == '-' else open(args.batch, encoding='utf8')
+        except OSError as e:
+            print("Ошибка с открытием файла:", str(e), file=sys.stderr)
+            sys.exit(1)
+        with file, self.wallet.batch():
+            for line in file:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    op = request.pop('op')
+                    with METRICS.timer('request_seconds', op):
+                        result = execute_operation(self.wallet, op, request)
+                    response = {'ok': True, 'result': result}
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    failed = True
+                    response = {'ok': False, 'error': str(e)}
+                print(json.dumps(response, ensure_ascii=False))
+        if failed:
+            sys.exit(1)
+
+    @staticmethod
+    def write_records(records: Iterable[Record], fmt: str) -> int:
+        """
+        Выводит записи в stdout по мере получения в формате fmt (см. OUTPUT_FORMATS); возвращает их число.
+        """
+        count = 0
+        if fmt == 'csv':
+            writer = csv.writer(sys.stdout, lineterminator='\n')
+            writer.writerow(_CSV_HEADER)
+            for count, record in enumerate(records, 1):
+                writer.writerow((record.id, record.date.isoformat(), record.category, record.amount, record.description))
+        elif fmt == 'json':
+            for count, record in enumerate(records, 1):
+                print(json.dumps(record_to_json(record), ensure_ascii=False))
+        else:
+            for count, record in enumerate(records, 1):
+                record.get_info()
+        return count
+
+    @staticmethod
+    def format_metrics(data: dict, fmt: str) -> str:
+        if fmt == 'json':
+            return json.dumps(data, ensure_ascii=False) + "\n"
+        return metrics_to_prometheus(data)
+
+    def show_metrics(self, args) -> None:
+        """
+        Выводит метрики сервера в формате --format (prometheus или json).
+        """
+        sys.stdout.write(self.format_metrics(self.wallet.metrics(), args.format))
+
+    def serve(self, args) -> None:
+        """
+        Держит загруженные записи в памяти и обслуживает запросы клиентов по Unix-сокету.
+        """
+        if args.cache_size:
+            self.wallet.query_cache = QueryCache(args.cache_size)
+        server = LedgerServer(self.wallet, args.socket, read_only=bool(args.snapshot))
+        print(f"Сервер слушает {args.socket}, записей: {self.wallet.count_records()}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+    def import_records(self, args) -> None:
+        """
+        Импортирует записи из выписки и выводит ошибочные строки.
+        """
+        try:
+            count, errors = self.wallet.import_records(args.path, args.format, args.delimiter, args.workers,
+                                                       args.skip_invalid)
+        except (OSError, sqlite3.Error) as e:
+            print("Ошибка с открытием файла:", str(e))
+            return
+        for error in errors:
+            print(error)
+        if errors and not args.skip_invalid:
+            print(f"Импорт отменен: ошибок {len(errors)} (используйте --skip-invalid, чтобы пропустить их)")
+        else:
+            print(f"Импортировано записей: {count}")
+
+    def convert(self, args) -> None:
+        """
+        Конвертирует data.txt (с учетом журнала) в бинарный снимок, базу SQLite или помесячный каталог
+        и обратно в data.txt.
+        """
+        if args.to != "text":
+            error = self.wallet.load_records_from_file(trusted=True)
+            if args.to == "snapshot":
+                ok = not error and self.wallet.save_snapshot(args.path)
+            elif error:
+                ok = False
+            else:
+                try:
+                    storage = SqliteStorage(args.path) if args.to == "sqlite" else ShardedStorage(args.path)
+                except (OSError, sqlite3.Error) as e:
+                    print("Ошибка с открытием файла:", str(e))
+                    return
+                try:
+                    ok = PersonalTracker(self.wallet.records, storage).save_records_to_file()
+                finally:
+                    storage.close()
+        else:
+            try:
+                if os.path.isdir(args.path):
+                    storage = ShardedStorage(args.path)
+                else:
+                    with open(args.path, 'rb') as f:
+                        is_sqlite = f.read(16) == b"SQLite format 3\x00"
+                    storage = SqliteStorage(args.path) if is_sqlite else None
+            except (OSError, sqlite3.Error) as e:
+                print("Ошибка с открытием файла:", str(e))
+                return
+            if storage is not None:
+                try:
+                    source = PersonalTracker(storage=storage)
+                    error = source.load_records_from_file(trusted=True)
+                    self.wallet.records = source.records
+                finally:
+                    storage.close()
+            else:
+                error = self.wallet.load_snapshot(args.path)
+            ok = not error and PersonalTracker(self.wallet.records).save_records_to_file()
+        if ok:
+            print("Конвертация выполнена !")
+        else:
+            print(error or "Конвертацию выполнить не удалось (((")
+
+    def compact(self, args) -> None:
+        if self.wallet.compact():
+            print("Журнал изменений свернут в data.txt")
+        else:
+            print("Не удалось свернуть журнал изменений (((")
 
     def display_balance(self,args)->None:
+        options = {name: getattr(args, name, None) for name in ('period', 'by_category', 'date_from', 'date_to', 'keyword')}
+        fmt = getattr(args, 'format', None) or 'text'
+        if fmt != 'text':
+            rows = self.wallet.report(**options).items() if any(options.values()) else [((), self.wallet.balance())]
+            writer = csv.writer(sys.stdout, lineterminator='\n') if fmt == 'csv' else None
+            if writer:
+                writer.writerow(('key', 'income', 'expense', 'balance'))
+            for key, (dox, ras, pr) in rows:
+                if writer:
+                    writer.writerow((' / '.join(key), dox, ras, pr))
+                else:
+                    print(json.dumps({'key': list(key), 'income': dox, 'expense': ras, 'balance': pr},
+                                     ensure_ascii=False))
+            return
+        if any(options.values()):
+            for key, (dox, ras, pr) in self.wallet.report(**options).items():
+                print(f"{' / '.join(key) or 'Итого'}: доходы {dox}, расходы {ras}, баланс {pr}")
+            return
         dox,ras,pr = self.wallet.balance()
         print('Баланс нашего финансового учета:', pr)
         print('Количество доходов:', dox)
@@ -289,7 +4645,15 @@ class ConsoleInterface:
     def add_record(self,args)->None:
         """
         Добавляет новую запись в финансовый учет.
+        Если поля заданы опциями --date, --category, --amount, --description, ввод не запрашивается.
         """
+        if self._given(args, 'date', 'category', 'amount', 'description'):
+            if self.wallet.add_record_and_save_file(args.date, args.category, args.amount, args.description or ''):
+                print('Запись успешно добавлена !')
+            else:
+                print("Запись не удалось добавить (((", file=sys.stderr)
+                sys.exit(1)
+            return
         while True:
             print("======================")
             date = input("Введите дату для добавления в формате YYYY-MM-DD или нажмите Enter без изменения: ").strip()
@@ -323,7 +4687,22 @@ class ConsoleInterface:
     def edit_record(self, args):
         """
         Редактирует определенную запись по id.
+        Если заданы --id и поля (--date, --category, --amount, --description), ввод не запрашивается;
+        --id без полей тоже не запрашивает ввод, а сообщает, что менять нечего.
         """
+        if self._given(args, 'id', 'date', 'category', 'amount', 'description'):
+            if self.wallet.get_record(args.id) is None:
+                print(f"Записи с id {args.id} нет", file=sys.stderr)
+                sys.exit(1)
+            if not self._given(args, 'date', 'category', 'amount', 'description'):
+                print("Не заданы --date, --category, --amount или --description: нечего менять", file=sys.stderr)
+                sys.exit(1)
+            if self.wallet.edit_record_in_file(args.id, args.date, args.category, args.amount, args.description):
+                print('Запись успешно отредактирована!')
+            else:
+                print("Запись отредактировать не удалось (((", file=sys.stderr)
+                sys.exit(1)
+            return
         print('welcome\n')
         while True:
             id_input = input("Введите id для редактирования или нажмите Enter без изменения: ").strip()
@@ -364,14 +4743,23 @@ class ConsoleInterface:
     def search_records(self,args=None)->None:
         """
         Производит поиск записей по одному из параметров дата, категория или сумма.
-
+        Границы диапазонов (--date-from, --date-to, --amount-min, --amount-max) берутся из аргументов
+        командной строки; найденные записи выводятся по мере нахождения.
+        Если задана хотя бы одна опция (--date, --category, --amount, диапазоны, --text, --format), ввод не запрашивается,
+        а записи выводятся в формате --format (text, json или csv).
         """
+        filters = {name: getattr(args, name, None) for name in ('date_from', 'date_to', 'amount_min', 'amount_max', 'text')}
+        if self._given(args, 'date', 'category', 'amount', 'format', *filters):
+            records = self.wallet.iter_find_records(date=args.date, category=args.category, amount=args.amount, **filters)
+            fmt = args.format or 'text'
+            if not self.write_records(records, fmt) and fmt == 'text':
+                print("Записи не были найдены (((")
+            return
         while True:
             print("======================")
             date = input("Введите дату для поиска в формате YYYY-MM-DD или нажмите Enter без изменения: ").strip()
             date = self.check_date(date, flag=True)
             if date or date==None:
-                print('whileeeeeeeeeeeeeeeeeeee')
                 break
         while True:
             category = input("Введите category(Доход/Расход) для поиска или нажмите Enter без изменения: ").strip()
@@ -385,16 +4773,11 @@ class ConsoleInterface:
             if amount or amount==None:
                 break
 
-        find_records = self.wallet.find_records(date=date, category=category, amount=amount)
-        if find_records:
-            for r in find_records:
-                r.get_info()
-        else:
+        if not self.write_records(self.wallet.iter_find_records(date=date, category=category, amount=amount), 'text'):
             print("Записи не были найдены (((")
 
 if __name__ == "__main__":
     wallet = PersonalTracker()
-    wallet.load_records_from_file()
     interface = ConsoleInterface(wallet)
     interface.start()
 
@@ -1,12 +1,32 @@
+import io
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
 import unittest
-from datetime import date
+from contextlib import redirect_stdout
+from datetime import date, timedelta
+from operator import attrgetter
 from unittest.mock import patch
 
-from main import PersonalTracker, Record, ConsoleInterface
+import main
+from main import PersonalTracker, Record, ConsoleInterface, iter_records, RecordStore, JOURNAL_FILE, DATA_FILE, \
+    SqliteStorage, parse_import_file, TextStorage, LedgerServer, RemoteTracker, ShardedStorage, TextIndex, tokenize, \
+    METRICS, execute_operation, make_record, make_records, validate_columns, FileLock, Workspace, \
+    QueryCache, Storage, TextQuery
+
+# Значения полей записи кортежем (у Record нет __dict__)
+fields = attrgetter(*Record.__slots__)
 
 
 class TestConsoleInterface(unittest.TestCase):
     def setUp(self):
+        # Сохранение и правки пишут data.txt и журнал - во временном каталоге, а не в рабочем
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
         self.tracker = PersonalTracker()
         self.record1 = Record(1, date(2024, 5, 10), "Доход", 50, "зарплата")
         self.record2 = Record(2, date(2024, 5, 11), "Расход", 30, "трата")
@@ -14,6 +34,10 @@ class TestConsoleInterface(unittest.TestCase):
         self.tracker.add_record(self.record2)
         self.interface = ConsoleInterface(self.tracker)
 
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
     def test_check_id(self):
         # Проверяем, корректно ли проверяется id
         self.assertEqual(self.interface.check_id(1), 1)
@@ -40,6 +64,10 @@ class TestConsoleInterface(unittest.TestCase):
 
 class TestPersonalTracker(unittest.TestCase):
     def setUp(self):
+        # Сохранение и правки пишут data.txt и журнал - во временном каталоге, а не в рабочем
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
         self.tracker = PersonalTracker()
         self.record1 = Record(1, date(2024, 5, 10), "Доход", 50, "зарплата")
         self.record2 = Record(2, date(2024, 5, 11), "Расход", 30, "трата")
@@ -48,6 +76,8 @@ class TestPersonalTracker(unittest.TestCase):
 
     def tearDown(self):
         del self.tracker
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
 
     def test_add_record(self):
         self.assertEqual(len(self.tracker.records),2)
@@ -120,5 +150,1380 @@ class TestPersonalTracker(unittest.TestCase):
         # Тестирование расчета баланса
         self.assertEqual(self.tracker.balance(), (50, 30, 20))
 
+class TestIndexes(unittest.TestCase):
+    def setUp(self):
+        # Правки пишутся в журнал рядом с data.txt - во временном каталоге, а не в рабочем
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.tracker = PersonalTracker()
+        for id, day, category, amount in ((1, 10, "Доход", 50), (2, 11, "Расход", 30), (3, 10, "Расход", 30)):
+            self.tracker.add_record(Record(id, date(2024, 5, day), category, amount, "описание"))
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_find_uses_indexes(self):
+        self.assertEqual([r.id for r in self.tracker.find_records(date=date(2024, 5, 10))], [1, 3])
+        self.assertEqual([r.id for r in self.tracker.find_records(amount=30, category="Расход")], [2, 3])
+        self.assertEqual([r.id for r in self.tracker.find_records(date=date(2024, 5, 10), category="Расход")], [3])
+        self.assertEqual(len(self.tracker.find_records(description="описание", date="")), 3)
+        self.assertIsNone(self.tracker.find_records(id=4))
+
+    def test_index_follows_add_and_edit(self):
+        self.tracker.find_records(id=1)
+        self.tracker.add_record(Record(4, date(2024, 5, 12), "Доход", 5, "бонус"))
+        self.assertEqual(self.tracker.get_record(4).description, "бонус")
+        self.tracker.edit_record_in_file(2, date(2024, 5, 10), "Доход", None, None)
+        self.assertEqual([r.id for r in self.tracker.find_records(date=date(2024, 5, 10), category="Доход")], [1, 2])
+        self.assertIsNone(self.tracker.find_records(date=date(2024, 5, 11)))
+        self.assertEqual([r.id for r in self.tracker.find_records(category="Расход")], [3])
+
+    def test_index_follows_assignment(self):
+        # Присваивание поля записи в обход трекера: индексы перестраиваются по новым значениям
+        self.tracker.find_records(category="Доход")
+        self.tracker.records[1].category = "Доход"
+        self.assertEqual([r.id for r in self.tracker.find_records(category="Доход")], [1, 2])
+        self.tracker.records[2].amount = 7
+        self.assertEqual([r.id for r in self.tracker.iter_find_records(amount_max=10)], [3])
+        self.tracker.records[0].description = "зарплата"
+        self.assertEqual([r.id for r in self.tracker.find_records(text="зарплата")], [1])
+
+
+class TestRangeQueries(unittest.TestCase):
+    def setUp(self):
+        # Правки пишутся в журнал рядом с data.txt - во временном каталоге, а не в рабочем
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.tracker = PersonalTracker()
+        for id, month, category, amount in ((1, 2, "Расход", 500), (2, 3, "Расход", 1500), (3, 3, "Доход", 2000),
+                                            (4, 3, "Расход", 900), (5, 4, "Расход", 3000)):
+            self.tracker.add_record(Record(id, date(2024, month, 10), category, amount, "описание"))
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def ids(self, **kwargs):
+        return [r.id for r in self.tracker.iter_find_records(**kwargs)]
+
+    def test_date_and_amount_ranges(self):
+        # Все расходы за март больше 1000
+        self.assertEqual(self.ids(date_from=date(2024, 3, 1), date_to=date(2024, 3, 31), amount_min=1000,
+                                  category="Расход"), [2])
+        self.assertEqual(self.ids(amount_min=900, amount_max=2000), [2, 3, 4])
+        self.assertEqual(self.ids(date_to=date(2024, 3, 1)), [1])
+        self.assertEqual(self.ids(date=date(2024, 3, 10), date_from=date(2024, 4, 1)), [])
+        self.assertIsNone(self.tracker.find_records(amount_min=5000))
+
+    def test_range_candidates_in_records_order(self):
+        # Кандидаты диапазона сливаются из групп равных значений, правка не нарушает порядок внутри группы
+        self.tracker.edit_record_in_file(2, None, None, 900, None)
+        self.tracker.edit_record_in_file(4, date(2024, 2, 10), None, None, None)
+        self.assertEqual(self.ids(amount_min=900, amount_max=900), [2, 4])
+        self.assertEqual(self.ids(amount_min=500, amount_max=2000), [1, 2, 3, 4])
+        self.assertEqual(self.ids(date_from=date(2024, 2, 1), date_to=date(2024, 3, 31)), [1, 2, 3, 4])
+        self.assertEqual(self.ids(date_from=date(2024, 5, 1)), [])
+
+    def test_ranges_after_edit(self):
+        self.tracker.edit_record_in_file(1, date(2024, 3, 15), None, 1200, None)
+        self.assertEqual(self.ids(date_from=date(2024, 3, 11), date_to=date(2024, 3, 31), amount_min=1000), [1])
+
+
+class TestReport(unittest.TestCase):
+    def setUp(self):
+        self.records = [Record(1, date(2024, 5, 10), "Доход", 50, "зарплата"),
+                        Record(2, date(2024, 5, 11), "Расход", 30, "Такси домой"),
+                        Record(3, date(2024, 6, 1), "Расход", 5, "такси")]
+
+    def check(self, tracker):
+        self.assertEqual(tracker.report(), {(): (50, 35, 15)})
+        self.assertEqual(tracker.report(period='month'), {('2024-05',): (50, 30, 20), ('2024-06',): (0, 5, -5)})
+        self.assertEqual(tracker.report(by_category=True), {('Доход',): (50, 0, 50), ('Расход',): (0, 35, -35)})
+        self.assertEqual(tracker.report(period='year', by_category=True),
+                         {('2024', 'Доход'): (50, 0, 50), ('2024', 'Расход'): (0, 35, -35)})
+        self.assertEqual(tracker.report(keyword='ТАКСИ'), {(): (0, 35, -35)})
+        self.assertEqual(tracker.report(date_from=date(2024, 5, 11), date_to=date(2024, 5, 31)), {(): (0, 30, -30)})
+        self.assertEqual(tracker.report(date_from=date(2025, 1, 1)), {(): (0, 0, 0)})
+
+    def test_list(self):
+        self.check(PersonalTracker(list(self.records)))
+
+    def test_record_store(self):
+        self.check(PersonalTracker(RecordStore(self.records)))
+
+
+class TestTotals(unittest.TestCase):
+    def setUp(self):
+        # Трекеры на хранилище по умолчанию (data.txt) - во временном каталоге, а не в рабочем
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def recompute(self, records, date_to=None):
+        dox = sum(r.amount for r in records if r.category == "Доход" and (date_to is None or r.date <= date_to))
+        ras = sum(r.amount for r in records if r.category == "Расход" and (date_to is None or r.date <= date_to))
+        return dox, ras, dox - ras
+
+    def test_matches_full_recompute(self):
+        # Случайные добавления и правки: суммы после каждого шага совпадают с полным пересчетом
+        rnd = random.Random(7)
+        for records in ([], RecordStore([])):
+            tracker = PersonalTracker(records)
+            tracker.balance()
+            for step in range(300):
+                day = date(2020, 1, 1) + (date(2024, 1, 1) - date(2020, 1, 1)) * rnd.random()
+                category = rnd.choice(("Доход", "Расход"))
+                if step % 3 or not tracker.records:
+                    tracker.add_record(Record(len(tracker.records) + 1, day, category, rnd.randint(1, 1000), "x"))
+                else:
+                    id = rnd.randint(1, len(tracker.records))
+                    with patch('main.TextStorage.update'):
+                        tracker.edit_record_in_file(id, day if rnd.random() < 0.5 else None, category,
+                                                    rnd.randint(1, 1000), None)
+                probe = date(2019, 12, 31) + (date(2024, 1, 2) - date(2019, 12, 31)) * rnd.random()
+                self.assertEqual(tracker.balance(), self.recompute(tracker.records))
+                self.assertEqual(tracker.balance_as_of(probe), self.recompute(tracker.records, probe))
+            full = PersonalTracker(list(tracker.records))
+            self.assertEqual(tracker.report(period='month', by_category=True),
+                             full.report(period='month', by_category=True, keyword='x'))
+
+    def test_persisted_with_data(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                tracker = PersonalTracker([Record(1, date(2024, 5, 10), "Доход", 50, "зарплата")])
+                tracker.save_records_to_file()
+                tracker.balance()
+                tracker.add_record_and_save_file(date(2024, 5, 11), "Расход", 30, "трата")
+                tracker.edit_record_in_file(1, date(2024, 5, 12), None, None, None)
+                stored = PersonalTracker()
+                self.assertTrue(stored.load_totals())
+                self.assertEqual(stored.balance(), (50, 30, 20))
+                self.assertEqual(stored.balance_as_of(date(2024, 5, 11)), (0, 30, -30))
+                # Правка в обход трекера делает сохраненные суммы недействительными
+                with open(DATA_FILE, 'a', encoding='utf8') as f:
+                    f.write("id: 3\nДата: 2024-05-13\nКатегория: Доход\nСумма: 5\nОписание: x\n\n")
+                self.assertFalse(PersonalTracker().load_totals())
+            finally:
+                os.chdir(cwd)
+
+    def test_same_size_edit_in_same_tick(self):
+        # Правка того же размера с тем же временем изменения не меняет fingerprint - спасает контрольная сумма
+        tracker = PersonalTracker([Record(1, date(2024, 5, 10), "Доход", 50, "зарплата")])
+        tracker.save_records_to_file()
+        tracker.balance()
+        stat = os.stat(DATA_FILE)
+        with open(DATA_FILE, 'r+b') as f:
+            data = f.read().replace("Сумма: 50".encode('utf8'), "Сумма: 70".encode('utf8'))
+            f.seek(0)
+            f.write(data)
+        os.utime(DATA_FILE, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertFalse(PersonalTracker().load_totals())
+        # Старые данные: отпечаток без контрольной суммы, содержимое не перечитывается
+        os.utime(DATA_FILE, ns=(0, 10**9))
+        tracker = PersonalTracker()
+        tracker.load_records_from_file()
+        tracker.balance()
+        with patch('main.TextStorage.checksum', side_effect=AssertionError):
+            stored = PersonalTracker()
+            self.assertTrue(stored.load_totals())
+            self.assertEqual(stored.balance(), (70, 0, 70))
+
+    def test_record_mutated_in_place(self):
+        # Присваивание поля записи в обход трекера сбрасывает сохраненные в памяти суммы
+        records = [Record(1, date(2024, 5, 10), "Доход", 50, "a"), Record(2, date(2024, 5, 11), "Расход", 30, "b")]
+        tracker = PersonalTracker(records)
+        self.assertEqual(tracker.balance(), (50, 30, 20))
+        records[1].category = "Доход"
+        self.assertEqual(tracker.balance(), (80, 0, 80))
+        records[0].amount = 10
+        self.assertEqual(tracker.balance_as_of(date(2024, 5, 10)), (10, 0, 10))
+
+    def test_stale_tracker_does_not_save(self):
+        # Трекер, чьи записи устарели из-за другого процесса, не сохраняет суммы с отпечатком чужих данных
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = TextStorage(os.path.join(tmp, "data.txt"))
+            PersonalTracker([Record(1, date(2024, 5, 10), "Доход", 50, "зарплата")], storage).save_records_to_file()
+            stale = PersonalTracker(storage=storage)
+            stale.load_records_from_file()
+            other = PersonalTracker(storage=TextStorage(storage.path))
+            other.load_records_from_file()
+            other.edit_record_in_file(1, None, None, 70, None)
+            self.assertEqual(stale.balance(), (50, 0, 50))
+            self.assertFalse(os.path.exists(storage.totals_path))
+            self.assertFalse(PersonalTracker(storage=storage).load_totals())
+
+
+class TestTextSearch(unittest.TestCase):
+    def setUp(self):
+        # Трекеры на хранилище по умолчанию (data.txt) - во временном каталоге, а не в рабочем
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.records = [Record(1, date(2024, 5, 10), "Доход", 50, "Зарплата за май"),
+                        Record(2, date(2024, 5, 11), "Расход", 30, "Такси домой"),
+                        Record(3, date(2024, 6, 1), "Расход", 5, "такси до аэропорта"),
+                        Record(4, date(2024, 6, 2), "Расход", 70, "Покупка продуктов, ёлочные игрушки")]
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def ids(self, tracker, **kwargs):
+        return [r.id for r in tracker.iter_find_records(**kwargs)]
+
+    def test_selective_term_first(self):
+        # Частый префикс пересекается последним: редкое слово сужает результат до сбора его позиций
+        index = TextIndex([Record(id, date(2024, 5, 1), "Расход", 1, "такси домой" if id % 50 else "такси аэропорт")
+                           for id in range(1, 201)])
+        collected = []
+        original = TextIndex._term_rows
+        with patch.object(TextIndex, '_term_rows',
+                          lambda self, term, prefix: collected.append(term) or original(self, term, prefix)):
+            self.assertEqual(sorted(index.search(TextQuery("т* аэропорт"))), [49, 99, 149, 199])
+        self.assertEqual(collected, tokenize("аэропорт") + ["т"])
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Покупка продуктов, ёлочные"), tokenize("покупки ПРОДУКТЫ елочная"))
+
+    def test_queries(self):
+        for records in (list(self.records), RecordStore(self.records)):
+            tracker = PersonalTracker(records)
+            self.assertEqual(self.ids(tracker, text="такси"), [2, 3])
+            self.assertEqual(self.ids(tracker, text="такси аэропорт"), [3])
+            self.assertEqual(self.ids(tracker, text="зарплата OR продукты"), [1, 4])
+            self.assertEqual(self.ids(tracker, text="игруш* | аэро*"), [3, 4])
+            self.assertEqual(self.ids(tracker, text="такси", date_to=date(2024, 5, 31)), [2])
+            self.assertEqual(self.ids(tracker, text="такси OR зарплата", category="Расход", amount_min=10), [2])
+            self.assertEqual(self.ids(tracker, text="метро"), [])
+
+    def test_updated_on_add_and_edit(self):
+        tracker = PersonalTracker(list(self.records))
+        self.assertEqual(self.ids(tracker, text="такси"), [2, 3])
+        tracker.add_record(Record(5, date(2024, 6, 3), "Расход", 9, "Такси на работу"))
+        with patch('main.TextStorage.update'):
+            tracker.edit_record_in_file(2, None, None, None, "Метро домой")
+        self.assertEqual(self.ids(tracker, text="такси"), [3, 5])
+        self.assertEqual(self.ids(tracker, text="метро"), [2])
+
+    def test_pushed_down_storage(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = SqliteStorage(os.path.join(tmp, "data.db"))
+            PersonalTracker(list(self.records), storage).save_records_to_file()
+            self.assertEqual(self.ids(PersonalTracker(storage=storage), text="такси", amount_max=10), [3])
+            storage.close()
+
+    def test_persisted(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = TextStorage(os.path.join(tmp, "data.txt"))
+            tracker = PersonalTracker(list(self.records), storage)
+            tracker.save_records_to_file()
+            self.assertEqual(self.ids(tracker, text="такси"), [2, 3])
+            loaded = TextIndex.load(storage.text_index_path, storage)
+            self.assertEqual(loaded.postings, tracker._get_text_index().postings)
+            tracker.add_record_and_save_file(date(2024, 6, 3), "Расход", 9, "Такси")
+            self.assertIsNone(TextIndex.load(storage.text_index_path, storage))
+            reloaded = PersonalTracker(storage=storage)
+            reloaded.load_records_from_file()
+            self.assertEqual(self.ids(reloaded, text="такси"), [2, 3, 5])
+
+    def test_stale_tracker_does_not_save(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = TextStorage(os.path.join(tmp, "data.txt"))
+            PersonalTracker(list(self.records), storage).save_records_to_file()
+            stale = PersonalTracker(storage=storage)
+            stale.load_records_from_file()
+            other = PersonalTracker(storage=TextStorage(storage.path))
+            other.load_records_from_file()
+            other.edit_record_in_file(3, None, None, None, "Метро")
+            self.assertEqual(self.ids(other, text="такси"), [2])
+            # Индекс, сохраненный для текущих данных, не подхватывается устаревшим трекером и не перезаписывается им
+            stamp = os.path.getmtime(storage.text_index_path)
+            self.assertEqual(self.ids(stale, text="такси"), [2, 3])
+            self.assertEqual(os.path.getmtime(storage.text_index_path), stamp)
+            fresh = PersonalTracker(storage=storage)
+            fresh.load_records_from_file()
+            self.assertEqual(self.ids(fresh, text="такси"), [2])
+
+
+class TestStorage(unittest.TestCase):
+    def test_abstract(self):
+        # Хранилище без обязательных методов не создается
+        self.assertRaises(TypeError, Storage)
+
+        class Partial(Storage):
+            def iter_records(self, trusted=False):
+                return iter(())
+        self.assertRaises(TypeError, Partial)
+
+    def test_count_without_loading(self):
+        # Число записей без загрузки в память: по индексу смещений, SQL и манифесту
+        records = [Record(1, date(2024, 5, 10), "Доход", 50, "a"), Record(2, date(2024, 6, 11), "Расход", 30, "b")]
+        with tempfile.TemporaryDirectory() as tmp:
+            storages = [TextStorage(os.path.join(tmp, "data.txt"), indexed=True),
+                        SqliteStorage(os.path.join(tmp, "data.db")), ShardedStorage(os.path.join(tmp, "ledger"))]
+            for storage in storages:
+                tracker = PersonalTracker(list(records), storage)
+                tracker.save_records_to_file()
+                lazy = PersonalTracker(storage=storage)
+                lazy.add_record_and_save_file(date(2024, 6, 12), "Расход", 5, "c")
+                lazy.edit_record_in_file(1, None, None, 70, None)
+                self.assertEqual(PersonalTracker(storage=storage).count_records(), 3)
+                self.assertEqual(storage.count(), 3)
+                storage.close()
+
+
+class TestRecordStore(unittest.TestCase):
+    def setUp(self):
+        self.tracker = PersonalTracker(RecordStore())
+        self.record1 = Record(1, date(2024, 5, 10), "Доход", 50, "зарплата")
+        self.record2 = Record(2, date(2024, 5, 11), "Расход", 30, "трата")
+        self.tracker.add_record(self.record1)
+        self.tracker.add_record(self.record2)
+
+    def test_views(self):
+        records = self.tracker.get_records()
+        self.assertEqual(len(records), 2)
+        self.assertIn(self.record1, records)
+        self.assertEqual(records[-1].id, 2)
+        self.assertEqual(records[1].description, "трата")
+        self.assertEqual(records[0].date, date(2024, 5, 10))
+
+    def test_balance_and_find(self):
+        self.assertEqual(self.tracker.balance(), (50, 30, 20))
+        self.assertEqual(self.tracker.find_records(category="Расход")[0].id, 2)
+        self.assertIsNone(self.tracker.find_records(category="выаыва"))
+
+    def test_view_writes_through(self):
+        view = self.tracker.records[0]
+        view.description = "премия"
+        view.amount = 70
+        view.category = "Расход"
+        self.assertEqual(self.tracker.records[0].description, "премия")
+        self.assertEqual(self.tracker.balance(), (0, 100, -100))
+        with self.assertRaises(ValueError):
+            view.category = "выаыва"
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        # Файлы трекера создаются во временном каталоге
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.tracker = PersonalTracker()
+        self.tracker.add_record(Record(1, date(2024, 5, 10), "Доход", 50, "зарплата"))
+        self.tracker.add_record(Record(2, date(2024, 5, 11), "Расход", 30, "трата"))
+        self.tracker.save_records_to_file()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def load(self, records=None):
+        tracker = PersonalTracker(records)
+        tracker.load_records_from_file()
+        return tracker
+
+    def test_edit_appends_to_journal_only(self):
+        with open(DATA_FILE, encoding='utf8') as f:
+            before = f.read()
+        self.assertTrue(self.tracker.edit_record_in_file(1, None, None, 70, None))
+        self.assertTrue(self.tracker.edit_record_in_file(1, None, None, None, "премия"))
+        with open(DATA_FILE, encoding='utf8') as f:
+            self.assertEqual(f.read(), before)
+        for tracker in (self.load(), self.load(RecordStore())):
+            self.assertEqual(len(tracker.records), 2)
+            self.assertEqual((tracker.records[0].amount, tracker.records[0].description), (70, "премия"))
+            self.assertEqual(tracker.balance(), (70, 30, 40))
+
+    def test_replay_after_add_and_compact(self):
+        self.tracker.add_record_and_save_file(date(2024, 5, 12), "Расход", 5, "кофе")
+        self.tracker.edit_record_in_file(3, None, None, 6, None)
+        tracker = self.load()
+        self.assertEqual(tracker.get_record(3).amount, 6)
+        self.assertTrue(tracker.compact())
+        self.assertFalse(os.path.exists(JOURNAL_FILE))
+        self.assertEqual([(r.id, r.amount) for r in self.load().records], [(1, 50), (2, 30), (3, 6)])
+
+    def test_torn_journal_entry_is_skipped(self):
+        self.tracker.edit_record_in_file(2, None, None, 40, None)
+        with open(JOURNAL_FILE, 'a', encoding='utf8') as f:
+            f.write("seq: 2\nid: 2\nДата: 2024-05-11\n")
+        self.assertEqual(self.load().records[1].amount, 40)
+
+    def journal_seqs(self):
+        with open(JOURNAL_FILE, encoding='utf8') as f:
+            return [int(line[5:]) for line in f if line.startswith("seq: ")]
+
+    def test_seq_continues_across_instances(self):
+        self.tracker.edit_record_in_file(1, None, None, 60, None)
+        # Новые экземпляры хранилища не знают номеров, записанных до них
+        TextStorage(DATA_FILE).update(Record(2, date(2024, 5, 11), "Расход", 35, "трата"))
+        storage = TextStorage(DATA_FILE)
+        storage.begin()
+        storage.update(Record(1, date(2024, 5, 10), "Доход", 65, "зарплата"))
+        storage.update(Record(2, date(2024, 5, 11), "Расход", 36, "трата"))
+        storage.commit()
+        self.assertEqual(self.journal_seqs(), [1, 2, 3, 4])
+        self.assertEqual([r.amount for r in self.load().records], [65, 36])
+
+    def test_entry_after_torn_entry(self):
+        self.tracker.edit_record_in_file(2, None, None, 40, None)
+        with open(JOURNAL_FILE, 'a', encoding='utf8') as f:
+            f.write("seq: 2\nid: 1\nДата: 2024-05-10\nКатегория: Доход\nСумма: 9")
+        self.load().edit_record_in_file(2, None, None, 45, None)
+        self.assertEqual(self.journal_seqs(), [1, 2, 3])
+        tracker = self.load()
+        self.assertEqual([r.amount for r in tracker.records], [50, 45])
+
+
+class TestIndexedTextStorage(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        rnd = random.Random(15)
+        self.records = [Record(id, date(2024, 1, 1 + id % 28), rnd.choice(("Доход", "Расход")), rnd.randint(1, 500),
+                               f"запись {id}") for id in range(1, 101)]
+        PersonalTracker(list(self.records)).save_records_to_file()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def lazy(self):
+        return PersonalTracker(storage=TextStorage(DATA_FILE, indexed=True))
+
+    def eager(self):
+        tracker = PersonalTracker()
+        tracker.load_records_from_file()
+        return tracker
+
+    @staticmethod
+    def rows(records):
+        return [None if r is None else (r.id, r.date, r.category, r.amount, r.description) for r in records]
+
+    def test_queries_match_eager(self):
+        tracker, full = self.lazy(), self.eager()
+        self.assertEqual(self.rows([tracker.get_record(57)]), self.rows(self.records[56:57]))
+        self.assertIsNone(tracker.get_record(101))
+        self.assertEqual(tracker.balance(), full.balance())
+        for query in ({'category': "Доход"}, {'amount_min': 100, 'amount_max': 200},
+                      {'date_from': date(2024, 1, 5), 'date_to': date(2024, 1, 9), 'category': "Расход"}):
+            self.assertEqual(self.rows(tracker.iter_find_records(**query)), self.rows(full.iter_find_records(**query)))
+        self.assertFalse(tracker._loaded)
+        self.assertTrue(os.path.exists(tracker.storage.offsets_path))
+
+    def test_writes_without_loading(self):
+        tracker = self.lazy()
+        self.assertTrue(tracker.add_record_and_save_file(date(2024, 2, 1), "Доход", 1000, "премия"))
+        self.assertTrue(tracker.edit_record_in_file(3, None, "Расход", 7, None))
+        self.assertEqual(tracker.get_record(101).amount, 1000)
+        self.assertEqual(tracker.get_record(3).amount, 7)
+        # Новый экземпляр дочитывает хвост data.txt и журнал к сохраненному индексу смещений
+        tracker, full = self.lazy(), self.eager()
+        self.assertEqual(self.rows([tracker.get_record(3)]), self.rows([full.get_record(3)]))
+        self.assertEqual(tracker.balance(), full.balance())
+        self.assertEqual(self.rows(tracker.iter_find_records(amount=7)), self.rows(full.iter_find_records(amount=7)))
+        self.assertTrue(tracker.compact())
+        self.assertEqual(self.lazy().balance(), full.balance())
+
+    def test_sparse_and_unordered_ids(self):
+        # Огромные id не раздувают индекс смещений, записи не по порядку id находятся после перезапуска
+        tracker = self.lazy()
+        self.assertEqual(tracker.balance(), self.eager().balance())
+        with open(DATA_FILE, 'a', encoding='utf8') as f:
+            f.write("id: 5000000000\nДата: 2024-03-01\nКатегория: Доход\nСумма: 40\nОписание: большой\n\n"
+                    "id: 200\nДата: 2024-03-02\nКатегория: Расход\nСумма: 3\nОписание: меньший\n\n")
+        self.assertEqual(tracker.get_record(200).description, "меньший")
+        self.assertLess(os.path.getsize(tracker.storage.offsets_path), 4096)
+        for lazy in (tracker, self.lazy()):
+            self.assertEqual(lazy.get_record(5_000_000_000).amount, 40)
+            self.assertEqual(lazy.get_record(200).amount, 3)
+            self.assertIsNone(lazy.get_record(150))
+            self.assertEqual(lazy.storage.max_id(), 5_000_000_000)
+
+    def test_non_canonical_file_falls_back(self):
+        with open(DATA_FILE, 'a', encoding='utf8') as f:
+            f.write("id: 101\nДата: 2024-03-01\nСумма: 40\nКатегория: Доход\nОписание: вразброс\n\n")
+        tracker, full = self.lazy(), self.eager()
+        self.assertEqual(self.rows([tracker.get_record(101)]), self.rows([full.get_record(101)]))
+        self.assertEqual(tracker.balance(), full.balance())
+        self.assertEqual(self.rows(tracker.iter_find_records(category="Доход")),
+                         self.rows(full.iter_find_records(category="Доход")))
+        self.assertFalse(tracker.storage._canonical)
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        PersonalTracker([Record(1, date(2024, 5, 10), "Доход", 50, "зарплата"),
+                         Record(2, date(2024, 5, 11), "Расход", 30, "трата")]).save_records_to_file()
+        METRICS.reset()
+
+    def tearDown(self):
+        METRICS.enabled = False
+        METRICS.reset()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_disabled_leaves_methods_unwrapped(self):
+        original = PersonalTracker.balance
+        self.assertFalse(hasattr(original, '__wrapped__'))
+        tracker = PersonalTracker()
+        tracker.load_records_from_file()
+        tracker.balance()
+        self.assertEqual(METRICS.as_dict(), {'counters': {}, 'histograms': {}})
+        METRICS.enabled = True
+        self.assertIs(PersonalTracker.balance.__wrapped__, original)
+        METRICS.enabled = False
+        self.assertIs(PersonalTracker.balance, original)
+
+    def test_counts_operations(self):
+        size = os.path.getsize(DATA_FILE)
+        METRICS.enabled = True
+        tracker = PersonalTracker()
+        tracker.load_records_from_file()
+        self.assertEqual(tracker.balance(), (50, 30, 20))
+        self.assertEqual(len(list(tracker.iter_find_records(category="Доход"))), 1)
+        tracker.add_record_and_save_file(date(2024, 5, 12), "Расход", 5, "кофе")
+        data = execute_operation(tracker, 'metrics', {})
+        self.assertEqual(data['counters'], {'bytes_read': size, 'records_parsed': 2})
+        operations = data['histograms']['operation_seconds']
+        self.assertEqual({op: operations[op]['count'] for op in ('load', 'balance', 'find', 'append')},
+                         {'load': 1, 'balance': 1, 'find': 1, 'append': 1})
+        self.assertEqual(operations['load']['buckets'][-1], 1)
+
+    def test_prometheus_format(self):
+        METRICS.enabled = True
+        PersonalTracker().load_records_from_file()
+        lines = METRICS.prometheus().splitlines()
+        self.assertIn("tracker_records_parsed_total 2", lines)
+        self.assertIn('tracker_operation_seconds_bucket{op="load",le="+Inf"} 1', lines)
+        self.assertIn('tracker_operation_seconds_count{op="load"} 1', lines)
+        self.assertIn("# TYPE tracker_operation_seconds histogram", lines)
+
+
+class TestImport(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', encoding='utf8') as f:
+            f.write(text)
+        return path
+
+    def test_csv_in_parallel_chunks(self):
+        lines = ["date,amount,category,description"]
+        lines += [f"2024-01-{day:02d},{day * 10},Расход,покупка {day}" for day in range(1, 29)]
+        lines += ["2024-02-30,5,Расход,ошибка", "2024-03-01,-70,,возврат", "2024-03-02,0,Доход,ноль"]
+        rows, errors = parse_import_file(self.write("bank.csv", "\n".join(lines)), workers=2, chunk_size=64)
+        self.assertEqual(len(rows), 29)
+        self.assertEqual(rows[0], (date(2024, 1, 1), "Расход", 10, "покупка 1"))
+        self.assertEqual(rows[-1], (date(2024, 3, 1), "Расход", 70, "возврат"))
+        self.assertEqual(errors, ["строка 30: Неправильный формат даты: YYYY-MM-DD",
+                                  "строка 32: значение 0 не входит в диапозон от 1 до 999999999 !!!"])
+
+    def test_csv_quoted_newlines(self):
+        # Перевод строки внутри поля в кавычках не разрывает запись ни при разбиении на куски, ни в нумерации строк
+        lines = ["date,amount,category,description"]
+        lines += [f'2024-01-{day:02d},{day},Расход,"покупка\n{day}"' for day in range(1, 29)]
+        lines += ["2024-02-30,5,Расход,ошибка\u2028x"]
+        for chunk_size in (40, 64, 2**20):
+            rows, errors = parse_import_file(self.write("bank.csv", "\n".join(lines)), workers=2,
+                                             chunk_size=chunk_size)
+            self.assertEqual([row[3] for row in rows], [f"покупка\n{day}" for day in range(1, 29)])
+            self.assertEqual(errors, ["строка 58: Неправильный формат даты: YYYY-MM-DD"])
+
+    def test_jsonl_rejects_bool_amount(self):
+        path = self.write("bank.jsonl", '{"date": "2024-05-12", "amount": true, "description": "x\u2028y"}\n'
+                                        '{"date": "2024-05-13", "amount": 5, "description": "x\u2028y"}\n')
+        rows, errors = parse_import_file(path)
+        self.assertEqual(rows, [(date(2024, 5, 13), "Доход", 5, "x\u2028y")])
+        self.assertEqual(errors, ["строка 1: Необходимо ввести число !!!"])
+
+    def test_import_jsonl_appends_in_one_write(self):
+        path = self.write("bank.jsonl", '{"дата": "2024-05-12", "категория": "Доход", "сумма": 20, "описание": "кэшбэк"}\n'
+                                        '\n{"date": "2024-05-13", "amount": -15, "description": "кафе"}\n')
+        storage = SqliteStorage(os.path.join(self.tmp.name, "data.db"))
+        tracker = PersonalTracker([Record(1, date(2024, 5, 10), "Доход", 50, "зарплата")], storage)
+        self.assertEqual(tracker.import_records(path), (2, []))
+        self.assertEqual([(r.id, r.amount) for r in tracker.records], [(1, 50), (2, 20), (3, 15)])
+        self.assertEqual(storage.max_id(), 3)
+        storage.close()
+
+    def test_invalid_rows_cancel_import(self):
+        tracker = PersonalTracker([])
+        count, errors = tracker.import_records(self.write("bad.csv", "2024-01-01,Прочее,5,x\n"))
+        self.assertEqual((count, len(errors), tracker.records), (0, 1, []))
+
+
+class TestLedgerServer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = TextStorage(os.path.join(self.tmp.name, "data.txt"))
+        PersonalTracker([Record(1, date(2024, 5, 10), "Доход", 50, "зарплата"),
+                         Record(2, date(2024, 5, 11), "Расход", 30, "трата")], self.storage).save_records_to_file()
+        self.tracker = PersonalTracker(storage=self.storage)
+        self.tracker.load_records_from_file()
+        self.path = os.path.join(self.tmp.name, "data.sock")
+        self.server = LedgerServer(self.tracker, self.path)
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(ready,))
+        self.thread.start()
+        ready.wait(5)
+        self.client = RemoteTracker(self.path)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        self.thread.join(5)
+        self.tmp.cleanup()
+
+    def test_console_interface_over_socket(self):
+        interface = ConsoleInterface(self.client)
+        self.assertEqual(interface.check_id("2"), 2)
+        with patch('builtins.input', side_effect=['2024-5-12', 'Расход', '5', 'кофе']):
+            interface.add_record(None)
+        self.assertEqual(self.client.balance(), (50, 35, 15))
+        self.assertEqual([r.id for r in self.client.find_records(date_from=date(2024, 5, 11))], [2, 3])
+        self.assertTrue(self.client.edit_record_in_file(3, None, None, 7, None))
+        self.assertEqual(self.client.get_record(3).amount, 7)
+        self.assertEqual(self.client.report(by_category=True), {('Доход',): (50, 0, 50), ('Расход',): (0, 37, -37)})
+        with self.assertRaises(ValueError):
+            self.client.add_record_and_save_file(date(2024, 5, 12), "Прочее", 5, "x")
+        with self.assertRaises(ValueError):
+            self.client.edit_record_in_file(3, date.today() + timedelta(days=1), None, None, None)
+        self.assertEqual(self.client.get_record(3).date, date(2024, 5, 12))
+
+    def test_unexpected_error_answered(self):
+        # Неожиданное исключение в обработчике возвращается клиенту, соединение остается рабочим
+        with patch.object(self.tracker, 'balance', side_effect=OSError("диск недоступен")):
+            with self.assertRaisesRegex(ValueError, "диск недоступен"):
+                self.client.balance()
+        self.assertEqual(self.client.balance(), (50, 30, 20))
+
+    def test_concurrent_clients_get_distinct_ids(self):
+        def add(count):
+            client = RemoteTracker(self.path)
+            for _ in range(count):
+                client.add_record_and_save_file(date(2024, 5, 12), "Расход", 1, "x")
+            client.close()
+        threads = [threading.Thread(target=add, args=(10,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        loaded = PersonalTracker(storage=self.storage)
+        loaded.load_records_from_file()
+        self.assertEqual([r.id for r in loaded.records], list(range(1, 43)))
+
+
+class TestSqliteStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "data.db")
+        records = [Record(1, date(2024, 5, 10), "Доход", 50, "зарплата"),
+                   Record(2, date(2024, 5, 11), "Расход", 30, "трата"),
+                   Record(3, date(2024, 6, 1), "Расход", 5, "кофе")]
+        self.assertTrue(PersonalTracker(records, SqliteStorage(self.path)).save_records_to_file())
+        self.storage = SqliteStorage(self.path)
+        self.tracker = PersonalTracker(storage=self.storage)
+
+    def tearDown(self):
+        self.storage.close()
+        self.tmp.cleanup()
+
+    def test_queries_pushed_down(self):
+        self.assertEqual(self.tracker.balance(), (50, 35, 15))
+        self.assertEqual([r.id for r in self.tracker.find_records(category="Расход")], [2, 3])
+        self.assertEqual([r.id for r in self.tracker.find_records(date_from=date(2024, 5, 11), amount_max=30)], [2, 3])
+        self.assertIsNone(self.tracker.find_records(date=date(2024, 1, 1)))
+        self.assertEqual(self.tracker.get_record(2).description, "трата")
+        self.assertEqual(self.tracker.records, [])
+
+    def test_add_and_edit_without_loading(self):
+        self.assertTrue(self.tracker.add_record_and_save_file(date(2024, 6, 2), "Доход", 10, "возврат"))
+        self.assertTrue(self.tracker.edit_record_in_file(3, None, None, 7, None))
+        self.assertEqual(self.tracker.balance(), (60, 37, 23))
+        loaded = PersonalTracker(storage=self.storage)
+        loaded.load_records_from_file()
+        self.assertEqual([(r.id, r.amount) for r in loaded.records], [(1, 50), (2, 30), (3, 7), (4, 10)])
+        self.assertEqual(loaded.balance(), (60, 37, 23))
+
+    def test_rewrite_inside_batch_commits_once(self):
+        # Перезапись в пакете не фиксирует транзакцию: другое соединение видит изменения только после commit
+        other = SqliteStorage(self.path)
+        self.storage.begin()
+        self.storage.append(Record(4, date(2024, 6, 2), "Доход", 10, "возврат"))
+        self.storage.rewrite([Record(1, date(2024, 5, 10), "Доход", 70, "зарплата")])
+        self.storage.append(Record(2, date(2024, 6, 3), "Расход", 5, "такси"))
+        self.assertEqual(other.count(), 3)
+        self.storage.commit()
+        self.assertEqual([(r.id, r.amount) for r in other.iter_records()], [(1, 70), (2, 5)])
+        other.close()
+
+
+class TestShardedStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "ledger")
+        records = [Record(1, date(2024, 5, 10), "Доход", 50, "зарплата"),
+                   Record(2, date(2024, 5, 11), "Расход", 30, "трата"),
+                   Record(3, date(2024, 6, 1), "Расход", 5, "кофе")]
+        self.assertTrue(PersonalTracker(records, ShardedStorage(self.path)).save_records_to_file())
+        self.storage = ShardedStorage(self.path)
+        self.tracker = PersonalTracker(storage=self.storage)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_months(self):
+        # Какие месяцы прочитаны с диска
+        months = []
+        original = ShardedStorage._read
+        def read(storage, key, trusted=True):
+            months.append(key % 12 + 1)
+            return original(storage, key, trusted)
+        return months, patch.object(ShardedStorage, '_read', read)
+
+    def test_partitions_and_manifest(self):
+        self.assertEqual(sorted(os.listdir(self.path)), ["2024-05.txt", "2024-06.txt", "ids.bin", "manifest.json"])
+        months, reading = self.read_months()
+        with reading:
+            self.assertEqual(self.tracker.balance(), (50, 35, 15))
+            self.assertEqual(months, [])
+            self.assertEqual([r.id for r in self.tracker.find_records(date_from=date(2024, 6, 1))], [3])
+            self.assertEqual(self.tracker.report(date_to=date(2024, 5, 31)), {(): (50, 30, 20)})
+            self.assertEqual(self.tracker.get_record(2).description, "трата")
+        self.assertEqual(months, [6, 5, 5])
+
+    def test_edit_rewrites_affected_months(self):
+        self.assertTrue(self.tracker.edit_record_in_file(2, date(2024, 7, 1), None, None, None))
+        self.assertTrue(self.tracker.edit_record_in_file(1, None, None, 70, None))
+        self.assertTrue(self.tracker.add_record_and_save_file(date(2024, 6, 2), "Доход", 10, "возврат"))
+        self.assertFalse(os.path.exists(os.path.join(self.path, "2024-05.txt.tmp")))
+        reopened = PersonalTracker(storage=ShardedStorage(self.path))
+        self.assertEqual(reopened.balance(), (80, 35, 45))
+        self.assertEqual(reopened.get_record(2).date, date(2024, 7, 1))
+        reopened.load_records_from_file()
+        self.assertEqual([(r.id, r.amount) for r in reopened.records], [(1, 70), (2, 30), (3, 5), (4, 10)])
+
+    def test_rebuild_without_manifest(self):
+        os.remove(os.path.join(self.path, "manifest.json"))
+        os.remove(os.path.join(self.path, "ids.bin"))
+        tracker = PersonalTracker(storage=ShardedStorage(self.path))
+        self.assertEqual(tracker.balance(), (50, 35, 15))
+        self.assertEqual(tracker.get_record(3).description, "кофе")
+
+    def test_rebuild_skips_other_files(self):
+        with open(os.path.join(self.path, "notes.txt"), "w", encoding="utf8") as f:
+            f.write("заметки\n")
+        os.remove(os.path.join(self.path, "manifest.json"))
+        storage = ShardedStorage(self.path)
+        self.assertEqual(sorted(storage.partitions), [2024 * 12 + 4, 2024 * 12 + 5])
+        self.assertEqual(PersonalTracker(storage=storage).balance(), (50, 35, 15))
+
+    def test_stale_manifest_entry_rebuilt(self):
+        # Сбой после записи файла месяца, но до записи манифеста: сводка и карта id строятся по файлу
+        manifest = os.path.join(self.path, "manifest.json")
+        with open(manifest, encoding="utf8") as f:
+            saved = f.read()
+        self.assertTrue(self.tracker.edit_record_in_file(3, date(2024, 5, 20), None, 7, None))
+        self.assertTrue(self.tracker.add_record_and_save_file(date(2024, 7, 1), "Доход", 9, "бонус"))
+        with open(manifest, "w", encoding="utf8") as f:
+            f.write(saved)
+        months, reading = self.read_months()
+        with reading:
+            reopened = PersonalTracker(storage=ShardedStorage(self.path))
+        self.assertEqual(set(months), {5, 7})
+        self.assertEqual(reopened.balance(), (59, 37, 22))
+        self.assertEqual(reopened.get_record(3).date, date(2024, 5, 20))
+        self.assertEqual(reopened.get_record(4).description, "бонус")
+        # Исправленный манифест сохранен: повторное открытие не читает файлы месяцев
+        months, reading = self.read_months()
+        with reading:
+            self.assertEqual(PersonalTracker(storage=ShardedStorage(self.path)).balance(), (59, 37, 22))
+        self.assertEqual(months, [])
+
+    def test_sparse_ids_map(self):
+        # Огромный id не раздувает карту, правки дописываются в ids.bin, недописанная пара отбрасывается
+        self.storage.append(Record(5_000_000_000, date(2024, 6, 3), "Расход", 1, "такси"))
+        ids = os.path.join(self.path, "ids.bin")
+        size = os.path.getsize(ids)
+        self.assertTrue(self.tracker.edit_record_in_file(5_000_000_000, date(2024, 5, 3), None, None, None))
+        self.assertEqual(os.path.getsize(ids), size + 16)
+        with open(ids, 'ab') as f:
+            f.write(b"\x01\x02\x03")
+        reopened = ShardedStorage(self.path)
+        self.assertEqual(reopened.get(5_000_000_000).date, date(2024, 5, 3))
+        self.assertEqual(reopened.get(3).description, "кофе")
+        self.assertIsNone(reopened.get(4))
+
+    def test_batch_appends_once_per_month(self):
+        june = os.path.join(self.path, "2024-06.txt")
+        size = os.path.getsize(june)
+        with self.tracker.batch():
+            for day in (2, 3, 4):
+                self.tracker.add_record_and_save_file(date(2024, 6, day), "Расход", day, "такси")
+            self.assertEqual(self.storage.max_id(), 6)
+            self.assertEqual(os.path.getsize(june), size)
+        self.assertEqual(self.tracker.balance(), (50, 44, 6))
+        self.assertEqual([r.id for r in ShardedStorage(self.path).find({'category': "Расход"}, {})], [2, 3, 4, 5, 6])
+
+
+def _concurrent_writer(path, worker, count, indexed):
+    """
+    Процесс стресс-теста: добавляет count записей и сразу правит каждую. Трекер загружается один раз,
+    дальше его записи в памяти устаревают из-за записей других процессов.
+    """
+    tracker = PersonalTracker(storage=TextStorage(path, indexed=indexed))
+    if not indexed:
+        tracker.load_records_from_file(trusted=True)
+    for i in range(count):
+        description = f"процесс {worker} запись {i}"
+        if not tracker.add_record_and_save_file(date(2024, 6, 1 + i % 28), "Расход", 1, description):
+            os._exit(1)
+        id = tracker.find_records(description=description)[0].id
+        if not tracker.edit_record_in_file(id, None, None, i + 2, None):
+            os._exit(1)
+
+
+class TestConcurrentAccess(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.records = [Record(id, date(2024, 5, id), "Доход", 10 * id, f"запись {id}") for id in range(1, 11)]
+        PersonalTracker(list(self.records)).save_records_to_file()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def loaded(self):
+        tracker = PersonalTracker()
+        tracker.load_records_from_file()
+        return tracker
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "нужен fork и fcntl")
+    def test_processes_do_not_lose_writes(self):
+        workers, count = 4, 15
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=_concurrent_writer, args=(DATA_FILE, worker, count, worker % 2 == 1))
+                     for worker in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+            self.assertEqual(process.exitcode, 0)
+        records = self.loaded().records
+        total = len(self.records) + workers * count
+        self.assertEqual(sorted(r.id for r in records), list(range(1, total + 1)))
+        amounts = {r.description: r.amount for r in records}
+        for worker in range(workers):
+            for i in range(count):
+                self.assertEqual(amounts[f"процесс {worker} запись {i}"], i + 2)
+
+    def test_write_refreshes_stale_tracker(self):
+        first, second = self.loaded(), self.loaded()
+        self.assertTrue(second.add_record_and_save_file(date(2024, 6, 1), "Расход", 5, "кафе"))
+        self.assertTrue(second.edit_record_in_file(2, None, None, 99, None))
+        # Первый трекер подтягивает чужие изменения перед своим: id не повторяется, правка не теряется
+        self.assertTrue(first.add_record_and_save_file(date(2024, 6, 2), "Расход", 7, "такси"))
+        self.assertEqual([r.id for r in first.records][-2:], [11, 12])
+        self.assertEqual(first.get_record(2).amount, 99)
+        self.assertEqual(first.balance(), self.loaded().balance())
+
+    def test_write_after_foreign_compaction_reloads(self):
+        first, second = self.loaded(), self.loaded()
+        second.edit_record_in_file(3, None, "Расход", None, None)
+        self.assertTrue(second.compact())
+        self.assertTrue(first.edit_record_in_file(4, None, None, 1, None))
+        self.assertEqual(first.get_record(3).category, "Расход")
+        self.assertEqual([fields(r) for r in first.records], [fields(r) for r in self.loaded().records])
+
+    def test_stale_save_refused(self):
+        first, second = self.loaded(), self.loaded()
+        self.assertTrue(second.add_record_and_save_file(date(2024, 6, 1), "Расход", 5, "кафе"))
+        first.records[0].amount = 1
+        with redirect_stdout(io.StringIO()):
+            self.assertIsNone(first.save_records_to_file())
+        self.assertEqual(len(self.loaded().records), 11)
+        self.assertEqual(self.loaded().get_record(1).amount, 10)
+
+    def test_rewrite_is_atomic(self):
+        os.chmod(DATA_FILE, 0o644)
+        tracker = self.loaded()
+        tracker.edit_record_in_file(1, None, None, 2, None)
+        self.assertTrue(tracker.save_records_to_file())
+        self.assertEqual(os.stat(DATA_FILE).st_mode & 0o777, 0o644)
+        self.assertFalse([name for name in os.listdir('.') if name.endswith('.tmp')])
+        self.assertFalse(os.path.exists(JOURNAL_FILE))
+
+    @unittest.skipIf(main.fcntl is None, "нужен fcntl")
+    def test_find_releases_lock_before_iteration(self):
+        storage = TextStorage(DATA_FILE, indexed=True)
+        records = storage.find({'category': "Доход"}, {})
+        self.assertEqual(next(records).id, 1)
+        # Пока вызывающий перебирает результаты, другой процесс может писать; перебор идет по прежнему состоянию
+        with open("data.lock", 'a') as f:
+            main.fcntl.flock(f, main.fcntl.LOCK_EX | main.fcntl.LOCK_NB)
+            main.fcntl.flock(f, main.fcntl.LOCK_UN)
+        writer = PersonalTracker(storage=TextStorage(DATA_FILE, indexed=True))
+        self.assertTrue(writer.add_record_and_save_file(date(2024, 6, 1), "Доход", 5, "новая"))
+        self.assertTrue(writer.edit_record_in_file(2, None, None, 99, None))
+        self.assertEqual([(r.id, r.amount) for r in records], [(id, 10 * id) for id in range(2, 11)])
+
+    def test_lock_upgrade_refused(self):
+        lock = FileLock("data.lock")
+        with lock.hold(False), lock.hold(False):
+            with self.assertRaises(RuntimeError):
+                with lock.hold(True):
+                    pass
+        with lock.hold(True), lock.hold(False):
+            pass
+
+
+class TestWorkspace(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        os.mkdir("clients")
+        self.paths = []
+        for number in range(3):
+            path = os.path.join("clients", f"client{number}.txt")
+            records = [Record(id, date(2023 + id % 2, 1 + id % 12, 1), ("Доход", "Расход")[(id + number) % 2],
+                              10 * id + number, f"запись {id}") for id in range(1, 21)]
+            PersonalTracker(records, TextStorage(path)).save_records_to_file()
+            self.paths.append(path)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def expected(self, **options):
+        reports = []
+        for path in self.paths:
+            tracker = PersonalTracker(storage=TextStorage(path))
+            tracker.load_records_from_file()
+            reports.append(tracker.report(**options))
+        return reports
+
+    def test_fleet_totals(self):
+        with Workspace.discover("clients") as workspace:
+            self.assertEqual(workspace.paths, self.paths)
+            reports = self.expected()
+            self.assertEqual(list(workspace.reports().values()), reports)
+            dox, ras = sum(r[()][0] for r in reports), sum(r[()][1] for r in reports)
+            self.assertEqual(workspace.balance(), (dox, ras, dox - ras))
+            by_year = workspace.report(period='year', by_category=True)
+            self.assertEqual(sorted(by_year), [('2023', "Доход"), ('2023', "Расход"), ('2024', "Доход"), ('2024', "Расход")])
+            self.assertEqual(sum(value[0] for value in by_year.values()), dox)
+
+    def test_parallel_matches_serial(self):
+        options = {'period': 'month', 'keyword': "запись 1"}
+        with Workspace(self.paths, workers=2) as parallel, Workspace(self.paths, workers=1) as serial:
+            self.assertEqual(parallel.reports(**options), serial.reports(**options))
+            self.assertEqual(list(parallel.reports(**options).values()), self.expected(**options))
+
+    def test_unchanged_ledgers_not_reread(self):
+        workspace = Workspace(self.paths, workers=1)
+        first = workspace.balance()
+        with patch('main._ledger_report', side_effect=AssertionError):
+            self.assertEqual(workspace.balance(), first)
+        PersonalTracker(storage=TextStorage(self.paths[1])).add_record_and_save_file(
+            date(2024, 6, 1), "Доход", 1000, "премия")
+        reread = []
+        original = main._ledger_report
+        with patch('main._ledger_report', side_effect=lambda *a: reread.append(a[0]) or original(*a)):
+            self.assertEqual(workspace.balance()[0], first[0] + 1000)
+        self.assertEqual(reread, [self.paths[1]])
+
+    def test_broken_ledger_skipped(self):
+        with open(os.path.join("clients", "broken.txt"), "w", encoding="utf8") as f:
+            f.write("id: 1\nДата: вчера\nКатегория: Доход\nСумма: 5\nОписание: x\n\n")
+        output = io.StringIO()
+        with patch('sys.stderr', output), redirect_stdout(io.StringIO()) as stdout:
+            balance = Workspace.discover("clients", workers=1).balance()
+        self.assertIn("broken.txt: Ошибка с чтением журнала - Неправильный формат даты", output.getvalue())
+        self.assertEqual(stdout.getvalue(), "")
+        self.assertEqual(balance, Workspace(self.paths, workers=1).balance())
+
+    def test_report_is_read_only(self):
+        # Прочие текстовые файлы не считаются журналами, отчет не оставляет файлов рядом с журналами
+        with open(os.path.join("clients", "notes.txt"), "w", encoding="utf8") as f:
+            f.write("список клиентов\n")
+        with open(os.path.join("clients", "odd.txt"), "w", encoding="utf8") as f:
+            f.write("id: 1\nзаметка\n\n")
+        before = sorted(os.listdir("clients"))
+        with Workspace.discover("clients", workers=1) as workspace:
+            self.assertEqual(workspace.paths, self.paths + [os.path.join("clients", "odd.txt")])
+            with patch('sys.stderr', io.StringIO()) as output:
+                self.assertEqual(workspace.balance(), Workspace(self.paths, workers=1).balance())
+                workspace.report(period='month', keyword="запись")
+        self.assertIn("odd.txt", output.getvalue())
+        self.assertEqual(sorted(os.listdir("clients")), before)
+
+    def test_cli_report_all(self):
+        output = io.StringIO()
+        with patch('sys.argv', ['main.py', 'report', '--all', '--workspace', 'clients', '--format', 'json']), \
+                redirect_stdout(output):
+            ConsoleInterface(PersonalTracker()).start()
+        line = json.loads(output.getvalue())
+        self.assertEqual([line['income'], line['expense'], line['balance']], list(Workspace(self.paths).balance()))
+        output = io.StringIO()
+        with patch('sys.argv', ['main.py', '--ledger', self.paths[0], 'balance', '--format', 'json']), \
+                redirect_stdout(output):
+            ConsoleInterface(PersonalTracker()).start()
+        self.assertEqual(json.loads(output.getvalue())['income'], self.expected()[0][()][0])
+
+
+class TestQueryCache(unittest.TestCase):
+    def setUp(self):
+        # Трекеры на хранилище по умолчанию (data.txt) - во временном каталоге, а не в рабочем
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        rnd = random.Random(21)
+        self.rows = [(id, date(2024, 5, 1 + id % 10), rnd.choice(("Доход", "Расход")), rnd.randint(1, 100),
+                      rnd.choice(("такси", "кафе", "зарплата"))) for id in range(1, 61)]
+        self.tracker = PersonalTracker([Record(*row) for row in self.rows], cache_size=8)
+        self.plain = PersonalTracker([Record(*row) for row in self.rows])
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def ids(self, result):
+        return None if result is None else [r.id for r in result]
+
+    def test_repeated_query_hits(self):
+        cache = self.tracker.query_cache
+        first = self.tracker.find_records(date=date(2024, 5, 3), category="Доход")
+        self.assertIsInstance(first, tuple)
+        # Те же условия в другой записи - тот же ключ
+        self.assertIs(self.tracker.find_records(category="Доход", date_from=date(2024, 5, 3),
+                                                date_to=date(2024, 5, 3), description=""), first)
+        self.assertEqual(self.tracker.balance(), self.tracker.balance())
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+        self.assertEqual(self.ids(first), self.ids(self.plain.find_records(date=date(2024, 5, 3), category="Доход")))
+        # Записи результата - неизменяемые копии: ни кеш, ни записи трекера через них не испортить
+        amount = first[0].amount
+        with self.assertRaises(AttributeError):
+            first[0].amount = amount + 1
+        self.assertIsNot(first[0], self.tracker.get_record(first[0].id))
+        self.tracker.get_record(first[0].id).description = "другое"
+        self.assertNotEqual(first[0].description, "другое")
+
+    def test_writes_invalidate_only_affected(self):
+        cache = self.tracker.query_cache
+        income = self.tracker.find_records(category="Доход")
+        expense = self.tracker.find_records(category="Расход")
+        balance = self.tracker.balance()
+        record = expense[0]
+        # Правка описания расхода: поиск расходов сбрасывается, поиск доходов и баланс - нет
+        with patch.object(TextStorage, 'update'):
+            self.tracker.edit_record_in_file(record.id, None, None, None, "подарок")
+            self.assertIs(self.tracker.find_records(category="Доход"), income)
+            self.assertIs(self.tracker.balance(), balance)
+            self.assertIsNot(self.tracker.find_records(category="Расход"), expense)
+            self.tracker.edit_record_in_file(record.id, None, "Доход", None, None)
+        self.assertEqual(self.tracker.balance(), (balance[0] + record.amount, balance[1] - record.amount,
+                                                  balance[2] + 2 * record.amount))
+        self.assertIn(record.id, self.ids(self.tracker.find_records(category="Доход")))
+        self.tracker.add_record(Record(61, date(2024, 6, 1), "Расход", 5, "кафе"))
+        self.assertIn(61, self.ids(self.tracker.find_records(category="Расход")))
+        self.assertGreater(cache.invalidations, 0)
+
+    def test_eviction_is_lru(self):
+        cache = QueryCache(2)
+        cache.put(('a',), (1,), lambda old, new: False)
+        cache.put(('b',), (2,), lambda old, new: False)
+        cache.get(('a',))
+        cache.put(('c',), (3,), lambda old, new: False)
+        self.assertIsNone(cache.get(('b',)))
+        self.assertEqual(cache.get(('a',)), (1,))
+        self.assertEqual(cache.stats(), {'size': 2, 'maxsize': 2, 'hits': 2, 'misses': 1, 'evictions': 1,
+                                         'invalidations': 0})
+
+    def test_matches_uncached_under_random_writes(self):
+        rnd = random.Random(5)
+        queries = [{'category': "Доход"}, {'date': date(2024, 5, 4)}, {'amount_min': 50, 'category': "Расход"},
+                   {'text': "такси"}, {'date_from': date(2024, 5, 2), 'date_to': date(2024, 5, 5)}]
+        with patch.object(TextStorage, 'update'), patch.object(TextStorage, 'append'):
+            for step in range(200):
+                if step % 3 == 0:
+                    id = rnd.randint(1, 60)
+                    changes = (rnd.choice((None, date(2024, 5, rnd.randint(1, 10)))),
+                               rnd.choice((None, "Доход", "Расход")), rnd.choice((None, rnd.randint(1, 100))),
+                               rnd.choice((None, "такси", "кафе")))
+                    self.tracker.edit_record_in_file(id, *changes)
+                    self.plain.edit_record_in_file(id, *changes)
+                elif step % 7 == 0:
+                    args = (date(2024, 5, rnd.randint(1, 10)), "Доход", rnd.randint(1, 100), "такси")
+                    self.tracker.add_record_and_save_file(*args)
+                    self.plain.add_record_and_save_file(*args)
+                query = rnd.choice(queries)
+                self.assertEqual(self.ids(self.tracker.find_records(**query)), self.ids(self.plain.find_records(**query)))
+                self.assertEqual(self.tracker.balance(), self.plain.balance())
+        self.assertGreater(self.tracker.query_cache.hits, 0)
+
+    def test_lazy_cache_sees_other_writers(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                PersonalTracker([Record(*row) for row in self.rows]).save_records_to_file()
+                lazy = PersonalTracker(storage=TextStorage(DATA_FILE, indexed=True), cache_size=4)
+                before = lazy.balance()
+                self.assertIs(lazy.balance(), before)
+                PersonalTracker(storage=TextStorage(DATA_FILE)).add_record_and_save_file(
+                    date(2024, 6, 1), "Доход", 100, "премия")
+                self.assertEqual(lazy.balance()[0], before[0] + 100)
+                lazy.add_record_and_save_file(date(2024, 6, 2), "Расход", 10, "кафе")
+                self.assertEqual(lazy.balance(), (before[0] + 100, before[1] + 10, before[2] + 90))
+            finally:
+                os.chdir(cwd)
+
+    def test_lazy_sqlite_cache_sees_other_connections(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "data.db")
+            PersonalTracker([Record(*row) for row in self.rows], SqliteStorage(path)).save_records_to_file()
+            lazy = PersonalTracker(storage=SqliteStorage(path), cache_size=4)
+            before = lazy.balance()
+            self.assertIs(lazy.balance(), before)
+            other = SqliteStorage(path)
+            PersonalTracker(storage=other).add_record_and_save_file(date(2024, 6, 1), "Доход", 100, "премия")
+            self.assertEqual(lazy.balance()[0], before[0] + 100)
+            self.assertEqual(self.ids(lazy.find_records(description="премия")), [61])
+            lazy.add_record_and_save_file(date(2024, 6, 2), "Расход", 10, "премия")
+            self.assertEqual(self.ids(lazy.find_records(description="премия")), [61, 62])
+            other.close()
+            lazy.storage.close()
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "data.bin")
+        self.tracker = PersonalTracker()
+        self.tracker.add_record(Record(1, date(2024, 5, 10), "Доход", 50, "зарплата"))
+        self.tracker.add_record(Record(2, date(2024, 5, 11), "Расход", 30, "трата"))
+        self.assertTrue(self.tracker.save_snapshot(self.path))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        mapped = PersonalTracker()
+        self.assertIsNone(mapped.load_snapshot(self.path))
+        self.assertIsInstance(mapped.records.ids, memoryview)
+        self.assertEqual([fields(r) for r in self.tracker.records],
+                         [mapped.records.row_values(row) for row in range(len(mapped.records))])
+        self.assertEqual(mapped.balance(), (50, 30, 20))
+        self.assertEqual(mapped.find_records(category="Расход")[0].description, "трата")
+
+    def test_edit_copies_mapped_columns(self):
+        mapped = PersonalTracker()
+        mapped.load_snapshot(self.path)
+        mapped.records[1].amount = 40
+        mapped.records[1].description = "покупка"
+        self.assertNotIsInstance(mapped.records.ids, memoryview)
+        self.assertEqual(mapped.balance(), (50, 40, 10))
+        self.assertEqual(mapped.records[1].description, "покупка")
+
+    def test_not_a_snapshot(self):
+        with open(self.path, 'wb') as f:
+            f.write(b"id: 1\n" * 10)
+        self.assertIsNotNone(PersonalTracker().load_snapshot(self.path))
+
+    def test_truncated_snapshot(self):
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        for size in (10, 40, 60, len(data) - 1):
+            with open(self.path, 'wb') as f:
+                f.write(data[:size])
+            self.assertIsNotNone(PersonalTracker().load_snapshot(self.path))
+
+    def test_find_without_copies(self):
+        # Поиск по снимку идет по перестановкам из файла: колонки не копируются, RecordIndex не строится
+        for day in range(1, 30):
+            self.tracker.add_record(Record(2 + day, date(2024, 4, day), "Расход", day % 7 + 1, "кофе"))
+        self.tracker.save_snapshot(self.path)
+        mapped = PersonalTracker(storage=TextStorage(os.path.join(self.tmp.name, "data.txt")))
+        mapped.load_snapshot(self.path)
+        plain = PersonalTracker(list(self.tracker.records))
+        queries = [{'id': 5}, {'id': 99}, {'category': "Доход"}, {'category': "Расход", 'amount': 3},
+                   {'date_from': date(2024, 4, 10), 'date_to': date(2024, 4, 12)}, {'amount_min': 5},
+                   {'date': date(2024, 5, 11)}]
+        expected = [[r.id for r in plain.iter_find_records(**query)] for query in queries]
+        with patch('main.RecordIndex.__init__', side_effect=AssertionError):
+            for query, ids in zip(queries, expected):
+                self.assertEqual([r.id for r in mapped.iter_find_records(**query)], ids, query)
+            self.assertEqual(mapped.get_record(7).date, date(2024, 4, 5))
+        self.assertIsInstance(mapped.records.ids, memoryview)
+        # Изменение переводит трекер на обычные индексы
+        self.assertTrue(mapped.edit_record_in_file(7, None, "Доход", None, None))
+        self.assertEqual([r.id for r in mapped.find_records(category="Доход")], [1, 7])
+
+
+class TestIterRecords(unittest.TestCase):
+    LINES = ["id: 1\n", "Дата: 2024-05-10\n", "Категория: Доход\n", "Сумма: 50\n", "Описание: зарплата: май\n",
+             "\n", "\n",
+             "id: 2\n", "Дата: 2024-5-11\n", "Категория: Расход\n", "Сумма: 30\n", "Описание: трата"]
+
+    def test_double_blank_line_and_last_record(self):
+        # Двойная пустая строка не обрывает чтение, последняя запись без пустой строки не теряется
+        records = list(iter_records(self.LINES))
+        self.assertEqual([r.id for r in records], [1, 2])
+        self.assertEqual(records[0].description, "зарплата: май")
+        self.assertEqual(records[1].date, date(2024, 5, 11))
+
+    def test_trusted_matches_validated(self):
+        for rec1, rec2 in zip(iter_records(self.LINES), iter_records(self.LINES, trusted=True)):
+            self.assertEqual(fields(rec1), fields(rec2))
+
+    def test_invalid_category_rejected_without_trust(self):
+        lines = ["id: 1", "Дата: 2024-05-10", "Категория: ???", "Сумма: 5", "Описание: x", ""]
+        with self.assertRaises(ValueError):
+            list(iter_records(lines))
+
+
+class TestRecord(unittest.TestCase):
+    def test_slots_and_validation(self):
+        record = Record(1, date(2024, 5, 10), "Доход", 50, "зарплата")
+        self.assertFalse(hasattr(record, '__dict__'))
+        for key, value in (('amount', -5), ('amount', "50"), ('category', "Прочее"), ('date', "2024-05-10")):
+            with self.assertRaises(ValueError):
+                setattr(record, key, value)
+        with self.assertRaises(ValueError):
+            Record(1, date(2024, 5, 10), "Доход", 0, "ноль")
+        self.assertEqual(record.amount, 50)
+
+    def test_trusted_paths_match_constructor(self):
+        rows = [(id, date(2024, 5, id), "Расход", id * 10, f"трата {id}") for id in range(1, 4)]
+        expected = [fields(Record(*row)) for row in rows]
+        self.assertEqual([fields(make_record(*row, trusted=True)) for row in rows], expected)
+        self.assertEqual([fields(record) for record in make_records(rows)], expected)
+        self.assertTrue(all(type(record) is Record for record in make_records(rows)))
+
+    def test_validate_columns_reports_every_row(self):
+        rows, errors = validate_columns(["2024-05-10", "2024-13-01", "2024-05-12", "2024-05-13"],
+                                        ["Доход", "Расход", "Прочее", "Расход"], ["50", "7", "8", "0"],
+                                        ["зарплата", "x", "y", "z" * 61], today=date(2024, 6, 1))
+        self.assertEqual(rows, [(date(2024, 5, 10), "Доход", 50, "зарплата")])
+        self.assertEqual([row for row, _ in errors], [1, 2, 3])
+        self.assertEqual(errors[0][1], "Неправильный формат даты: YYYY-MM-DD")
+        # У строки с двумя ошибками сообщается первая по порядку полей (сумма раньше описания)
+        self.assertIn("не входит в диапозон", errors[2][1])
+
+
+class TestCommandLine(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        tracker = PersonalTracker()
+        tracker.add_record(Record(1, date(2024, 5, 10), "Доход", 50, "зарплата"))
+        tracker.add_record(Record(2, date(2024, 5, 11), "Расход", 30, "трата"))
+        tracker.save_records_to_file()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def run_cli(self, *argv):
+        output = io.StringIO()
+        with patch('sys.argv', ['main.py', *argv]), patch('builtins.input', side_effect=AssertionError), \
+                redirect_stdout(output):
+            ConsoleInterface(PersonalTracker()).start()
+        return output.getvalue()
+
+    def load(self):
+        tracker = PersonalTracker()
+        tracker.load_records_from_file()
+        return tracker
+
+    def test_add_and_edit_without_prompts(self):
+        self.run_cli("add_record", "--date", "2024-05-12", "--category", "Расход", "--amount", "15")
+        self.run_cli("edit_record", "--id", "3", "--description", "кофе")
+        record = self.load().get_record(3)
+        self.assertEqual((record.date, record.amount, record.description), (date(2024, 5, 12), 15, "кофе"))
+
+    def test_invalid_option_exits(self):
+        with self.assertRaises(SystemExit) as e, patch('sys.stderr', io.StringIO()):
+            self.run_cli("add_record", "--date", "2024-05-12", "--category", "Расход", "--amount", "0")
+        self.assertEqual(e.exception.code, 2)
+        self.assertEqual(len(self.load().records), 2)
+
+    def test_search_formats(self):
+        lines = self.run_cli("search", "--category", "Доход", "--format", "json").splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [1])
+        lines = self.run_cli("search", "--amount-min", "1", "--format", "csv").splitlines()
+        self.assertEqual(lines[0], "id,date,category,amount,description")
+        self.assertEqual(lines[2], "2,2024-05-11,Расход,30,трата")
+
+    def test_convert_missing_file(self):
+        output = self.run_cli("convert", "missing.bin", "--to", "text")
+        self.assertIn("Ошибка с открытием файла", output)
+        self.assertEqual(len(self.load().records), 2)
+
+    def test_convert_closes_database(self):
+        closed = []
+        original = SqliteStorage.close
+        with patch.object(SqliteStorage, 'close', lambda storage: closed.append(1) or original(storage)):
+            self.run_cli("convert", "data.db", "--to", "sqlite")
+            self.run_cli("convert", "data.db", "--to", "text")
+            self.run_cli("--sqlite", "data.db", "balance")
+        self.assertEqual(closed, [1, 1, 1])
+        self.assertEqual(len(self.load().records), 2)
+
+    def test_edit_id_without_fields(self):
+        # --id без полей не запрашивает ввод (input в run_cli запрещен)
+        with self.assertRaises(SystemExit) as e, patch('sys.stderr', io.StringIO()) as stderr:
+            self.run_cli("edit_record", "--id", "1")
+        self.assertEqual(e.exception.code, 1)
+        self.assertIn("нечего менять", stderr.getvalue())
+
+    def test_batch_saves_once(self):
+        ops = [{"op": "add", "date": "2024-05-12", "category": "Доход", "amount": 5, "description": "a"},
+               {"op": "add", "date": "2024-05-13", "category": "Доход", "amount": 0, "description": "b"},
+               {"op": "edit", "id": 1, "amount": 70},
+               {"op": "balance"}]
+        with open("ops.jsonl", "w", encoding="utf8") as f:
+            f.write("\n".join(json.dumps(op) for op in ops))
+        writes = []
+        original = TextStorage.commit
+        with patch.object(TextStorage, 'commit', lambda storage: writes.append(1) or original(storage)):
+            with self.assertRaises(SystemExit) as e:
+                output = io.StringIO()
+                with patch('sys.argv', ['main.py', '--batch', 'ops.jsonl']), redirect_stdout(output):
+                    ConsoleInterface(PersonalTracker()).start()
+        self.assertEqual(e.exception.code, 1)
+        self.assertEqual(writes, [1])
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([r['ok'] for r in results], [True, False, True, True])
+        self.assertEqual(results[3]['result'], [75, 30, 45])
+        tracker = self.load()
+        self.assertEqual((len(tracker.records), tracker.get_record(1).amount), (3, 70))
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file